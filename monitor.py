@@ -2,6 +2,8 @@ import asyncio
 from bleak import BleakClient
 from Crypto.Cipher import AES
 
+from versions import hr_decoder
+
 MAC = "E1:2C:9F:0B:F1:44"
 AUTH_KEY = bytes.fromhex("9ef7899bbef1b557158e7c8c27e1b062")
 
@@ -22,9 +24,10 @@ def auth_notification(_, data):
         challenge = data[3:]
 
 def hr_notification(_, data):
-    if len(data) >= 2:
-        bpm = data[1]
-        print(f"❤️ BPM: {bpm}")
+    # Flags da 0x2A37: BPM uint8 ou uint16 (hr_decoder)
+    hr = hr_decoder.decode(data)
+    if hr:
+        print(f"❤️ BPM: {hr[0]}")
 
 async def main():
     global challenge
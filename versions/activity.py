@@ -0,0 +1,175 @@
+"""
+activity.py
+
+Passos / distância / calorias em tempo real (característica Xiaomi 0x0007).
+
+Payload (13 bytes, ex.: 0cdc2a0000c21e000041010000 em miband4_test_suite.log):
+    0       0x0c (cabeçalho)
+    1..4    passos do dia (uint32 LE)        → 0x2adc = 10972
+    5..8    distância do dia, metros (uint32) → 0x1ec2 = 7874
+    9..12   calorias do dia, kcal (uint32)    → 0x0141 = 321
+Totais acumulados desde a meia-noite; a pulseira notifica ~1×/min
+e quando os passos mudam.
+
+Caminho de ingestão (mesmo do HR, sem custo no callback):
+- on_notify() decodifica e soma a diferença para o total anterior
+  no minuto corrente (StepsAggregator, O(1), sem I/O)
+- Ao virar o minuto, a linha do minuto fechado vai para o writer de
+  storage.py (fila em memória, gravação em lote)
+- Tabela activity_1m (migração 6): uma linha por pulseira e minuto,
+  UPSERT somando (o mesmo minuto pode fechar duas vezes numa reconexão)
+
+Totais:
+- Total menor que o anterior → virou o dia (a diferença é o próprio total)
+- Reconexão (start) ou buraco maior que MAX_GAP: só refaz a base; os
+  passos do intervalo ficam para a sincronização de histórico, que
+  preenche os minutos sem dado em tempo real (não conta duas vezes)
+
+Uso:
+    steps = StepsAggregator(device=0)
+    await activity.start(client, UUID_STEPS, steps)
+    ...
+    await activity.stop(client, UUID_STEPS, steps)
+"""
+
+import time
+
+import storage
+
+# ==================================================
+# CONFIGURAÇÃO
+# ==================================================
+
+HEADER = 0x0c
+MINUTE = 60
+MAX_GAP = 300                 # s sem leitura: não atribui a diferença a um minuto
+
+# ==================================================
+# DECODIFICAÇÃO
+# ==================================================
+
+def _uint32(data, pos):
+    return data[pos] | (data[pos + 1] << 8) | (data[pos + 2] << 16) | (data[pos + 3] << 24)
+
+def decode(data):
+    """(passos, distância_m, calorias) do dia, ou None se curto/cabeçalho errado."""
+    if len(data) < 13 or data[0] != HEADER:
+        return None
+    return _uint32(data, 1), _uint32(data, 5), _uint32(data, 9)
+
+# ==================================================
+# AGREGAÇÃO POR MINUTO
+# ==================================================
+
+class StepsAggregator:
+    def __init__(self, device=0):
+        self.device = device
+        self.last = None          # (ts, passos, distância, calorias) da última leitura
+        self.bucket = None        # minuto corrente
+        self.acc = [0, 0, 0]      # passos, distância, calorias no minuto
+        self.total = 0            # total de passos do dia na última leitura
+
+        self.stats = {
+            "samples": 0,
+            "errors": 0,
+            "minutes": 0,
+            "gaps": 0,
+        }
+
+    def add(self, ts, steps, distance, calories):
+        self.stats["samples"] += 1
+        bucket = int(ts) - int(ts) % MINUTE
+        if self.bucket is not None and bucket != self.bucket:
+            self.flush()
+
+        last = self.last
+        self.last = (ts, steps, distance, calories)
+        self.total = steps
+        if last is None:
+            return                # primeira leitura: só a base
+
+        if ts - last[0] > MAX_GAP:
+            self.stats["gaps"] += 1
+            return
+
+        if steps < last[1]:
+            # Virou o dia: totais recomeçaram do zero
+            delta = (steps, distance, calories)
+        else:
+            delta = (steps - last[1], max(0, distance - last[2]), max(0, calories - last[3]))
+
+        if any(delta):
+            self.bucket = bucket
+            self.acc[0] += delta[0]
+            self.acc[1] += delta[1]
+            self.acc[2] += delta[2]
+
+    def rebase(self):
+        """Nova sessão: a próxima leitura vira a base (o intervalo desconectado fica para o histórico)."""
+        self.flush()
+        if self.last is not None:
+            self.stats["gaps"] += 1
+        self.last = None
+
+    def flush(self):
+        """Enfileira o minuto corrente (se houve atividade) no writer."""
+        if self.bucket is None:
+            return
+        steps, distance, calories = self.acc
+        storage.save_activity((self.bucket, self.device, steps, distance, calories, self.total))
+        self.stats["minutes"] += 1
+        self.bucket = None
+        self.acc = [0, 0, 0]
+
+    def on_notify(self, _, data, ts=None):
+        values = decode(data)
+        if values is None:
+            self.stats["errors"] += 1
+            return
+        self.add(ts if ts is not None else time.time(), *values)
+
+# ==================================================
+# ASSINATURA
+# ==================================================
+
+async def start(client, char, aggregator):
+    """Leitura inicial (base dos totais) + notificações."""
+    aggregator.rebase()
+    try:
+        aggregator.on_notify(None, await client.read_gatt_char(char))
+    except Exception as e:
+        print(f"⚠️ Leitura de passos falhou: {e}")
+    try:
+        await client.start_notify(char, aggregator.on_notify)
+    except Exception as e:
+        # Sem notify os passos desta sessão ficam para a sincronização de histórico
+        print(f"⚠️ Notificação de passos indisponível ({e})")
+
+async def stop(client, char, aggregator):
+    try:
+        await client.stop_notify(char)
+    except Exception:
+        pass
+    aggregator.flush()
+
+# ==================================================
+# CONSULTA
+# ==================================================
+
+def minutes(conn, start, end, device=0):
+    """[(bucket, passos, distância_m, calorias), ...] em [start, end)."""
+    return conn.execute("""
+        SELECT bucket, steps, distance_m, calories
+        FROM activity_1m
+        WHERE device_id = ? AND bucket >= ? AND bucket < ?
+        ORDER BY bucket
+    """, (device, start, end)).fetchall()
+
+def totals(conn, start, end, device=0):
+    """(passos, distância_m, calorias) somados em [start, end)."""
+    row = conn.execute("""
+        SELECT COALESCE(SUM(steps), 0), COALESCE(SUM(distance_m), 0), COALESCE(SUM(calories), 0)
+        FROM activity_1m
+        WHERE device_id = ? AND bucket >= ? AND bucket < ?
+    """, (device, start, end)).fetchone()
+    return tuple(row)
@@ -0,0 +1,215 @@
+"""
+adapters.py
+
+Distribuição das pulseiras entre vários adaptadores BLE (hci0, hci1, ...).
+
+Problema (v9_multi_band):
+- Um controlador BlueZ aceita poucas conexões simultâneas (~7 no
+  adaptador interno do Pi)
+- Tentativa de conexão a uma pulseira fora de alcance segura o
+  adaptador até o timeout e atrasa as outras pulseiras dele
+
+Agora (AdapterPool):
+- Adaptadores descobertos em /sys/class/bluetooth (ou passados à mão)
+- Cada pulseira é atribuída ao adaptador com menor carga relativa
+  (pulseiras atribuídas / capacidade), desempate pela taxa de erro
+- Cada adaptador tem o seu slot de conexão: uma pulseira travada no
+  connect só segura o próprio adaptador
+- MIGRATE_AFTER falhas seguidas da pulseira no mesmo adaptador →
+  ela migra para o adaptador menos carregado entre os outros
+
+Métricas por adaptador (describe / log_stats):
+- pulseiras atribuídas, conectadas agora, tentativas, falhas,
+  taxa de erro, migrações recebidas
+
+Uso:
+    pool = AdapterPool(discover_adapters())
+    adapter = pool.assign(mac)
+    target = await reconnector.wait(adapter.name)
+    async with adapter.slot:
+        client = BleakClient(target, **adapter.kwargs())
+        ...
+    pool.connected(mac) / pool.failed(mac) / pool.released(mac)
+"""
+
+import asyncio
+import re
+from pathlib import Path
+
+# ==================================================
+# CONFIGURAÇÃO
+# ==================================================
+
+SYSFS_BLUETOOTH = Path("/sys/class/bluetooth")
+
+MAX_CONNECTIONS = 7         # conexões simultâneas por adaptador
+CONNECT_SLOTS = 1           # conexões/autenticações em andamento por adaptador
+MIGRATE_AFTER = 3           # falhas seguidas antes de trocar de adaptador
+
+STATS_INTERVAL = 600        # segundos entre linhas de métricas no log
+
+_HCI_NAME = re.compile(r"^hci(\d+)$")
+
+# ==================================================
+# DESCOBERTA
+# ==================================================
+
+def discover_adapters(root=SYSFS_BLUETOOTH):
+    """
+    Nomes dos controladores (hci0, hci1, ...) em ordem numérica.
+    Sem sysfs (outro SO, container): [None] → adaptador padrão do bleak.
+    """
+    root = Path(root)
+    found = []
+    if root.exists():
+        for path in root.iterdir():
+            match = _HCI_NAME.match(path.name)    # ignora hci0:N (conexões)
+            if match:
+                found.append((int(match.group(1)), path.name))
+    return [name for _, name in sorted(found)] or [None]
+
+# ==================================================
+# ADAPTADOR
+# ==================================================
+
+class Adapter:
+    def __init__(self, name, max_connections=MAX_CONNECTIONS, slots=CONNECT_SLOTS):
+        self.name = name
+        self.max_connections = max_connections
+        self.slot = asyncio.Semaphore(slots)
+
+        self.assigned = set()     # MACs
+        self.connected = set()
+
+        self.stats = {
+            "attempts": 0,
+            "failures": 0,
+            "connections": 0,
+            "migrations_in": 0,
+        }
+
+    @property
+    def label(self):
+        return self.name or "padrão"
+
+    def kwargs(self):
+        """Argumentos para BleakClient / BleakScanner."""
+        return {"adapter": self.name} if self.name else {}
+
+    def load(self):
+        return len(self.assigned) / self.max_connections
+
+    def error_rate(self):
+        attempts = self.stats["attempts"]
+        return self.stats["failures"] / attempts if attempts else 0.0
+
+# ==================================================
+# POOL
+# ==================================================
+
+class AdapterPool:
+    def __init__(self, names, max_connections=MAX_CONNECTIONS, slots=CONNECT_SLOTS,
+                 migrate_after=MIGRATE_AFTER):
+        self.adapters = [Adapter(name, max_connections, slots) for name in names]
+        self.migrate_after = migrate_after
+        self.by_band = {}         # MAC → Adapter
+        self.streak = {}          # MAC → falhas seguidas no adaptador atual
+        self._stats_task = None
+
+    def capacity(self):
+        return sum(a.max_connections for a in self.adapters)
+
+    def _pick(self, exclude=None):
+        candidates = [a for a in self.adapters if a is not exclude] or self.adapters
+        return min(candidates, key=lambda a: (a.load(), a.error_rate()))
+
+    def _move(self, mac, adapter):
+        current = self.by_band.get(mac)
+        if current is not None:
+            current.assigned.discard(mac)
+            current.connected.discard(mac)
+        adapter.assigned.add(mac)
+        self.by_band[mac] = adapter
+        self.streak[mac] = 0
+
+    def assign(self, mac):
+        """Adaptador da pulseira (atribui na primeira chamada)."""
+        adapter = self.by_band.get(mac)
+        if adapter is None:
+            adapter = self._pick()
+            self._move(mac, adapter)
+        return adapter
+
+    def attempt(self, mac):
+        self.by_band[mac].stats["attempts"] += 1
+
+    def connected(self, mac):
+        adapter = self.by_band[mac]
+        adapter.connected.add(mac)
+        adapter.stats["connections"] += 1
+        self.streak[mac] = 0
+
+    def failed(self, mac):
+        """Tentativa de conexão/autenticação falhou; migra após MIGRATE_AFTER seguidas."""
+        adapter = self.by_band[mac]
+        adapter.stats["failures"] += 1
+        adapter.connected.discard(mac)
+        self.streak[mac] += 1
+
+        if self.streak[mac] < self.migrate_after or len(self.adapters) < 2:
+            return adapter
+
+        target = self._pick(exclude=adapter)
+        self._move(mac, target)
+        target.stats["migrations_in"] += 1
+        print(
+            f"🔀 {mac}: {self.migrate_after} falhas em {adapter.label}, "
+            f"migrando para {target.label}"
+        )
+        return target
+
+    def released(self, mac):
+        """Sessão terminou (conectada ou não)."""
+        adapter = self.by_band.get(mac)
+        if adapter is not None:
+            adapter.connected.discard(mac)
+
+    # ------------------------------
+    # MÉTRICAS
+    # ------------------------------
+
+    def get_stats(self):
+        result = {}
+        for a in self.adapters:
+            result[a.label] = {
+                "assigned": len(a.assigned),
+                "connected": len(a.connected),
+                "error_rate": a.error_rate(),
+                **a.stats,
+            }
+        return result
+
+    def log_stats(self):
+        print(f"📶 Adaptadores ({len(self.adapters)}):")
+        for label, s in self.get_stats().items():
+            print(
+                f"   {label:<6} {s['assigned']:>3} pulseiras  {s['connected']:>3} conectadas  "
+                f"{s['attempts']:>5} tentativas  {s['failures']:>4} falhas  "
+                f"erro {s['error_rate'] * 100:5.1f}%  {s['migrations_in']:>3} migradas p/ cá"
+            )
+
+    def start(self, interval=STATS_INTERVAL):
+        if interval and self._stats_task is None:
+            self._stats_task = asyncio.create_task(self._log_periodically(interval))
+
+    async def stop(self):
+        if self._stats_task is not None:
+            self._stats_task.cancel()
+            await asyncio.gather(self._stats_task, return_exceptions=True)
+            self._stats_task = None
+        self.log_stats()
+
+    async def _log_periodically(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            self.log_stats()
@@ -0,0 +1,145 @@
+"""
+alert_index.py
+
+Estado dos alertas por (pulseira, regra, severidade): cooldown,
+escalonamento e aviso de resolvida.
+
+Antes:
+- Um last_alert_time por script (ou por pulseira na v9) com
+  ALERT_COOLDOWN = 10 min para tudo: uma taquicardia calava o
+  "sem dados" que viesse logo depois, e um alerta que continuava ativo
+  nunca subia de prioridade nem avisava quando passava
+
+Agora (AlertIndex, um por processo, compartilhado pelas pulseiras):
+- Episódio por (pulseira, regra): começa no primeiro disparo, acaba
+  quando a regra fica "resolve_after" s sem disparar
+- Último aviso por (pulseira, regra, severidade): cooldown ("cooldown"
+  da regra) independente por chave; sobrevive ao fim do episódio, então
+  uma regra oscilando não repete o aviso dentro do cooldown
+- Escalonamento ("escalate" da regra): episódio ativo há mais de
+  `after` s → próximos disparos saem com a severidade do nível; a chave
+  nova não tem cooldown, o aviso escalonado sai na hora
+- Resolvida: aviso (prioridade baixa) só se o episódio chegou a avisar
+
+Custo:
+- fire(): dois acessos a dict, O(1)
+- sweep(): episódios em OrderedDicts na ordem do último disparo, um
+  por valor de resolve_after (move_to_end a cada disparo); cada
+  varredura para no primeiro ainda ativo → O(1) amortizado,
+  independente do número de pulseiras e regras
+
+Notificações devolvidas como (mensagem, prioridade, título); quem chama
+envia (outbox) e põe o nome da pulseira, se houver mais de uma.
+
+Uso:
+    index = AlertIndex()
+    for rule, message in evaluator.sample(ts, bpm, state):
+        alert = index.fire(device, rule, message, ts)
+        if alert: ...
+    for device, alert in index.sweep(time.time()): ...     # resolvidas
+"""
+
+from collections import OrderedDict
+
+# ==================================================
+# CONFIGURAÇÃO
+# ==================================================
+
+ALERT_TITLE = "ALERTA DE SAUDE"      # ASCII PURO: o requests manda o cabeçalho em latin-1
+RESOLVED_TITLE = "ALERTA RESOLVIDO"
+RESOLVED_PRIORITY = "low"
+
+# ==================================================
+# EPISÓDIO (uma regra ativa numa pulseira)
+# ==================================================
+
+class Episode:
+    __slots__ = ("rule", "since", "last_seen", "tier", "notified", "queue")
+
+    def __init__(self, rule, now, queue):
+        self.rule = rule
+        self.queue = queue
+        self.since = now
+        self.last_seen = now
+        self.tier = -1            # -1 = severidade da própria regra
+        self.notified = False
+
+    def severity(self, now):
+        escalate = self.rule.escalate
+        while self.tier + 1 < len(escalate) and now - self.since >= escalate[self.tier + 1][0]:
+            self.tier += 1
+        return escalate[self.tier][1] if self.tier >= 0 else self.rule.severity
+
+# ==================================================
+# ÍNDICE
+# ==================================================
+
+class AlertIndex:
+    def __init__(self):
+        self.episodes = {}              # (pulseira, regra) → Episode
+        self.queues = {}                # resolve_after → OrderedDict, disparo mais antigo primeiro
+        self.last_sent = {}             # (pulseira, regra, severidade) → ts do último aviso
+        self.stats = {
+            "fired": 0,
+            "sent": 0,
+            "suppressed": 0,
+            "escalated": 0,
+            "resolved": 0,
+        }
+
+    def fire(self, device, rule, message, now):
+        """Disparo de uma regra. (mensagem, prioridade, título) se for para avisar."""
+        self.stats["fired"] += 1
+        key = (device, rule.name)
+        episode = self.episodes.get(key)
+        if episode is None:
+            queue = self.queues.setdefault(rule.resolve_after, OrderedDict())
+            episode = self.episodes[key] = queue[key] = Episode(rule, now, queue)
+        else:
+            episode.rule = rule          # regra recarregada com o mesmo nome
+            episode.last_seen = now
+            episode.queue.move_to_end(key)
+
+        tier = episode.tier
+        severity = episode.severity(now)
+        sent_key = (device, rule.name, severity)
+        last = self.last_sent.get(sent_key)
+        if last is not None and now - last < rule.cooldown:
+            self.stats["suppressed"] += 1
+            return None
+
+        self.last_sent[sent_key] = now
+        episode.notified = True
+        self.stats["sent"] += 1
+        if episode.tier != tier:
+            self.stats["escalated"] += 1
+        return message, severity, ALERT_TITLE
+
+    def sweep(self, now):
+        """Encerra episódios sem disparo há resolve_after s: [(pulseira, notificação)]."""
+        resolved = []
+        for resolve_after, queue in self.queues.items():
+            while queue:
+                key, episode = next(iter(queue.items()))
+                # Ordem do último disparo: os seguintes são mais recentes
+                if now - episode.last_seen < resolve_after:
+                    break
+                queue.popitem(last=False)
+                del self.episodes[key]
+                self.stats["resolved"] += 1
+
+                message = episode.rule.format_resolved(episode.last_seen - episode.since)
+                if episode.notified and message is not None:
+                    resolved.append((key[0], (message, RESOLVED_PRIORITY, RESOLVED_TITLE)))
+        return resolved
+
+    def active(self, device=None):
+        """Nomes das regras ativas (de uma pulseira ou de todas)."""
+        return [name for (dev, name) in self.episodes if device is None or dev == device]
+
+    def describe(self):
+        s = self.stats
+        return (
+            f"{s['fired']} disparos, {s['sent']} avisos, {s['suppressed']} no cooldown, "
+            f"{s['escalated']} escalonados, {s['resolved']} resolvidos, {len(self.episodes)} ativos"
+        )
@@ -0,0 +1,181 @@
+"""
+battery.py
+
+Bateria da Mi Band 4 por notificação na característica Xiaomi 0x0006.
+
+Antes (v7_reconnect_battery_v2):
+- battery_monitor fazia read_gatt_char(0x0006) a cada 60 s
+- Só o byte 1 (nível) era usado; o carregamento era inferido pelo
+  nível subindo por BATTERY_RISE_TIME (minutos de atraso)
+
+A característica suporta notify (ver a descoberta em
+2026-02-01_battery_charging.log): a pulseira avisa quando o nível
+muda e quando entra/sai do carregador.
+
+Payload (20 bytes, ex.: 0f6301b207010100000000ea07011f0b292fec63):
+    0       0x0f (cabeçalho)
+    1       nível (%)
+    2       carregando (0/1)
+    3..9    data/hora em que saiu do carregador
+            (ano uint16 LE, mês, dia, hora, min, s)
+    10      (desconhecido)
+    11..17  data/hora da última carga (mesmo formato)
+    18      (desconhecido)
+    19      nível ao fim da última carga (%)
+Datas no relógio da pulseira (hora local); 1970 = nunca.
+
+Agora (BatteryWatcher, um por conexão):
+- Uma leitura ao conectar + start_notify na 0x0006
+- on_update(info) a cada mudança de nível ou de carregamento
+- Leitura de fallback só se nenhuma notificação chegar em
+  FALLBACK_INTERVAL (padrão 15 min)
+
+Uso:
+    watcher = BatteryWatcher(client, UUID_BATTERY, on_battery)
+    await watcher.start()
+    ...
+    await watcher.stop()
+"""
+
+import asyncio
+import time
+from datetime import datetime
+
+# ==================================================
+# CONFIGURAÇÃO
+# ==================================================
+
+FALLBACK_INTERVAL = 900       # s sem notificação antes de ler à mão
+
+HEADER = 0x0f
+MIN_VALID_YEAR = 2000         # datas anteriores = campo não preenchido
+
+# ==================================================
+# DECODIFICAÇÃO
+# ==================================================
+
+def decode_datetime(data, pos):
+    """7 bytes (ano LE, mês, dia, hora, min, s) → epoch, ou None se vazio/inválido."""
+    if len(data) < pos + 7:
+        return None
+    year = data[pos] | (data[pos + 1] << 8)
+    if year < MIN_VALID_YEAR:
+        return None
+    try:
+        value = datetime(year, data[pos + 2], data[pos + 3],
+                         data[pos + 4], data[pos + 5], data[pos + 6])
+    except ValueError:
+        return None
+    return int(value.timestamp())
+
+def decode(data):
+    """
+    Payload 0x0006 → dict, ou None se curto demais para o nível.
+    Campos que o payload não traz ficam None.
+    """
+    data = bytes(data)
+    if len(data) < 2:
+        return None
+
+    return {
+        "level": data[1],
+        "charging": bool(data[2]) if len(data) > 2 else None,
+        "off_charger_at": decode_datetime(data, 3),
+        "last_charge_at": decode_datetime(data, 11),
+        "last_charge_level": data[19] if len(data) > 19 else None,
+    }
+
+def describe(info):
+    parts = [f"{info['level']}%"]
+    if info["charging"] is not None:
+        parts.append("carregando" if info["charging"] else "fora do carregador")
+    if info["last_charge_at"] is not None:
+        when = datetime.fromtimestamp(info["last_charge_at"]).strftime("%Y-%m-%d %H:%M")
+        level = info["last_charge_level"]
+        parts.append(f"última carga {when}" + (f" ({level}%)" if level is not None else ""))
+    return ", ".join(parts)
+
+# ==================================================
+# WATCHER
+# ==================================================
+
+class BatteryWatcher:
+    def __init__(self, client, char, on_update, fallback_interval=FALLBACK_INTERVAL):
+        self.client = client
+        self.char = char
+        self.on_update = on_update
+        self.fallback_interval = fallback_interval
+
+        self.last = None              # último info decodificado
+        self.last_event = time.monotonic()
+        self.task = None
+        self.notifying = False
+
+        self.stats = {
+            "notifications": 0,
+            "reads": 0,
+            "updates": 0,
+            "errors": 0,
+        }
+
+    def _handle(self, data):
+        info = decode(data)
+        if info is None:
+            self.stats["errors"] += 1
+            return
+        self.last_event = time.monotonic()
+
+        # Só repassa o que mudou (a pulseira repete o payload às vezes)
+        last = self.last
+        if last is not None and (last["level"], last["charging"]) == (info["level"], info["charging"]):
+            self.last = info
+            return
+
+        self.last = info
+        self.stats["updates"] += 1
+        self.on_update(info)
+
+    def on_notify(self, _, data):
+        self.stats["notifications"] += 1
+        self._handle(data)
+
+    async def read(self):
+        try:
+            data = await self.client.read_gatt_char(self.char)
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"⚠️ Leitura da bateria falhou: {e}")
+            return
+        self.stats["reads"] += 1
+        self._handle(data)
+
+    async def _fallback(self):
+        while True:
+            idle = time.monotonic() - self.last_event
+            if idle >= self.fallback_interval:
+                await self.read()
+                idle = 0
+            await asyncio.sleep(self.fallback_interval - idle)
+
+    async def start(self):
+        """Leitura inicial (estado atual) + notificações + fallback lento."""
+        await self.read()
+        try:
+            await self.client.start_notify(self.char, self.on_notify)
+            self.notifying = True
+        except Exception as e:
+            # Sem notify: o fallback vira o polling
+            print(f"⚠️ Notificação de bateria indisponível ({e}), lendo a cada {self.fallback_interval}s")
+        self.task = asyncio.create_task(self._fallback())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.notifying:
+            try:
+                await self.client.stop_notify(self.char)
+            except Exception:
+                pass
+            self.notifying = False
@@ -0,0 +1,312 @@
+"""
+export.py
+
+Exporta um intervalo de tempo do health.db em streaming.
+
+Antes: consultas ad-hoc com fetchall, que em meses de dados estouram
+a RAM do Raspberry Pi.
+
+Agora:
+- Cursor lido com fetchmany (FETCH_SIZE linhas por vez): memória constante
+- Uma pulseira por exportação (--device, padrão 0 = principal)
+- heart_rate passa por shards.iter_heart_rate (inclui meses arquivados)
+- Formatos:
+    csv     → ts,timestamp,valor   (.gz no nome → comprimido)
+    ndjson  → um objeto JSON por linha (.gz no nome → comprimido)
+    col     → colunar comprimido (formato HCL1 abaixo)
+- Mostra linhas/s ao final
+
+Formato colunar HCL1:
+    b"HCL1"
+    varint tamanho + cabeçalho JSON {"table", "columns", "types"}
+    bloco*:
+        varint linhas
+        por coluna: varint tamanho + zlib(payload)
+            int  → deltas em zigzag varint
+            text → varint tamanho + UTF-8, por valor
+
+Uso:
+    python versions/export.py heart_rate --start 2026-01-01 --end 2026-02-01 -o hr.csv.gz
+    python versions/export.py wearable_events --format ndjson -o eventos.ndjson
+    python versions/export.py heart_rate --format col -o hr.hcl
+    python versions/export.py heart_rate --device 2 -o hr_pulseira2.csv
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import sys
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+import shards
+from hr_archive import read_varint, write_varint
+
+# ==================================================
+# CONFIGURAÇÃO
+# ==================================================
+
+DB_PATH = Path("health.db")
+
+FETCH_SIZE = 1000
+BLOCK_ROWS = 65536         # linhas por bloco no formato colunar
+
+COLUMNAR_MAGIC = b"HCL1"
+
+TABLES = {
+    "heart_rate": ("bpm", "int"),
+    "battery_level": ("level", "int"),
+    "wearable_events": ("event", "text"),
+}
+
+FORMATS = ("csv", "ndjson", "col")
+
+# ==================================================
+# LEITURA
+# ==================================================
+
+def iter_rows(conn, table, start, end, fetch_size=FETCH_SIZE, device_id=shards.PRIMARY_DEVICE):
+    """Gera (ts, valor) de `table` em [start, end) sem carregar tudo na memória."""
+    if table == "heart_rate":
+        yield from shards.iter_heart_rate(conn, start, end, fetch_size, device_id)
+        return
+
+    column, _ = TABLES[table]
+    cur = conn.execute(
+        f"SELECT ts, {column} FROM {table} "
+        f"WHERE ts >= ? AND ts < ? AND device_id = ? ORDER BY ts",
+        (start, end, device_id)
+    )
+    while True:
+        rows = cur.fetchmany(fetch_size)
+        if not rows:
+            return
+        yield from rows
+
+def table_bounds(conn, table, device_id=shards.PRIMARY_DEVICE):
+    """[start, end) cobrindo o conteúdo da tabela para a pulseira (inclui shards)."""
+    lo, hi = conn.execute(
+        f"SELECT MIN(ts), MAX(ts) FROM {table} WHERE device_id = ?", (device_id,)
+    ).fetchone()
+    if table == "heart_rate":
+        months = shards.shard_months(conn)
+        if months:
+            first = shards.month_start(*months[0])
+            y, m = shards.next_month(*months[-1])
+            last = shards.month_start(y, m) - 1
+            lo = first if lo is None else min(lo, first)
+            hi = last if hi is None else max(hi, last)
+    if lo is None:
+        return 0, 0
+    return lo, hi + 1
+
+# ==================================================
+# FORMATOS DE TEXTO
+# ==================================================
+
+def _open_text(path):
+    if path is None:
+        return io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", newline="")
+    if str(path).endswith(".gz"):
+        return gzip.open(path, "wt", encoding="utf-8", newline="")
+    return open(path, "w", encoding="utf-8", newline="")
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+def write_csv(rows, out, table):
+    column, _ = TABLES[table]
+    writer = csv.writer(out)
+    writer.writerow(("ts", "timestamp", column))
+    count = 0
+    for ts, value in rows:
+        writer.writerow((ts, _iso(ts), value))
+        count += 1
+    return count
+
+def write_ndjson(rows, out, table):
+    column, _ = TABLES[table]
+    count = 0
+    for ts, value in rows:
+        out.write(json.dumps({"ts": ts, "timestamp": _iso(ts), column: value}, ensure_ascii=False))
+        out.write("\n")
+        count += 1
+    return count
+
+# ==================================================
+# FORMATO COLUNAR
+# ==================================================
+
+def _zigzag(n):
+    return (n << 1) ^ (n >> 63)
+
+def _unzigzag(n):
+    return (n >> 1) ^ -(n & 1)
+
+def _encode_ints(values):
+    out = bytearray()
+    prev = 0
+    for v in values:
+        write_varint(out, _zigzag(v - prev))
+        prev = v
+    return out
+
+def _encode_texts(values):
+    out = bytearray()
+    for v in values:
+        raw = str(v).encode("utf-8")
+        write_varint(out, len(raw))
+        out += raw
+    return out
+
+def _write_block(f, columns, types):
+    head = bytearray()
+    write_varint(head, len(columns[0]))
+    f.write(head)
+    for values, kind in zip(columns, types):
+        raw = _encode_ints(values) if kind == "int" else _encode_texts(values)
+        data = zlib.compress(bytes(raw), 6)
+        size = bytearray()
+        write_varint(size, len(data))
+        f.write(size)
+        f.write(data)
+
+def write_columnar(rows, f, table, block_rows=BLOCK_ROWS):
+    column, kind = TABLES[table]
+    types = ("int", kind)
+    header = json.dumps({"table": table, "columns": ["ts", column], "types": types}).encode()
+
+    f.write(COLUMNAR_MAGIC)
+    size = bytearray()
+    write_varint(size, len(header))
+    f.write(size)
+    f.write(header)
+
+    count = 0
+    ts_col, val_col = [], []
+    for ts, value in rows:
+        ts_col.append(ts)
+        val_col.append(value)
+        if len(ts_col) >= block_rows:
+            _write_block(f, (ts_col, val_col), types)
+            count += len(ts_col)
+            ts_col, val_col = [], []
+    if ts_col:
+        _write_block(f, (ts_col, val_col), types)
+        count += len(ts_col)
+    return count
+
+def _read_exact_varint(f):
+    result, shift = 0, 0
+    while True:
+        b = f.read(1)
+        if not b:
+            raise EOFError
+        result |= (b[0] & 0x7F) << shift
+        if b[0] < 0x80:
+            return result
+        shift += 7
+
+def read_columnar(path):
+    """Gera (ts, valor) de um arquivo HCL1, bloco a bloco."""
+    with open(path, "rb") as f:
+        if f.read(4) != COLUMNAR_MAGIC:
+            raise ValueError(f"{path}: não é um arquivo HCL1")
+        header = json.loads(f.read(_read_exact_varint(f)))
+        types = header["types"]
+
+        while True:
+            try:
+                n = _read_exact_varint(f)
+            except EOFError:
+                return
+
+            columns = []
+            for kind in types:
+                buf = zlib.decompress(f.read(_read_exact_varint(f)))
+                values, pos, prev = [], 0, 0
+                for _ in range(n):
+                    if kind == "int":
+                        v, pos = read_varint(buf, pos)
+                        prev += _unzigzag(v)
+                        values.append(prev)
+                    else:
+                        size, pos = read_varint(buf, pos)
+                        values.append(buf[pos:pos + size].decode("utf-8"))
+                        pos += size
+                columns.append(values)
+
+            yield from zip(*columns)
+
+# ==================================================
+# API
+# ==================================================
+
+def export(conn, table, start, end, fmt="csv", out_path=None, fetch_size=FETCH_SIZE,
+           device_id=shards.PRIMARY_DEVICE):
+    """Exporta [start, end) de `table`. Retorna (linhas, segundos)."""
+    if table not in TABLES:
+        raise ValueError(f"Tabela desconhecida: {table}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato desconhecido: {fmt}")
+
+    started = time.perf_counter()
+    rows = iter_rows(conn, table, start, end, fetch_size, device_id)
+
+    if fmt == "col":
+        if out_path is None:
+            count = write_columnar(rows, sys.stdout.buffer, table)
+        else:
+            with open(out_path, "wb") as f:
+                count = write_columnar(rows, f, table)
+    else:
+        writer = write_csv if fmt == "csv" else write_ndjson
+        out = _open_text(out_path)
+        try:
+            count = writer(rows, out, table)
+        finally:
+            if out_path is None:
+                out.flush()
+                out.detach()
+            else:
+                out.close()
+
+    return count, time.perf_counter() - started
+
+# ==================================================
+# MAIN
+# ==================================================
+
+def main():
+    import storage
+
+    parser = argparse.ArgumentParser(description="Exporta dados do health.db em streaming")
+    parser.add_argument("table", choices=sorted(TABLES))
+    parser.add_argument("--db", default=str(DB_PATH))
+    parser.add_argument("--start", help="data/hora local (padrão: início da tabela)")
+    parser.add_argument("--end", help="data/hora local, exclusivo (padrão: fim da tabela)")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("-o", "--output", help="arquivo de saída (padrão: stdout)")
+    parser.add_argument("--fetch", type=int, default=FETCH_SIZE)
+    parser.add_argument("--device", type=int, default=shards.PRIMARY_DEVICE,
+                        help="device_id da pulseira (padrão: 0, a principal)")
+    args = parser.parse_args()
+
+    conn = storage.connect(args.db)
+    lo, hi = table_bounds(conn, args.table, args.device)
+    start = storage.to_epoch(args.start) if args.start else lo
+    end = storage.to_epoch(args.end) if args.end else hi
+
+    count, seconds = export(conn, args.table, start, end, args.format, args.output, args.fetch,
+                            args.device)
+    conn.close()
+
+    rate = count / seconds if seconds else 0
+    print(f"📤 {count} linhas de {args.table} em {seconds:.2f}s ({rate:,.0f} linhas/s)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+gatt_cache.py
+
+Perfil GATT persistido por pulseira (MAC + revisão de firmware).
+
+Antes (v7_reconnect_battery_v3_fixed):
+- Cada reconexão fazia a descoberta completa de serviços (10 serviços,
+  ~40 características na Mi Band 4), chamava get_services() de novo
+  e ainda dormia 2 s "para garantir"
+
+O layout da pulseira não muda entre conexões (ver a descoberta em
+versions/logs/2026-02-01_battery_charging.log), então:
+- Na primeira conexão: descoberta completa, o perfil (serviço e handle
+  de cada característica usada) vai para gatt_cache.json
+- Nas seguintes: BleakClient(services=...) só descobre os serviços que
+  o monitor usa e as características são resolvidas pelo handle salvo
+  (também evita o erro "Multiple Characteristics with this UUID")
+- A revisão de firmware (0x2A28) é lida a cada conexão; se mudou,
+  o perfil é descartado e refeito
+
+Uso:
+    services = gatt_cache.service_filter(MAC)
+    async with BleakClient(MAC, services=services) as client:
+        chars = await gatt_cache.resolve(client, MAC)
+        await client.start_notify(gatt_cache.char(chars, UUID_HR_MEAS), ...)
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+
+# ==================================================
+# CONFIGURAÇÃO
+# ==================================================
+
+CACHE_PATH = Path("gatt_cache.json")
+
+UUID_FIRMWARE = "00002a28-0000-1000-8000-00805f9b34fb"
+
+# Características usadas pelos monitores (os serviços delas entram no filtro)
+WANTED_CHARS = (
+    "00000009-0000-3512-2118-0009af100700",   # auth (fee1)
+    "00002a37-0000-1000-8000-00805f9b34fb",   # HR measurement (180d)
+    "00002a39-0000-1000-8000-00805f9b34fb",   # HR control point (180d)
+    "00000006-0000-3512-2118-0009af100700",   # bateria Xiaomi (fee0)
+    "00000007-0000-3512-2118-0009af100700",   # passos realtime (fee0)
+    "00000004-0000-3512-2118-0009af100700",   # atividade: controle (fee0)
+    "00000005-0000-3512-2118-0009af100700",   # atividade: dados (fee0)
+    UUID_FIRMWARE,                            # revisão de firmware (180a)
+)
+
+stats = {
+    "hits": 0,
+    "misses": 0,
+    "invalidations": 0,
+}
+
+# ==================================================
+# ARQUIVO
+# ==================================================
+
+def load_cache(path=CACHE_PATH):
+    path = Path(path)
+    if not path.exists():
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # Cache corrompido: só custa uma descoberta completa
+        return {}
+
+def save_cache(cache, path=CACHE_PATH):
+    """Grava em arquivo temporário e troca (não deixa JSON pela metade)."""
+    path = Path(path)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+def get_profile(mac, path=CACHE_PATH):
+    return load_cache(path).get(mac.upper())
+
+def invalidate(mac, path=CACHE_PATH):
+    cache = load_cache(path)
+    if cache.pop(mac.upper(), None) is not None:
+        save_cache(cache, path)
+        stats["invalidations"] += 1
+
+# ==================================================
+# PERFIL
+# ==================================================
+
+def snapshot(services, firmware):
+    """Perfil a partir de client.services (só as características usadas)."""
+    chars = {}
+    for service in services:
+        for c in service.characteristics:
+            if c.uuid in WANTED_CHARS and c.uuid not in chars:
+                chars[c.uuid] = {
+                    "handle": c.handle,
+                    "service": service.uuid,
+                    "properties": list(c.properties),
+                }
+    return {
+        "firmware": firmware,
+        "chars": chars,
+        "saved_at": int(time.time()),
+    }
+
+def service_filter(mac, path=CACHE_PATH):
+    """
+    Serviços a descobrir na conexão: só os do perfil salvo,
+    ou None (descoberta completa) se ainda não há perfil.
+    """
+    profile = get_profile(mac, path)
+    if not profile:
+        return None
+    return sorted({c["service"] for c in profile["chars"].values()})
+
+async def read_firmware(client):
+    try:
+        data = await client.read_gatt_char(UUID_FIRMWARE)
+        return bytes(data).decode("utf-8", errors="replace").strip("\x00 ")
+    except Exception:
+        return None
+
+async def resolve(client, mac, path=CACHE_PATH):
+    """
+    Depois de conectar: confere o firmware contra o perfil salvo e
+    devolve {uuid: característica do bleak}. Refaz o perfil se mudou.
+    """
+    mac = mac.upper()
+    firmware = await read_firmware(client)
+    cache = load_cache(path)
+    profile = cache.get(mac)
+
+    if profile and profile["firmware"] == firmware:
+        chars = {}
+        for uuid, info in profile["chars"].items():
+            c = client.services.get_characteristic(info["handle"])
+            if c is None or c.uuid != uuid:
+                break
+            chars[uuid] = c
+        else:
+            stats["hits"] += 1
+            return chars
+
+    stats["misses"] += 1
+    current = snapshot(client.services, firmware)
+
+    if profile:
+        # Esta conexão usou o filtro do perfil antigo: a descoberta foi
+        # parcial. Descarta o perfil; a próxima conexão faz a completa.
+        del cache[mac]
+        stats["invalidations"] += 1
+        print(f"🧩 Perfil GATT de {mac} desatualizado (firmware {profile['firmware']} → {firmware})")
+    else:
+        cache[mac] = current
+        print(f"🧩 Perfil GATT salvo: {mac}, firmware {firmware}, {len(current['chars'])} características")
+    save_cache(cache, path)
+
+    return {uuid: client.services.get_characteristic(info["handle"])
+            for uuid, info in current["chars"].items()}
+
+def char(chars, uuid):
+    """Característica resolvida (por handle) ou o próprio UUID como fallback."""
+    return chars.get(uuid) or uuid
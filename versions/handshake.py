@@ -0,0 +1,155 @@
+"""
+handshake.py
+
+Autenticação da Mi Band 4 orientada a eventos + tempos de cada fase.
+
+Antes:
+- Depois de pedir o desafio, o código fazia polling de `challenge`
+  (20 × sleep(0.2)): até 200 ms de atraso à toa, 4 s no pior caso
+- A confirmação da autenticação (10 03 01) nunca era esperada
+- start_notify do HR só começava depois de tudo
+
+Agora (Handshake, um por conexão):
+- Futures resolvidas no próprio callback de notificação:
+    10 02 01 + 16 bytes → desafio
+    10 03 01            → autenticado (10 03 xx ≠ 01 → AuthError)
+- Passos independentes em paralelo: o pedido de desafio e a
+  assinatura do HR (CCCD) saem juntos; o comando 15 01 01 no HR
+  control point, que exige autenticação, vem depois
+- Tempo de cada fase desde o início da conexão:
+    connect, discovery, challenge, auth, first_bpm
+- Ao decodificar o primeiro BPM (estágio decode do pipeline, fora do
+  callback BLE), os tempos vão para o log e para
+  logs/connection_setup.jsonl (histórico para acompanhar a latência)
+
+Uso:
+    hs = Handshake()
+    async with BleakClient(...) as client:
+        hs.mark("connect")
+        ...
+        await hs.authenticate(client, UUID_AUTH, AUTH_KEY, UUID_HR_MEAS, hr_notification)
+        # no estágio decode, depois de um BPM válido: hs.on_sample()
+"""
+
+import asyncio
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+
+from Crypto.Cipher import AES
+
+# ==================================================
+# CONFIGURAÇÃO
+# ==================================================
+
+AUTH_TIMEOUT = 4.0            # s para o desafio e para a confirmação
+
+SETUP_LOG = Path("logs/connection_setup.jsonl")
+
+CHALLENGE = b"\x10\x02\x01"
+AUTH_RESPONSE = b"\x10\x03"
+AUTH_OK = b"\x10\x03\x01"
+
+REQUEST_CHALLENGE = b"\x02\x00"
+SEND_KEY_PREFIX = b"\x03\x00"
+
+PHASES = ("connect", "discovery", "challenge", "auth", "first_bpm")
+
+class AuthError(Exception):
+    pass
+
+def encrypt(key, msg):
+    return AES.new(key, AES.MODE_ECB).encrypt(msg)
+
+# ==================================================
+# HANDSHAKE
+# ==================================================
+
+class Handshake:
+    def __init__(self, mac=None, started=None):
+        loop = asyncio.get_running_loop()
+        self.mac = mac
+        self.started = started if started is not None else time.monotonic()
+        self.challenge = loop.create_future()
+        self.authenticated = loop.create_future()
+        self.marks = {}
+        self.recorded = False
+
+    def mark(self, phase):
+        """Registra o instante (s desde o início) da primeira vez que a fase ocorre."""
+        if phase not in self.marks:
+            self.marks[phase] = time.monotonic() - self.started
+
+    def on_notify(self, _, data):
+        """Callback da característica de auth: só resolve futures."""
+        data = bytes(data)
+        if data[:3] == CHALLENGE:
+            if not self.challenge.done():
+                self.mark("challenge")
+                self.challenge.set_result(data[3:19])
+        elif data[:2] == AUTH_RESPONSE:
+            if not self.authenticated.done():
+                if data[:3] == AUTH_OK:
+                    self.mark("auth")
+                    self.authenticated.set_result(True)
+                else:
+                    self.authenticated.set_exception(AuthError(f"Autenticação recusada ({data.hex()})"))
+
+    async def authenticate(self, client, auth_char, key, hr_char=None, hr_callback=None,
+                           timeout=AUTH_TIMEOUT):
+        """
+        Desafio/resposta com AES. Se hr_char for passado, a assinatura do HR
+        é feita em paralelo com o pedido de desafio.
+        """
+        await client.start_notify(auth_char, self.on_notify)
+
+        steps = [client.write_gatt_char(auth_char, REQUEST_CHALLENGE, response=False)]
+        if hr_char is not None:
+            steps.append(client.start_notify(hr_char, hr_callback))
+        await asyncio.gather(*steps)
+
+        try:
+            challenge = await asyncio.wait_for(self.challenge, timeout)
+        except asyncio.TimeoutError:
+            raise AuthError("Auth challenge não recebido")
+
+        await client.write_gatt_char(
+            auth_char,
+            SEND_KEY_PREFIX + encrypt(key, challenge),
+            response=False
+        )
+
+        try:
+            await asyncio.wait_for(self.authenticated, timeout)
+        except asyncio.TimeoutError:
+            raise AuthError("Confirmação de autenticação não recebida")
+
+    def on_sample(self):
+        """Chamado a cada BPM; só o primeiro faz algo."""
+        if self.recorded:
+            return
+        self.mark("first_bpm")
+        self.recorded = True
+        print(f"⏱️ Conexão: {self.describe()}")
+        self.record()
+
+    def phases_ms(self):
+        return {phase: round(self.marks[phase] * 1000) for phase in PHASES if phase in self.marks}
+
+    def describe(self):
+        return ", ".join(f"{phase} {ms} ms" for phase, ms in self.phases_ms().items())
+
+    def record(self, path=SETUP_LOG):
+        entry = {
+            "ts": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "mac": self.mac,
+            **self.phases_ms(),
+        }
+        try:
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            print(f"⚠️ Não foi possível gravar {path}: {e}")
@@ -0,0 +1,312 @@
+"""
+history.py
+
+Sincronização do histórico gravado na pulseira (fetch 0x0004 + dados 0x0005).
+
+Problema:
+- Fora de alcance, heart_rate fica com buracos, mas a Mi Band continua
+  gravando por minuto (tipo, intensidade, passos, HR) na memória dela
+
+Protocolo (o mesmo do Gadgetbridge para as Huami):
+- 0x0004 ← 01 01 + data inicial (ano LE, mês, dia, hora, min, 0, fuso em 1/4 h)
+- 0x0004 → 10 01 01 + nº de minutos (uint32 LE) + data do 1º minuto
+           (10 01 01 com 0 minutos, ou status ≠ 01: nada a buscar)
+- 0x0004 ← 02 (começa a transferência)
+- 0x0005 → pacotes: contador (1 byte) + registros de 4 bytes por minuto
+           (tipo, intensidade, passos, HR; HR 0 ou 255 = sem leitura)
+- 0x0004 → 10 02 01 (fim)
+A pulseira pode devolver menos minutos que o pedido: repete a partir
+do último recebido até chegar na hora da conexão.
+
+Sincronização (HistorySync, uma por pulseira):
+- Cursor por pulseira na tabela sync_state (migração 7): início do
+  próximo minuto a buscar. Sem cursor: últimas INITIAL_WINDOW horas
+- Roda em background depois do setup: o HR em tempo real volta antes,
+  a transferência corre em paralelo
+- Gravação em lotes de INSERT_CHUNK minutos numa thread, cada lote na
+  sua transação junto com o avanço do cursor (queda no meio = retoma
+  do último lote gravado)
+- Minutos que já têm HR / passos em tempo real são pulados (sem
+  duplicar amostras nem somar passos duas vezes)
+- Pacote perdido (contador fora de ordem) aborta a busca sem avançar
+  o cursor; a próxima conexão tenta de novo
+
+Uso:
+    sync = HistorySync(device=0, db_path=DB_PATH)
+    sync.start(client, UUID_FETCH, UUID_ACTIVITY_DATA)
+    ...
+    await sync.stop()
+"""
+
+import asyncio
+import time
+from datetime import datetime
+
+import rollups
+import storage
+from battery import decode_datetime
+from migrations import transaction
+
+# ==================================================
+# CONFIGURAÇÃO
+# ==================================================
+
+INITIAL_WINDOW = 24 * 3600    # s buscados na primeira sincronização da pulseira
+MIN_WINDOW = 120              # s: buraco menor que isso não vale uma busca
+INSERT_CHUNK = 360            # minutos por transação
+RESPONSE_TIMEOUT = 10.0       # s até a resposta do 01 01
+IDLE_TIMEOUT = 10.0           # s sem pacote durante a transferência
+MAX_FETCHES = 30              # buscas por sincronização (a pulseira devolve aos pedaços)
+
+MINUTE = 60
+RECORD_SIZE = 4
+NO_HR = (0, 255)
+
+CMD_START = b"\x01\x01"
+CMD_TRANSFER = b"\x02"
+
+# ==================================================
+# PROTOCOLO
+# ==================================================
+
+def start_command(since):
+    """01 01 + data local do minuto `since` (epoch)."""
+    t = datetime.fromtimestamp(since)
+    offset = t.astimezone().utcoffset()
+    quarters = int(offset.total_seconds() // 900) if offset is not None else 0
+    return CMD_START + bytes([
+        t.year & 0xff, t.year >> 8, t.month, t.day, t.hour, t.minute, 0,
+        quarters & 0xff,
+    ])
+
+def decode_header(data):
+    """
+    Resposta ao 01 01 → (minutos, epoch do 1º minuto), (0, None) se não há
+    nada a buscar, ou None se não é uma resposta de início.
+    """
+    data = bytes(data)
+    if len(data) < 3 or data[0] != 0x10 or data[1] != 0x01:
+        return None
+    if data[2] != 0x01 or len(data) < 7:
+        return 0, None
+    count = int.from_bytes(data[3:7], "little")
+    return count, decode_datetime(data, 7)
+
+def is_done(data):
+    data = bytes(data)
+    return len(data) >= 3 and data[0] == 0x10 and data[1] == 0x02
+
+def decode_records(payload, start):
+    """Registros de 4 bytes → [(ts, tipo, intensidade, passos, hr), ...]."""
+    samples = []
+    for i in range(len(payload) // RECORD_SIZE):
+        kind, intensity, steps, hr = payload[i * RECORD_SIZE:(i + 1) * RECORD_SIZE]
+        samples.append((start + i * MINUTE, kind, intensity, steps, hr))
+    return samples
+
+# ==================================================
+# BANCO (roda numa thread)
+# ==================================================
+
+def load_cursor(db_path, device):
+    conn = storage.connect(db_path)
+    try:
+        row = conn.execute("SELECT last_ts FROM sync_state WHERE device_id = ?", (device,)).fetchone()
+        return row[0] if row else None
+    finally:
+        conn.close()
+
+def _covered(conn, table, column, device, start, end):
+    """Minutos de [start, end) que já têm dado em tempo real."""
+    return {
+        row[0] for row in conn.execute(
+            f"SELECT DISTINCT {column} / 60 FROM {table} "
+            f"WHERE device_id = ? AND {column} >= ? AND {column} < ?",
+            (device, start, end)
+        )
+    }
+
+def save_chunk(db_path, device, samples, cursor):
+    """Grava um lote de minutos + cursor numa transação. Retorna (hr, passos) gravados."""
+    start = samples[0][0]
+    end = samples[-1][0] + MINUTE
+
+    conn = storage.connect(db_path)
+    conn.isolation_level = None
+    try:
+        with transaction(conn, "IMMEDIATE"):
+            hr_seen = _covered(conn, "heart_rate", "ts", device, start, end)
+            steps_seen = _covered(conn, "activity_1m", "bucket", device, start, end)
+
+            hr_rows = [
+                (ts, hr, device) for ts, _, _, _, hr in samples
+                if hr not in NO_HR and ts // MINUTE not in hr_seen
+            ]
+            step_rows = [
+                (ts, device, steps, 0, 0, 0) for ts, _, _, steps, _ in samples
+                if steps and ts // MINUTE not in steps_seen
+            ]
+
+            conn.executemany(storage.INSERT_SQL["heart_rate"], hr_rows)
+            if device == 0:
+                rollups.apply(conn, [(ts, hr) for ts, hr, _ in hr_rows])
+            conn.executemany(storage.INSERT_SQL["activity_1m"], step_rows)
+            conn.execute(
+                "INSERT INTO sync_state (device_id, last_ts, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(device_id) DO UPDATE SET last_ts = excluded.last_ts, "
+                "updated_at = excluded.updated_at",
+                (device, cursor, int(time.time()))
+            )
+        return len(hr_rows), len(step_rows)
+    finally:
+        conn.close()
+
+# ==================================================
+# SINCRONIZAÇÃO
+# ==================================================
+
+class HistorySync:
+    def __init__(self, device=0, db_path=storage.DB_PATH, label=""):
+        self.device = device
+        self.db_path = db_path
+        self.prefix = f"[{label}] " if label else ""
+        self.task = None
+
+        self.header = None
+        self.done = None
+        self.payload = bytearray()
+        self.counter = None
+        self.lost = False
+        self.last_packet = 0.0
+
+        self.stats = {
+            "syncs": 0,
+            "fetches": 0,
+            "minutes": 0,
+            "hr_rows": 0,
+            "step_rows": 0,
+            "errors": 0,
+            "last_seconds": 0.0,
+        }
+
+    # ------------------------------
+    # CALLBACKS (só guardam bytes)
+    # ------------------------------
+
+    def on_control(self, _, data):
+        if self.header is not None and not self.header.done():
+            header = decode_header(data)
+            if header is not None:
+                self.header.set_result(header)
+                return
+        if self.done is not None and not self.done.done() and is_done(data):
+            self.done.set_result(bytes(data))
+
+    def on_data(self, _, data):
+        if not data:
+            return
+        expected = None if self.counter is None else (self.counter + 1) & 0xff
+        if expected is not None and data[0] != expected:
+            self.lost = True
+        self.counter = data[0]
+        self.payload += data[1:]
+        self.last_packet = time.monotonic()
+
+    # ------------------------------
+    # TRANSFERÊNCIA
+    # ------------------------------
+
+    async def fetch(self, client, ctrl, since):
+        """Uma busca a partir de `since` → (epoch do 1º minuto, registros) ou (None, [])."""
+        loop = asyncio.get_running_loop()
+        self.header = loop.create_future()
+        self.done = loop.create_future()
+        self.payload = bytearray()
+        self.counter = None
+        self.lost = False
+
+        await client.write_gatt_char(ctrl, start_command(since), response=False)
+        count, start = await asyncio.wait_for(self.header, RESPONSE_TIMEOUT)
+        if not count or start is None:
+            return None, []
+
+        self.last_packet = time.monotonic()
+        await client.write_gatt_char(ctrl, CMD_TRANSFER, response=False)
+        while not self.done.done():
+            await asyncio.wait({self.done}, timeout=1.0)
+            if not self.done.done() and time.monotonic() - self.last_packet > IDLE_TIMEOUT:
+                raise TimeoutError(f"transferência parada em {len(self.payload) // RECORD_SIZE}/{count} minutos")
+
+        if self.lost:
+            raise IOError("pacote de histórico perdido")
+        self.stats["fetches"] += 1
+        return start, decode_records(self.payload, start)
+
+    async def sync(self, client, ctrl, data, until=None):
+        started = time.monotonic()
+        until = int(until if until is not None else time.time()) // MINUTE * MINUTE
+        cursor = await asyncio.to_thread(load_cursor, self.db_path, self.device)
+        since = cursor if cursor is not None else until - INITIAL_WINDOW
+        if until - since < MIN_WINDOW:
+            return
+
+        await client.start_notify(ctrl, self.on_control)
+        await client.start_notify(data, self.on_data)
+        minutes = hr_rows = step_rows = 0
+        try:
+            for _ in range(MAX_FETCHES):
+                start, samples = await self.fetch(client, ctrl, since)
+                # Só até a hora da conexão: dali em diante é tempo real
+                samples = [s for s in samples if since <= s[0] < until]
+                if not samples:
+                    break
+
+                for i in range(0, len(samples), INSERT_CHUNK):
+                    chunk = samples[i:i + INSERT_CHUNK]
+                    cursor = chunk[-1][0] + MINUTE
+                    hr, steps = await asyncio.to_thread(save_chunk, self.db_path, self.device, chunk, cursor)
+                    minutes += len(chunk)
+                    hr_rows += hr
+                    step_rows += steps
+
+                if cursor <= since or until - cursor < MIN_WINDOW:
+                    break
+                since = cursor
+        finally:
+            for char in (data, ctrl):
+                try:
+                    await client.stop_notify(char)
+                except Exception:
+                    pass
+
+        elapsed = time.monotonic() - started
+        self.stats["syncs"] += 1
+        self.stats["minutes"] += minutes
+        self.stats["hr_rows"] += hr_rows
+        self.stats["step_rows"] += step_rows
+        self.stats["last_seconds"] = elapsed
+        if minutes:
+            print(
+                f"📥 {self.prefix}Histórico: {minutes} min sincronizados "
+                f"({hr_rows} HR, {step_rows} min com passos) em {elapsed:.1f}s"
+            )
+
+    async def run(self, client, ctrl, data):
+        try:
+            await self.sync(client, ctrl, data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"⚠️ {self.prefix}Sincronização do histórico falhou: {e}")
+
+    def start(self, client, ctrl, data):
+        """Dispara a sincronização em background (não segura o HR em tempo real)."""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run(client, ctrl, data))
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
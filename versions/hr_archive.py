@@ -0,0 +1,432 @@
+"""
+hr_archive.py
+
+Arquivo frio compacto para batimentos antigos.
+
+Uma linha de heart_rate no SQLite custa ~40–60 bytes para guardar
+1 byte de BPM + um timestamp que sobe ~1 s por amostra. Aqui os dias
+já fechados são empacotados em blocos:
+
+- timestamps → delta + RLE: pares (delta, repetições) em varint
+- BPM        → RLE: pares (bpm, repetições) em varint
+
+Um arquivo por mês e pulseira: archive/hr_YYYY_MM.hra para a principal,
+archive/hr_dN_YYYY_MM.hra para a pulseira de device_id N.
+
+Formato do arquivo:
+    b"HRA1"
+    bloco*:
+        crc32 (4 bytes, big endian) do payload
+        varint início_ts, varint fim_ts, varint count, varint tamanho
+        payload
+
+O cabeçalho de cada bloco permite pular blocos fora do intervalo
+pedido, então a leitura é em streaming (não carrega o arquivo todo).
+
+Selagem (seal_days):
+- archive/sealed.json guarda, por arquivo, até que id e até que ts as
+  amostras já foram seladas
+- Amostra que chega depois para um dia já selado (log_import, histórico
+  da pulseira) tem id maior: o dia é reselado, e o arquivo é reescrito
+  a partir do primeiro bloco afetado (continua ordenado por ts)
+
+Uso:
+    python versions/hr_archive.py --db health.db --out archive --before 2026-02-01
+"""
+
+import argparse
+import heapq
+import json
+import os
+import struct
+import zlib
+from datetime import date, datetime
+from itertools import chain
+from operator import itemgetter
+from pathlib import Path
+
+import shards
+
+# ==================================================
+# CONFIGURAÇÃO
+# ==================================================
+
+DB_PATH = Path("health.db")
+ARCHIVE_DIR = Path("archive")
+
+MAGIC = b"HRA1"
+BLOCK_ROWS = 4096          # amostras por bloco
+ARCHIVE_NAME = "hr_{year:04d}_{month:02d}.hra"
+DEVICE_ARCHIVE_NAME = "hr_d{device}_{year:04d}_{month:02d}.hra"
+SEALED_NAME = "sealed.json"   # arquivo → [último id selado, ts selado até (exclusivo)]
+
+# ==================================================
+# VARINT
+# ==================================================
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(buf, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+def read_varint_stream(f):
+    result = 0
+    shift = 0
+    while True:
+        b = f.read(1)
+        if not b:
+            raise EOFError
+        byte = b[0]
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result
+        shift += 7
+
+# ==================================================
+# BLOCOS
+# ==================================================
+
+def _runs(values):
+    """[a, a, a, b] → [(a, 3), (b, 1)]"""
+    runs = []
+    prev = None
+    count = 0
+    for v in values:
+        if v == prev:
+            count += 1
+        else:
+            if count:
+                runs.append((prev, count))
+            prev, count = v, 1
+    if count:
+        runs.append((prev, count))
+    return runs
+
+def encode_block(rows):
+    """rows: [(ts, bpm), ...] → bytes (cabeçalho + payload). Ordena por ts."""
+    # Delta negativo não cabe em varint
+    rows = sorted(rows, key=itemgetter(0))
+    start = rows[0][0]
+    end = rows[-1][0]
+
+    deltas = []
+    prev = start
+    for ts, _ in rows:
+        deltas.append(ts - prev)
+        prev = ts
+
+    payload = bytearray()
+    ts_runs = _runs(deltas)
+    write_varint(payload, len(ts_runs))
+    for delta, run in ts_runs:
+        write_varint(payload, delta)
+        write_varint(payload, run)
+    for bpm, run in _runs(bpm for _, bpm in rows):
+        write_varint(payload, bpm)
+        write_varint(payload, run)
+
+    header = bytearray(struct.pack(">I", zlib.crc32(payload)))
+    write_varint(header, start)
+    write_varint(header, end)
+    write_varint(header, len(rows))
+    write_varint(header, len(payload))
+    return bytes(header + payload)
+
+def decode_payload(payload, start, count):
+    """Gera (ts, bpm) de um payload de bloco."""
+    pos = 0
+    n_runs, pos = read_varint(payload, pos)
+
+    timestamps = []
+    ts = start
+    for _ in range(n_runs):
+        delta, pos = read_varint(payload, pos)
+        run, pos = read_varint(payload, pos)
+        for _ in range(run):
+            ts += delta
+            timestamps.append(ts)
+
+    i = 0
+    while i < count:
+        bpm, pos = read_varint(payload, pos)
+        run, pos = read_varint(payload, pos)
+        for _ in range(run):
+            yield timestamps[i], bpm
+            i += 1
+
+# ==================================================
+# ARQUIVO
+# ==================================================
+
+def iter_blocks(path):
+    """Gera (início, fim, count, offset_payload, tamanho) sem ler os payloads."""
+    with open(path, "rb") as f:
+        if f.read(4) != MAGIC:
+            raise ValueError(f"{path}: não é um arquivo HRA1")
+        while True:
+            head = f.read(4)
+            if not head:
+                return
+            start = read_varint_stream(f)
+            end = read_varint_stream(f)
+            count = read_varint_stream(f)
+            size = read_varint_stream(f)
+            offset = f.tell()
+            yield start, end, count, offset, size
+            f.seek(offset + size)
+
+def _read_blocks(f, path, start=None, end=None):
+    """Gera (ts, bpm) dos blocos a partir da posição atual de `f`."""
+    while True:
+        head = f.read(4)
+        if not head:
+            return
+        (crc,) = struct.unpack(">I", head)
+        b_start = read_varint_stream(f)
+        b_end = read_varint_stream(f)
+        count = read_varint_stream(f)
+        size = read_varint_stream(f)
+
+        if start is not None and (b_end < start or b_start >= end):
+            f.seek(size, 1)
+            continue
+
+        payload = f.read(size)
+        if zlib.crc32(payload) != crc:
+            raise ValueError(f"{path}: bloco corrompido em {b_start}")
+
+        for ts, bpm in decode_payload(payload, b_start, count):
+            if start is None or start <= ts < end:
+                yield ts, bpm
+
+def read_range(path, start, end):
+    """Gera (ts, bpm) com start <= ts < end, decodificando só os blocos necessários."""
+    with open(path, "rb") as f:
+        if f.read(4) != MAGIC:
+            raise ValueError(f"{path}: não é um arquivo HRA1")
+        yield from _read_blocks(f, path, start, end)
+
+def _read_from(path, offset):
+    """Gera (ts, bpm) de todos os blocos a partir do byte `offset`."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        yield from _read_blocks(f, path)
+
+def _write_blocks(f, rows, block_rows):
+    written = 0
+    block = []
+    for row in rows:
+        block.append(row)
+        if len(block) >= block_rows:
+            data = encode_block(block)
+            f.write(data)
+            written += len(data)
+            block = []
+    if block:
+        data = encode_block(block)
+        f.write(data)
+        written += len(data)
+    return written
+
+def append_rows(path, rows, block_rows=BLOCK_ROWS):
+    """Acrescenta amostras (ordenadas) ao arquivo, em blocos. Retorna bytes escritos."""
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return 0
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+
+    with open(path, "ab") as f:
+        if f.tell() == 0:
+            f.write(MAGIC)
+            written += len(MAGIC)
+        written += _write_blocks(f, chain([first], rows), block_rows)
+
+    return written
+
+def merge_rows(path, rows, block_rows=BLOCK_ROWS):
+    """
+    Junta amostras (em ordem de ts) ao arquivo, que continua ordenado.
+    Blocos que terminam antes da primeira amostra nova são copiados como
+    estão; do primeiro bloco afetado em diante o arquivo é reescrito.
+    Grava num .tmp e troca no final. Retorna quantos bytes o arquivo cresceu.
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return 0
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    old_size = path.stat().st_size if path.exists() else 0
+
+    keep = 0                  # bytes do início que não mudam
+    if old_size:
+        keep = len(MAGIC)
+        for _, end, _, offset, size in iter_blocks(path):
+            if end >= first[0]:
+                break
+            keep = offset + size
+
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as out:
+        if keep:
+            with open(path, "rb") as f:
+                out.write(f.read(keep))
+        else:
+            out.write(MAGIC)
+        tail = _read_from(path, keep) if keep < old_size else iter(())
+        _write_blocks(out, heapq.merge(tail, chain([first], rows), key=itemgetter(0)), block_rows)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp, path)
+
+    return path.stat().st_size - old_size
+
+# ==================================================
+# SELAGEM DE DIAS
+# ==================================================
+
+def archive_path(out_dir, year, month, device_id=shards.PRIMARY_DEVICE):
+    if device_id == shards.PRIMARY_DEVICE:
+        return Path(out_dir) / ARCHIVE_NAME.format(year=year, month=month)
+    return Path(out_dir) / DEVICE_ARCHIVE_NAME.format(device=device_id, year=year, month=month)
+
+def archived_until(path):
+    """Maior timestamp já arquivado no arquivo (ou None)."""
+    if not path.exists():
+        return None
+    last = None
+    for _, end, _, _, _ in iter_blocks(path):
+        last = end if last is None else max(last, end)
+    return last
+
+def load_sealed(out_dir):
+    path = Path(out_dir) / SEALED_NAME
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_sealed(out_dir, sealed):
+    path = Path(out_dir) / SEALED_NAME
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(sealed, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+def _late_months(conn, out_dir, sealed, upto):
+    """(pulseira, ano, mês) com amostras gravadas depois da selagem em dias já selados."""
+    if not sealed:
+        return set()
+    after = min(last for last, _ in sealed.values())
+    until = max(ts for _, ts in sealed.values())
+
+    late = set()
+    for row_id, device_id, ts in shards.iter_ids(conn, after, upto, until):
+        day = datetime.fromtimestamp(ts)
+        entry = sealed.get(archive_path(out_dir, day.year, day.month, device_id).name)
+        if entry and row_id > entry[0] and ts < entry[1]:
+            late.add((device_id, day.year, day.month))
+    return late
+
+def seal_days(conn, out_dir=ARCHIVE_DIR, before=None):
+    """
+    Empacota no arquivo frio os dias fechados (anteriores a `before`,
+    padrão: hoje) de todas as pulseiras. Idempotente: cada arquivo recebe
+    só as amostras que ainda não selou, inclusive as que chegaram depois
+    para dias já selados.
+    """
+    before = before or date.today()
+    cutoff = int(datetime.combine(before, datetime.min.time()).timestamp())
+
+    upto = shards.last_id(conn)          # amostras gravadas depois ficam para a próxima
+    sealed = load_sealed(out_dir)
+
+    late = _late_months(conn, out_dir, sealed, upto)
+    todo = set(late)
+    months = shards.shard_months(conn)
+    for device_id in shards.device_ids(conn):
+        lo = conn.execute(
+            "SELECT MIN(ts) FROM main.heart_rate WHERE device_id = ?", (device_id,)
+        ).fetchone()[0]
+        if months:
+            first = shards.month_start(*months[0])
+            lo = first if lo is None else min(lo, first)
+        if lo is None:
+            continue
+        todo.update((device_id, year, month) for year, month, _, _ in shards.months_in_range(lo, cutoff))
+
+    result = {}
+    for device_id, year, month in sorted(todo):
+        path = archive_path(out_dir, year, month, device_id)
+        ny, nm = shards.next_month(year, month)
+        m_lo, m_hi = shards.month_start(year, month), shards.month_start(ny, nm)
+
+        entry = sealed.get(path.name)
+        if entry is None:
+            # Arquivo de antes do sealed.json: selado até o último ts dele
+            done = archived_until(path)
+            entry = [upto, m_lo if done is None else done + 1]
+        last, start = entry
+        end = min(m_hi, cutoff)
+
+        parts = []
+        if (device_id, year, month) in late:
+            # Atrasadas: dias já selados, ids novos
+            parts.append(shards.iter_heart_rate(conn, m_lo, start, device_id=device_id,
+                                                min_id=last, max_id=upto))
+        if start < end:
+            parts.append(shards.iter_heart_rate(conn, start, end, device_id=device_id, max_id=upto))
+
+        size = merge_rows(path, heapq.merge(*parts, key=itemgetter(0))) if parts else 0
+        sealed[path.name] = [upto, max(start, end)]
+        if size:
+            result[path.name] = size
+            save_sealed(out_dir, sealed)
+
+    if todo:
+        save_sealed(out_dir, sealed)
+    return result
+
+# ==================================================
+# MAIN
+# ==================================================
+
+def main():
+    import storage
+
+    parser = argparse.ArgumentParser(description="Arquivo frio compacto de BPM")
+    parser.add_argument("--db", default=str(DB_PATH))
+    parser.add_argument("--out", default=str(ARCHIVE_DIR))
+    parser.add_argument("--before", type=date.fromisoformat, default=None,
+                        help="arquiva dias anteriores a esta data (padrão: hoje)")
+    args = parser.parse_args()
+
+    conn = storage.connect(args.db)
+    result = seal_days(conn, args.out, args.before)
+    conn.close()
+
+    for name, size in result.items():
+        print(f"🧊 {name}: +{size} bytes")
+    if not result:
+        print("Nada novo para arquivar.")
+
+if __name__ == "__main__":
+    main()
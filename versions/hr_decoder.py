@@ -0,0 +1,213 @@
+"""
+hr_decoder.py
+
+Decodificador completo da característica Heart Rate Measurement (0x2A37).
+
+Antes: todo hr_notification fazia `bpm = data[1]` e ignorava as flags.
+- Formato uint16 (flags bit 0) dava BPM errado
+- RR intervals e energia gasta eram descartados
+
+Layout (Bluetooth SIG):
+    flags (1 byte)
+        bit 0   → BPM em uint16 (senão uint8)
+        bit 1   → contato com a pele detectado
+        bit 2   → sensor de contato suportado
+        bit 3   → energia gasta presente (uint16, kJ)
+        bit 4   → RR intervals presentes (uint16 cada, 1/1024 s)
+    BPM (1 ou 2 bytes)
+    energia (2 bytes, opcional)
+    RR* (2 bytes cada, até o fim do payload)
+
+Caminho quente (callback BLE):
+- decode_into() escreve direto num ring buffer pré-alocado (HRRing),
+  arrays de tamanho fixo: nenhuma alocação por amostra
+- push() usa o ring padrão do processo
+
+Caminho frio (logs, diagnóstico):
+- decode() devolve (bpm, contato, energia, [rr...])
+
+Uso nos monitores:
+    bpm = hr_decoder.push(data, now.timestamp())
+    if bpm is None: return   # payload inválido
+"""
+
+from array import array
+
+# ==================================================
+# CONFIGURAÇÃO
+# ==================================================
+
+RING_SIZE = 4096           # amostras de BPM mantidas (~1 h a 1 Hz)
+RR_RING_SIZE = 16384       # RR intervals mantidos
+
+FLAG_UINT16 = 0x01
+FLAG_CONTACT_DETECTED = 0x02
+FLAG_CONTACT_SUPPORTED = 0x04
+FLAG_ENERGY = 0x08
+FLAG_RR = 0x10
+
+RR_UNIT_MS = 1000 / 1024
+
+NO_ENERGY = -1
+
+# ==================================================
+# RING BUFFER
+# ==================================================
+
+class HRRing:
+    """
+    Últimas amostras decodificadas, em arrays de tamanho fixo.
+
+    `count` e `rr_count` são contadores absolutos (nunca voltam);
+    a posição no array é contador % tamanho.
+    """
+
+    def __init__(self, size=RING_SIZE, rr_size=RR_RING_SIZE):
+        self.size = size
+        self.rr_size = rr_size
+
+        self.ts = array("d", [0.0]) * size
+        self.bpm = array("H", [0]) * size
+        self.flags = array("B", [0]) * size
+        self.energy = array("i", [NO_ENERGY]) * size
+        self.rr_end = array("Q", [0]) * size    # rr_count depois da amostra
+
+        self.rr = array("H", [0]) * rr_size
+
+        self.count = 0
+        self.rr_count = 0
+        self.errors = 0
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def last_index(self):
+        return (self.count - 1) % self.size if self.count else None
+
+    def latest(self):
+        """(ts, bpm) da última amostra, ou None."""
+        i = self.last_index()
+        if i is None:
+            return None
+        return self.ts[i], self.bpm[i]
+
+    def rr_range(self, start, end):
+        """RR intervals (em ms) com contador absoluto em [start, end) ainda no ring."""
+        start = max(start, self.rr_count - self.rr_size)
+        for k in range(start, min(end, self.rr_count)):
+            yield self.rr[k % self.rr_size] * RR_UNIT_MS
+
+_default = HRRing()
+
+def default_ring():
+    return _default
+
+# ==================================================
+# DECODIFICAÇÃO
+# ==================================================
+
+def decode_into(ring, data, ts):
+    """
+    Decodifica `data` direto no ring. Retorna o BPM, ou None se o payload
+    estiver truncado (conta em ring.errors, nada é gravado).
+    """
+    n = len(data)
+    if n < 2:
+        ring.errors += 1
+        return None
+
+    flags = data[0]
+    if flags & FLAG_UINT16:
+        if n < 3:
+            ring.errors += 1
+            return None
+        bpm = data[1] | (data[2] << 8)
+        pos = 3
+    else:
+        bpm = data[1]
+        pos = 2
+
+    energy = NO_ENERGY
+    if flags & FLAG_ENERGY:
+        if n < pos + 2:
+            ring.errors += 1
+            return None
+        energy = data[pos] | (data[pos + 1] << 8)
+        pos += 2
+
+    i = ring.count % ring.size
+    ring.ts[i] = ts
+    ring.bpm[i] = bpm
+    ring.flags[i] = flags
+    ring.energy[i] = energy
+
+    if flags & FLAG_RR:
+        rr = ring.rr
+        rr_size = ring.rr_size
+        k = ring.rr_count
+        while pos + 1 < n:
+            rr[k % rr_size] = data[pos] | (data[pos + 1] << 8)
+            k += 1
+            pos += 2
+        ring.rr_count = k
+
+    ring.rr_end[i] = ring.rr_count
+    ring.count += 1
+    return bpm
+
+def push(data, ts):
+    """decode_into() no ring padrão do processo."""
+    return decode_into(_default, data, ts)
+
+def contact_status(flags):
+    """True/False se o sensor informa contato, None se não suporta."""
+    if not flags & FLAG_CONTACT_SUPPORTED:
+        return None
+    return bool(flags & FLAG_CONTACT_DETECTED)
+
+def decode(data):
+    """(bpm, contato, energia|None, [rr_ms, ...]) ou None se truncado."""
+    n = len(data)
+    if n < 2:
+        return None
+
+    flags = data[0]
+    if flags & FLAG_UINT16:
+        if n < 3:
+            return None
+        bpm = data[1] | (data[2] << 8)
+        pos = 3
+    else:
+        bpm = data[1]
+        pos = 2
+
+    energy = None
+    if flags & FLAG_ENERGY:
+        if n < pos + 2:
+            return None
+        energy = data[pos] | (data[pos + 1] << 8)
+        pos += 2
+
+    rr = []
+    if flags & FLAG_RR:
+        while pos + 1 < n:
+            rr.append((data[pos] | (data[pos + 1] << 8)) * RR_UNIT_MS)
+            pos += 2
+
+    return bpm, contact_status(flags), energy, rr
+
+def describe(data):
+    """Texto curto para logs de diagnóstico."""
+    result = decode(data)
+    if result is None:
+        return f"payload inválido ({bytes(data).hex()})"
+
+    bpm, contact, energy, rr = result
+    parts = [f"BPM={bpm}"]
+    if contact is not None:
+        parts.append("contato" if contact else "sem contato")
+    if energy is not None:
+        parts.append(f"energia={energy} kJ")
+    if rr:
+        parts.append("RR=" + ",".join(f"{v:.0f}" for v in rr) + " ms")
+    return " ".join(parts)
@@ -0,0 +1,203 @@
+"""
+hrv.py
+
+Variabilidade da frequência cardíaca (HRV) em streaming, a partir dos
+RR intervals da 0x2A37 (decodificados por hr_decoder).
+
+Métricas por janela deslizante (1, 5 e 60 min):
+- RMSSD  → raiz da média dos quadrados das diferenças sucessivas
+- SDNN   → desvio padrão dos RR
+- pNN50  → % de diferenças sucessivas > 50 ms
+
+Atualização O(1):
+- Cada janela mantém uma deque de batimentos e somas acumuladas
+  (Σrr, Σrr², Σdiff², nº de diffs, nº de NN50)
+- Novo RR soma; RR que sai da janela subtrai
+- Somas em inteiros (unidade bruta 1/1024 s): sem erro acumulado
+
+Filtro simples de artefato:
+- RR fora de [RR_MIN_MS, RR_MAX_MS] é descartado
+- Diferença sucessiva só conta entre dois RR válidos seguidos e sem
+  buraco maior que MAX_GAP na conexão
+
+Persistência:
+- A cada SUMMARY_INTERVAL segundos, um resumo por janela vai para a
+  tabela hrv_summary (migração 4) pelo writer de storage.py
+- Tendências são consultadas direto dessa tabela (summaries())
+
+Uso nos monitores (depois de hr_decoder.push):
+    hrv.record()
+"""
+
+import math
+from collections import deque
+
+import hr_decoder
+import storage
+
+# ==================================================
+# CONFIGURAÇÃO
+# ==================================================
+
+WINDOWS = (60, 300, 3600)     # segundos
+SUMMARY_INTERVAL = 60         # segundos entre resumos gravados
+MIN_BEATS = 10                # batimentos mínimos para gravar um resumo
+
+RR_MIN_MS = 300               # 200 BPM
+RR_MAX_MS = 2000              # 30 BPM
+MAX_GAP = 5.0                 # s sem RR quebram a sequência de diffs
+
+NN50_RAW = 50 * 1024 / 1000   # 50 ms em unidades de 1/1024 s
+
+_RR_MIN_RAW = RR_MIN_MS * 1024 / 1000
+_RR_MAX_RAW = RR_MAX_MS * 1024 / 1000
+
+# ==================================================
+# JANELA DESLIZANTE
+# ==================================================
+
+class Window:
+    """Somas de uma janela de `length` segundos (RR em unidades brutas)."""
+
+    def __init__(self, length):
+        self.length = length
+        self.beats = deque()      # (ts, rr, diff² ou -1, nn50)
+        self.sum_rr = 0
+        self.sum_rr_sq = 0
+        self.sum_diff_sq = 0
+        self.n_diff = 0
+        self.n_nn50 = 0
+
+    def add(self, ts, rr, diff):
+        diff_sq = -1
+        nn50 = 0
+        if diff is not None:
+            diff_sq = diff * diff
+            nn50 = 1 if abs(diff) > NN50_RAW else 0
+            self.sum_diff_sq += diff_sq
+            self.n_diff += 1
+            self.n_nn50 += nn50
+
+        self.beats.append((ts, rr, diff_sq, nn50))
+        self.sum_rr += rr
+        self.sum_rr_sq += rr * rr
+        self.expire(ts)
+
+    def expire(self, now):
+        limit = now - self.length
+        beats = self.beats
+        while beats and beats[0][0] <= limit:
+            _, rr, diff_sq, nn50 = beats.popleft()
+            self.sum_rr -= rr
+            self.sum_rr_sq -= rr * rr
+            if diff_sq >= 0:
+                self.sum_diff_sq -= diff_sq
+                self.n_diff -= 1
+                self.n_nn50 -= nn50
+
+    def metrics(self):
+        """(count, mean_rr_ms, rmssd_ms, sdnn_ms, pnn50) ou None sem dados."""
+        n = len(self.beats)
+        if n < 2 or not self.n_diff:
+            return None
+
+        unit = hr_decoder.RR_UNIT_MS
+        mean = self.sum_rr / n
+        var = max(0, self.sum_rr_sq * n - self.sum_rr * self.sum_rr) / (n * (n - 1))
+        rmssd = math.sqrt(self.sum_diff_sq / self.n_diff)
+        pnn50 = 100.0 * self.n_nn50 / self.n_diff
+        return n, mean * unit, rmssd * unit, math.sqrt(var) * unit, pnn50
+
+# ==================================================
+# MOTOR
+# ==================================================
+
+class HRVEngine:
+    def __init__(self, windows=WINDOWS):
+        self.windows = [Window(length) for length in windows]
+        self.last_rr = None
+        self.last_ts = None
+        self.rr_pos = 0           # próximo RR a ler do ring (contador absoluto)
+        self.next_summary = None
+        self.rejected = 0
+
+    def add_rr(self, ts, rr):
+        """Soma um RR (unidade bruta 1/1024 s) recebido em `ts` (epoch)."""
+        if not _RR_MIN_RAW <= rr <= _RR_MAX_RAW:
+            self.rejected += 1
+            self.last_rr = None
+            return
+
+        diff = None
+        if self.last_rr is not None and ts - self.last_ts <= MAX_GAP:
+            diff = rr - self.last_rr
+        self.last_rr = rr
+        self.last_ts = ts
+
+        for window in self.windows:
+            window.add(ts, rr, diff)
+
+    def update_from_ring(self, ring, ts):
+        """Consome os RR novos do ring do hr_decoder. Retorna quantos entraram."""
+        start = max(self.rr_pos, ring.rr_count - ring.rr_size)
+        end = ring.rr_count
+        rr = ring.rr
+        size = ring.rr_size
+        for k in range(start, end):
+            self.add_rr(ts, rr[k % size])
+        self.rr_pos = end
+        return end - start
+
+    def summarize(self, ts):
+        """Linhas para hrv_summary se o intervalo venceu; senão []."""
+        if self.next_summary is None:
+            self.next_summary = ts + SUMMARY_INTERVAL
+            return []
+        if ts < self.next_summary:
+            return []
+        self.next_summary = ts + SUMMARY_INTERVAL
+
+        rows = []
+        for window in self.windows:
+            window.expire(ts)
+            m = window.metrics()
+            if m is None or m[0] < MIN_BEATS:
+                continue
+            count, mean_rr, rmssd, sdnn, pnn50 = m
+            rows.append((int(ts), window.length, count,
+                         round(mean_rr, 1), round(rmssd, 2), round(sdnn, 2), round(pnn50, 2)))
+        return rows
+
+_default = HRVEngine()
+
+def record(ring=None, engine=None):
+    """
+    Chamado depois de cada hr_decoder.push: alimenta o motor com os RR
+    novos e enfileira os resumos vencidos no writer.
+    """
+    ring = ring or hr_decoder.default_ring()
+    engine = engine or _default
+
+    latest = ring.latest()
+    if latest is None:
+        return 0
+    ts = latest[0]
+
+    engine.update_from_ring(ring, ts)
+    rows = engine.summarize(ts)
+    for row in rows:
+        storage.save_hrv(row)
+    return len(rows)
+
+# ==================================================
+# CONSULTA
+# ==================================================
+
+def summaries(conn, start, end, window=300):
+    """[(ts, count, mean_rr, rmssd, sdnn, pnn50), ...] da janela em [start, end)."""
+    return conn.execute("""
+        SELECT ts, count, mean_rr, rmssd, sdnn, pnn50
+        FROM hrv_summary
+        WHERE window_s = ? AND ts >= ? AND ts < ?
+        ORDER BY ts
+    """, (window, start, end)).fetchall()
@@ -0,0 +1,145 @@
+"""
+keepalive.py
+
+Keep-alive do HR contínuo da Mi Band 4.
+
+Problema (v7 / v8):
+- Depois do 15 01 01 a pulseira manda BPM por um tempo e para
+  se o host não "cutucar" a medição
+- O watchdog via o silêncio, levantava "Watchdog: sem HR por muito
+  tempo" e fazia reconexão + autenticação completas (buraco de dados
+  a cada ciclo)
+
+Agora (KeepAlive, um por conexão):
+- Ping 0x16 no HR control point (0x2A39) a cada PING_INTERVAL segundos
+- Lapso: nenhum BPM há mais de LAPSE_AFTER segundos mesmo com o ping.
+  Conta o lapso e reenvia 15 01 01 (reinicia a medição contínua)
+  antes de o watchdog derrubar a conexão
+- O lapso termina no próximo BPM (duração acumulada)
+
+Métricas (acumuladas entre conexões, `stats` do módulo ou por pulseira):
+- pings enviados / com erro, reinícios da medição
+- lapsos, segundos sem HR em lapso, lapsos por dia de conexão
+
+Uso:
+    keeper = KeepAlive(client, UUID_HR_CTRL)
+    keeper.start()
+    # no hr_notification: keeper.on_sample()
+    ...
+    await keeper.stop()
+"""
+
+import asyncio
+import time
+
+# ==================================================
+# CONFIGURAÇÃO
+# ==================================================
+
+PING_INTERVAL = 12.0          # s entre pings (a pulseira para em ~15 s sem)
+LAPSE_AFTER = 30.0            # s sem BPM com o ping ativo = lapso
+
+HR_PING = b"\x16"
+HR_START_CONTINUOUS = b"\x15\x01\x01"
+
+def new_stats():
+    return {
+        "pings": 0,
+        "ping_errors": 0,
+        "restarts": 0,
+        "lapses": 0,
+        "lapse_seconds": 0.0,
+        "connected_seconds": 0.0,
+    }
+
+stats = new_stats()
+
+# ==================================================
+# KEEP-ALIVE
+# ==================================================
+
+class KeepAlive:
+    def __init__(self, client, hr_ctrl, interval=PING_INTERVAL, lapse_after=LAPSE_AFTER,
+                 totals=None, label=""):
+        self.client = client
+        self.hr_ctrl = hr_ctrl
+        self.interval = interval
+        self.lapse_after = lapse_after
+        self.stats = totals if totals is not None else stats
+        self.prefix = f"[{label}] " if label else ""
+
+        self.started = time.monotonic()
+        self.last_sample = self.started
+        self.lapse_started = None
+        self.task = None
+
+    def on_sample(self):
+        """Chamado a cada BPM (no callback BLE: só atualiza números)."""
+        now = time.monotonic()
+        self.last_sample = now
+        if self.lapse_started is not None:
+            gap = now - self.lapse_started
+            self.stats["lapse_seconds"] += gap
+            self.lapse_started = None
+            print(f"💓 {self.prefix}HR voltou depois de {gap:.0f}s")
+
+    async def ping(self):
+        try:
+            await self.client.write_gatt_char(self.hr_ctrl, HR_PING, response=True)
+            self.stats["pings"] += 1
+        except Exception as e:
+            self.stats["ping_errors"] += 1
+            print(f"⚠️ {self.prefix}Ping HR falhou: {e}")
+
+    async def check_lapse(self):
+        now = time.monotonic()
+        if self.lapse_started is not None or now - self.last_sample <= self.lapse_after:
+            return
+
+        # Conta desde o último BPM
+        self.lapse_started = self.last_sample
+        self.stats["lapses"] += 1
+        print(f"💓 {self.prefix}HR parado há {now - self.last_sample:.0f}s, reiniciando a medição")
+        try:
+            await self.client.write_gatt_char(self.hr_ctrl, HR_START_CONTINUOUS, response=True)
+            self.stats["restarts"] += 1
+        except Exception as e:
+            print(f"⚠️ {self.prefix}Reinício do HR falhou: {e}")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.ping()
+            await self.check_lapse()
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+        if self.lapse_started is not None:
+            self.stats["lapse_seconds"] += time.monotonic() - self.lapse_started
+            self.lapse_started = None
+        self.stats["connected_seconds"] += time.monotonic() - self.started
+        print(f"💓 {self.prefix}Keep-alive: {describe(self.stats)}")
+
+# ==================================================
+# MÉTRICAS
+# ==================================================
+
+def lapses_per_day(s):
+    hours = s["connected_seconds"] / 3600
+    return s["lapses"] * 24 / hours if hours else 0.0
+
+def describe(s=None):
+    s = s if s is not None else stats
+    return (
+        f"{s['pings']} pings ({s['ping_errors']} com erro), "
+        f"{s['lapses']} lapsos ({s['lapse_seconds']:.0f}s sem HR), "
+        f"{lapses_per_day(s):.1f} lapsos/dia, {s['restarts']} reinícios"
+    )
@@ -0,0 +1,236 @@
+"""
+log_import.py
+
+Importa para o health.db os logs de execuções antigas.
+
+Formatos reconhecidos (uma linha por evento):
+- [YYYY-mm-dd HH:MM:SS] ❤️ BPM: N                      (monitores v3+)
+- [YYYY-mm-dd HH:MM:SS.ffffff] ❤️ BPM: N               (monitores v6+)
+- [YYYY-mm-dd HH:MM:SS] 🔔 Notify <uuid|HR>: <hex>      (test suite)
+- [YYYY-mm-dd HH:MM:SS] 🔋 Bateria <uuid>: <hex>        (test suite)
+- [YYYY-mm-dd HH:MM:SS] 🔋 Bateria: N%                  (v7_reconnect_battery)
+
+Payloads brutos decodificados:
+- 00002a37 (Heart Rate Measurement) → BPM (hr_decoder)
+- 00000006 (bateria Xiaomi)         → nível
+
+Características:
+- Lê o arquivo linha a linha (gerador): memória constante
+- Grava em lotes, uma transação por lote
+- Deduplica contra o que já está no banco, inclusive meses já arquivados
+  em shards: a k-ésima ocorrência de (ts, valor) no log só entra se o
+  banco tiver menos de k. Reimportar (ou importar o log de uma execução
+  que já gravou no banco) não duplica, e amostras iguais no mesmo
+  segundo continuam sendo amostras distintas
+- Atualiza os agregados (rollups) das amostras novas
+
+Uso:
+    python versions/log_import.py miband4_test_suite.log versions/logs/*.log
+"""
+
+import argparse
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+
+import battery
+import hr_decoder
+import rollups
+import shards
+
+# ==================================================
+# CONFIGURAÇÃO
+# ==================================================
+
+DB_PATH = Path("health.db")
+
+BATCH_SIZE = 5000
+
+UUID_HR_MEAS = "00002a37-0000-1000-8000-00805f9b34fb"
+UUID_BATTERY = "00000006-0000-3512-2118-0009af100700"
+
+# ==================================================
+# PARSER
+# ==================================================
+
+RE_LINE = re.compile(r"^\[(?P<ts>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?)\]\s*(?P<msg>.*)$")
+RE_BPM = re.compile(r"❤️?\s*BPM:\s*(?P<bpm>\d+)")
+RE_NOTIFY = re.compile(r"🔔 Notify (?P<uuid>[0-9a-fA-F-]+|HR): (?P<hex>[0-9a-fA-F]+)\s*$")
+RE_BATTERY_RAW = re.compile(r"🔋 Bateria (?P<uuid>[0-9a-fA-F-]+): (?P<hex>[0-9a-fA-F]+)\s*$")
+RE_BATTERY_PCT = re.compile(r"🔋 Bateria:\s*(?P<level>\d+)%")
+
+def decode_battery(data):
+    """Nível de bateria do payload Xiaomi 0x0006 (byte 1, ver battery.py)."""
+    info = battery.decode(data)
+    return info["level"] if info else None
+
+def parse_line(line):
+    """Linha de log → (tabela, ts_epoch, valor) ou None."""
+    m = RE_LINE.match(line)
+    if not m:
+        return None
+
+    msg = m.group("msg")
+    record = None
+
+    bpm = RE_BPM.search(msg)
+    if bpm:
+        record = ("heart_rate", int(bpm.group("bpm")))
+    else:
+        notify = RE_NOTIFY.search(msg)
+        raw = notify or RE_BATTERY_RAW.search(msg)
+        if raw:
+            uuid = raw.group("uuid").lower()
+            data = bytes.fromhex(raw.group("hex"))
+            if uuid in (UUID_HR_MEAS, "hr"):
+                hr = hr_decoder.decode(data)
+                record = ("heart_rate", hr[0]) if hr and hr[0] else None
+            elif uuid == UUID_BATTERY:
+                value = decode_battery(data)
+                record = ("battery_level", value) if value is not None else None
+        else:
+            pct = RE_BATTERY_PCT.search(msg)
+            if pct:
+                record = ("battery_level", int(pct.group("level")))
+
+    if record is None:
+        return None
+
+    ts = int(datetime.fromisoformat(m.group("ts")).timestamp())
+    return record[0], ts, record[1]
+
+def parse_file(path):
+    """Gera (tabela, ts, valor) lendo o arquivo linha a linha."""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            record = parse_line(line)
+            if record:
+                yield record
+
+# ==================================================
+# GRAVAÇÃO
+# ==================================================
+
+INSERT_SQL = {
+    "heart_rate": "INSERT INTO heart_rate (ts, bpm) VALUES (?, ?)",
+    "battery_level": "INSERT INTO battery_level (ts, level) VALUES (?, ?)",
+}
+
+STORED_SQL = {
+    "heart_rate": "SELECT id FROM {db}.heart_rate WHERE {device} AND ts = ? AND bpm = ?",
+    "battery_level": "SELECT id FROM {db}.battery_level WHERE {device} AND ts = ? AND level = ?",
+}
+
+def _attach_months(conn, batch):
+    """Anexa os shards dos meses do lote: {(ano, mês): (alias, filtro da principal)}."""
+    attached = {}
+    for table, ts, _ in batch:
+        if table != "heart_rate":
+            continue
+        day = datetime.fromtimestamp(ts)
+        if (day.year, day.month) in attached:
+            continue
+        alias = shards.attach(conn, day.year, day.month)
+        device = alias and shards.device_filter(conn, alias, shards.PRIMARY_DEVICE)
+        if alias and not device:
+            shards.detach(conn, alias)
+            alias = None
+        attached[(day.year, day.month)] = (alias, device)
+    return attached
+
+def _stored(conn, table, ts, value, shard):
+    """Quantas vezes (ts, valor) da pulseira principal já está gravado."""
+    main = STORED_SQL[table].format(db="main", device=f"device_id = {shards.PRIMARY_DEVICE}")
+    if shard is None:
+        return conn.execute(f"SELECT COUNT(*) FROM ({main})", (ts, value)).fetchone()[0]
+    # UNION por id: linha nos dois lados (arquivamento interrompido) conta uma vez
+    alias, device = shard
+    archived = STORED_SQL[table].format(db=alias, device=device)
+    return conn.execute(
+        f"SELECT COUNT(*) FROM ({main} UNION {archived})", (ts, value, ts, value)
+    ).fetchone()[0]
+
+def _write_batch(conn, batch, stats, seen):
+    attached = _attach_months(conn, batch)
+    new_hr = []
+    try:
+        with conn:
+            for table, ts, value in batch:
+                if ts != seen["ts"]:
+                    seen["ts"] = ts
+                    seen["counts"] = {}
+                key = (table, value)
+                occurrence = seen["counts"][key] = seen["counts"].get(key, 0) + 1
+
+                shard = None
+                if table == "heart_rate":
+                    day = datetime.fromtimestamp(ts)
+                    alias, device = attached[(day.year, day.month)]
+                    shard = (alias, device) if alias else None
+
+                if _stored(conn, table, ts, value, shard) >= occurrence:
+                    stats["duplicates"] += 1
+                    continue
+
+                conn.execute(INSERT_SQL[table], (ts, value))
+                stats["inserted"] += 1
+                if table == "heart_rate":
+                    new_hr.append((ts, value))
+            if new_hr:
+                rollups.apply(conn, new_hr)
+    finally:
+        for alias, _ in attached.values():
+            if alias:
+                shards.detach(conn, alias)
+
+def import_records(conn, records, batch_size=BATCH_SIZE):
+    stats = {"parsed": 0, "inserted": 0, "duplicates": 0}
+    seen = {"ts": None, "counts": {}}     # ocorrências de cada valor no segundo corrente do log
+    batch = []
+
+    for record in records:
+        batch.append(record)
+        stats["parsed"] += 1
+        if len(batch) >= batch_size:
+            _write_batch(conn, batch, stats, seen)
+            batch = []
+    if batch:
+        _write_batch(conn, batch, stats, seen)
+
+    return stats
+
+def import_file(conn, path, batch_size=BATCH_SIZE):
+    started = time.perf_counter()
+    stats = import_records(conn, parse_file(path), batch_size)
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+# ==================================================
+# MAIN
+# ==================================================
+
+def main():
+    import storage
+
+    parser = argparse.ArgumentParser(description="Importa logs antigos para o health.db")
+    parser.add_argument("logs", nargs="+")
+    parser.add_argument("--db", default=str(DB_PATH))
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    storage.init_db(args.db)
+    conn = storage.connect(args.db)
+
+    for path in args.logs:
+        s = import_file(conn, path, args.batch)
+        rate = s["parsed"] / s["seconds"] if s["seconds"] else 0
+        print(
+            f"📥 {path}: {s['parsed']} leituras, {s['inserted']} novas, "
+            f"{s['duplicates']} repetidas ({rate:,.0f} linhas/s)"
+        )
+
+    conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,449 @@
+"""
+migrations.py
+
+Migrações versionadas do schema do health.db.
+
+A versão atual fica em PRAGMA user_version. Cada migração:
+- roda online (o coletor BLE pode continuar gravando)
+- copia os dados em blocos pequenos, cada bloco em sua própria transação
+- pode ser interrompida e retomada (continua do último id copiado)
+- só troca as tabelas numa transação final curta
+
+Migração 1 (epoch_timestamps):
+- heart_rate / battery_level / wearable_events passam de
+  `timestamp TEXT` para `ts INTEGER` (epoch, segundos)
+- Índices de cobertura (ts, valor) para consultas por intervalo
+- Linhas com timestamp ilegível vão, intactas, para `<tabela>_quarantine`
+  antes de a tabela antiga ser removida
+
+Migração 2 (hr_rollups):
+- Tabelas de agregados por minuto/hora/dia (ver rollups.py)
+- Preenchidas a partir de heart_rate, um dia por transação
+
+Migração 3 (spool_state):
+- Último seq do journal (spool.py) já gravado no SQLite
+
+Migração 4 (hrv_summary):
+- Resumos periódicos de HRV por janela (ver hrv.py)
+
+Migração 5 (devices):
+- Tabela `devices` (id, mac, nome) para o supervisor de várias pulseiras
+- Coluna device_id nas tabelas brutas (0 = pulseira principal, a dos
+  scripts de uma pulseira só); ADD COLUMN com DEFAULT constante não
+  reescreve a tabela
+- Índices (device_id, ts, valor) para consultas por pulseira
+
+Migração 6 (activity_1m):
+- Passos / distância / calorias por pulseira e minuto (ver activity.py)
+
+Migração 7 (sync_state):
+- Cursor da sincronização do histórico por pulseira (ver history.py)
+
+Migração 8 (alert_outbox):
+- Alertas persistidos antes do envio, com estado e chave de
+  idempotência (ver outbox.py)
+
+Uso manual (com o monitor rodando):
+    python versions/migrations.py --db health.db --chunk 5000
+"""
+
+import argparse
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# ==================================================
+# CONFIGURAÇÃO
+# ==================================================
+
+DB_PATH = Path("health.db")
+
+CHUNK_SIZE = 5000       # linhas copiadas por transação
+CHUNK_PAUSE = 0.05      # pausa entre blocos (deixa o writer BLE gravar)
+
+# Texto local "YYYY-mm-dd HH:MM:SS[.ffffff]" -> epoch (mesmo que datetime.timestamp())
+TS_EXPR = "CAST(strftime('%s', timestamp, 'utc') AS INTEGER)"
+
+# ==================================================
+# SCHEMA v1
+# ==================================================
+
+V1_TABLES = {
+    "heart_rate": {
+        "create": """
+            CREATE TABLE {name} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts INTEGER NOT NULL,
+                bpm INTEGER NOT NULL
+            )
+        """,
+        "index": "CREATE INDEX IF NOT EXISTS idx_heart_rate_ts ON {name} (ts, bpm)",
+        "columns": "id, ts, bpm",
+        "select": f"id, {TS_EXPR}, bpm",
+    },
+    "battery_level": {
+        "create": """
+            CREATE TABLE {name} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts INTEGER NOT NULL,
+                level INTEGER
+            )
+        """,
+        "index": "CREATE INDEX IF NOT EXISTS idx_battery_level_ts ON {name} (ts, level)",
+        "columns": "id, ts, level",
+        "select": f"id, {TS_EXPR}, level",
+    },
+    "wearable_events": {
+        "create": """
+            CREATE TABLE {name} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts INTEGER NOT NULL,
+                event TEXT NOT NULL
+            )
+        """,
+        "index": "CREATE INDEX IF NOT EXISTS idx_wearable_events_ts ON {name} (ts, event)",
+        "columns": "id, ts, event",
+        "select": f"id, {TS_EXPR}, event",
+    },
+}
+
+# ==================================================
+# HELPERS
+# ==================================================
+
+def table_exists(conn, name):
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (name,)
+    ).fetchone()
+    return row is not None
+
+def column_names(conn, name):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({name})")]
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def set_version(conn, version):
+    conn.execute(f"PRAGMA user_version = {int(version)}")
+
+@contextmanager
+def transaction(conn, mode=""):
+    """Transação explícita (a conexão fica em autocommit durante a migração)."""
+    conn.execute(f"BEGIN {mode}")
+    try:
+        yield conn
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+def _copy_chunk(conn, table, spec, tmp, quarantine, last_id, limit):
+    """
+    Copia até `limit` linhas com id > last_id.
+    Retorna (novo last_id, copiadas, em quarentena).
+    """
+    row = conn.execute(
+        f"SELECT MAX(id) FROM (SELECT id FROM {table} WHERE id > ? ORDER BY id LIMIT ?)",
+        (last_id, limit)
+    ).fetchone()
+    if row[0] is None:
+        return None, 0, 0
+
+    upper = row[0]
+    cur = conn.execute(
+        f"""
+        INSERT INTO {tmp} ({spec['columns']})
+        SELECT {spec['select']} FROM {table}
+        WHERE id > ? AND id <= ? AND {TS_EXPR} IS NOT NULL
+        """,
+        (last_id, upper)
+    )
+    copied = cur.rowcount
+
+    # Timestamp ilegível (NULL / lixo): a linha original vai intacta para a quarentena
+    cur = conn.execute(
+        f"""
+        INSERT INTO {quarantine}
+        SELECT * FROM {table}
+        WHERE id > ? AND id <= ? AND {TS_EXPR} IS NULL
+        """,
+        (last_id, upper)
+    )
+    return upper, copied, cur.rowcount
+
+# ==================================================
+# MIGRAÇÃO 1: timestamps epoch + índices
+# ==================================================
+
+def _migrate_table_to_epoch(conn, table, spec, chunk_size, pause):
+    """Retorna (copiadas, em quarentena)."""
+    tmp = f"{table}_v1"
+    quarantine = f"{table}_quarantine"
+
+    if not table_exists(conn, table):
+        with transaction(conn):
+            conn.execute(spec["create"].format(name=table))
+            conn.execute(spec["index"].format(name=table))
+        return 0, 0
+
+    if "ts" in column_names(conn, table):
+        # Já migrada (ex.: execução anterior interrompida depois da troca)
+        with transaction(conn):
+            conn.execute(spec["index"].format(name=table))
+        return 0, 0
+
+    # O índice já nasce na tabela nova (mantido a cada bloco, segue no RENAME)
+    with transaction(conn):
+        if not table_exists(conn, tmp):
+            conn.execute(spec["create"].format(name=tmp))
+        conn.execute(spec["index"].format(name=tmp))
+        # Mesmas colunas da tabela antiga (timestamp TEXT), sem restrições
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {quarantine} AS SELECT * FROM {table} WHERE 0")
+
+    # Retoma de onde parou, se a migração foi interrompida
+    last_id = conn.execute(f"""
+        SELECT MAX(COALESCE((SELECT MAX(id) FROM {tmp}), 0),
+                   COALESCE((SELECT MAX(id) FROM {quarantine}), 0))
+    """).fetchone()[0]
+    copied = 0
+    skipped = 0
+
+    # Blocos online: cada bloco é uma transação curta
+    while True:
+        with transaction(conn):
+            upper, count, bad = _copy_chunk(conn, table, spec, tmp, quarantine, last_id, chunk_size)
+        if upper is None:
+            break
+        copied += count
+        skipped += bad
+        last_id = upper
+        if pause:
+            time.sleep(pause)
+
+    # Troca final: copia o que chegou durante a migração e renomeia
+    with transaction(conn, "IMMEDIATE"):
+        while True:
+            upper, count, bad = _copy_chunk(conn, table, spec, tmp, quarantine, last_id, chunk_size)
+            if upper is None:
+                break
+            copied += count
+            skipped += bad
+            last_id = upper
+
+        # Cada id da tabela antiga está agora na nova ou na quarentena
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"ALTER TABLE {tmp} RENAME TO {table}")
+
+        if not conn.execute(f"SELECT 1 FROM {quarantine} LIMIT 1").fetchone():
+            conn.execute(f"DROP TABLE {quarantine}")
+
+    return copied, skipped
+
+def migrate_001_epoch_timestamps(conn, chunk_size=CHUNK_SIZE, pause=CHUNK_PAUSE):
+    for table, spec in V1_TABLES.items():
+        copied, skipped = _migrate_table_to_epoch(conn, table, spec, chunk_size, pause)
+        if copied:
+            print(f"🔧 {table}: {copied} linhas migradas para epoch")
+        if skipped:
+            print(f"⚠️ {table}: {skipped} linhas com timestamp ilegível em {table}_quarantine")
+
+# ==================================================
+# MIGRAÇÃO 2: agregados de BPM
+# ==================================================
+
+def migrate_002_hr_rollups(conn, chunk_size=CHUNK_SIZE, pause=CHUNK_PAUSE):
+    import rollups
+
+    days = rollups.rebuild(conn)
+    if days:
+        print(f"🔧 Agregados de BPM preenchidos ({days} dias)")
+
+# ==================================================
+# MIGRAÇÃO 3: estado do journal (spool.py)
+# ==================================================
+
+def migrate_003_spool_state(conn, chunk_size=CHUNK_SIZE, pause=CHUNK_PAUSE):
+    with transaction(conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS spool_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                committed_seq INTEGER NOT NULL
+            )
+        """)
+        conn.execute("INSERT OR IGNORE INTO spool_state (id, committed_seq) VALUES (1, 0)")
+
+# ==================================================
+# MIGRAÇÃO 4: resumos de HRV (hrv.py)
+# ==================================================
+
+def migrate_004_hrv_summary(conn, chunk_size=CHUNK_SIZE, pause=CHUNK_PAUSE):
+    with transaction(conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS hrv_summary (
+                ts INTEGER NOT NULL,
+                window_s INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                mean_rr REAL NOT NULL,
+                rmssd REAL NOT NULL,
+                sdnn REAL NOT NULL,
+                pnn50 REAL NOT NULL,
+                PRIMARY KEY (window_s, ts)
+            ) WITHOUT ROWID
+        """)
+
+# ==================================================
+# MIGRAÇÃO 5: várias pulseiras (device_id)
+# ==================================================
+
+DEVICE_INDEXES = {
+    "heart_rate": "bpm",
+    "battery_level": "level",
+    "wearable_events": "event",
+}
+
+def add_device_columns(conn):
+    with transaction(conn):
+        for table in DEVICE_INDEXES:
+            if "device_id" not in column_names(conn, table):
+                conn.execute(
+                    f"ALTER TABLE {table} ADD COLUMN device_id INTEGER NOT NULL DEFAULT 0"
+                )
+
+def migrate_005_devices(conn, chunk_size=CHUNK_SIZE, pause=CHUNK_PAUSE):
+    with transaction(conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS devices (
+                id INTEGER PRIMARY KEY,
+                mac TEXT NOT NULL UNIQUE,
+                name TEXT
+            )
+        """)
+    add_device_columns(conn)
+
+    # Um índice por transação (o de heart_rate é o único demorado)
+    for table, column in DEVICE_INDEXES.items():
+        with transaction(conn):
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_device_ts "
+                f"ON {table} (device_id, ts, {column})"
+            )
+
+# ==================================================
+# MIGRAÇÃO 6: atividade por minuto (activity.py)
+# ==================================================
+
+def migrate_006_activity(conn, chunk_size=CHUNK_SIZE, pause=CHUNK_PAUSE):
+    with transaction(conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS activity_1m (
+                device_id INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                steps INTEGER NOT NULL,
+                distance_m INTEGER NOT NULL,
+                calories INTEGER NOT NULL,
+                total_steps INTEGER NOT NULL,
+                PRIMARY KEY (device_id, bucket)
+            ) WITHOUT ROWID
+        """)
+
+# ==================================================
+# MIGRAÇÃO 7: cursor do histórico (history.py)
+# ==================================================
+
+def migrate_007_sync_state(conn, chunk_size=CHUNK_SIZE, pause=CHUNK_PAUSE):
+    with transaction(conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync_state (
+                device_id INTEGER PRIMARY KEY,
+                last_ts INTEGER NOT NULL,
+                updated_at INTEGER NOT NULL
+            )
+        """)
+
+# ==================================================
+# MIGRAÇÃO 8: outbox de alertas (outbox.py)
+# ==================================================
+
+def migrate_008_alert_outbox(conn, chunk_size=CHUNK_SIZE, pause=CHUNK_PAUSE):
+    with transaction(conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS alert_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL UNIQUE,
+                created_at REAL NOT NULL,
+                topic TEXT,
+                title TEXT,
+                priority TEXT,
+                tags TEXT,
+                message TEXT NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                sent_at REAL,
+                last_error TEXT
+            )
+        """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_alert_outbox_state "
+            "ON alert_outbox (state, next_attempt_at)"
+        )
+
+# ==================================================
+# REGISTRO DE MIGRAÇÕES
+# ==================================================
+
+MIGRATIONS = [
+    (1, "epoch_timestamps", migrate_001_epoch_timestamps),
+    (2, "hr_rollups", migrate_002_hr_rollups),
+    (3, "spool_state", migrate_003_spool_state),
+    (4, "hrv_summary", migrate_004_hrv_summary),
+    (5, "devices", migrate_005_devices),
+    (6, "activity_1m", migrate_006_activity),
+    (7, "sync_state", migrate_007_sync_state),
+    (8, "alert_outbox", migrate_008_alert_outbox),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def migrate(conn, chunk_size=CHUNK_SIZE, pause=CHUNK_PAUSE):
+    """Aplica as migrações pendentes. A conexão deve estar em autocommit."""
+    previous = conn.isolation_level
+    conn.isolation_level = None
+
+    try:
+        current = get_version(conn)
+        for version, name, func in MIGRATIONS:
+            if version <= current:
+                continue
+            started = time.perf_counter()
+            func(conn, chunk_size, pause)
+            set_version(conn, version)
+            elapsed = time.perf_counter() - started
+            print(f"🔧 Migração {version} ({name}) aplicada em {elapsed:.1f}s")
+    finally:
+        conn.isolation_level = previous
+
+    return get_version(conn)
+
+# ==================================================
+# MAIN
+# ==================================================
+
+def main():
+    import storage
+
+    parser = argparse.ArgumentParser(description="Migra o schema do health.db")
+    parser.add_argument("--db", default=str(DB_PATH))
+    parser.add_argument("--chunk", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--pause", type=float, default=CHUNK_PAUSE)
+    args = parser.parse_args()
+
+    conn = storage.connect(args.db)
+    version = migrate(conn, args.chunk, args.pause)
+    conn.close()
+
+    print(f"✅ Schema na versão {version}")
+
+if __name__ == "__main__":
+    main()
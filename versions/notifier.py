@@ -0,0 +1,244 @@
+"""
+notifier.py
+
+Envio de notificações ntfy fora do caminho das leituras.
+
+Antes:
+- send_ntfy_alert / send_ntfy_report faziam requests.post a cada alerta:
+  conexão TCP + TLS nova com o ntfy.sh a cada chamada
+- A chamada rodava no callback BLE (ou segurava uma thread do pipeline)
+  por até 5 s; uma falha só imprimia "Erro ntfy" e o alerta sumia
+
+Agora (Notifier, um por processo):
+- send() só coloca a mensagem numa fila limitada e retorna
+- Uma thread de entrega com requests.Session: conexões keep-alive
+  reaproveitadas (só o primeiro envio paga o handshake TLS)
+- Falha de rede, timeout, 429 ou 5xx: nova tentativa com backoff
+  exponencial e jitter (mesmo cálculo do reconnect.py), até MAX_ATTEMPTS
+- Outros 4xx: desiste na hora (repetir não adianta)
+- Fila cheia: a mensagem mais antiga é descartada e contada
+
+Métricas (get_stats / describe):
+- enviados, tentativas, novas tentativas, falhas, descartados
+- latência de entrega (send → resposta 2xx): p50 / p90 / máx
+
+Para testar sem o ntfy.sh: tools/ntfy_stub.py (servidor local) e
+tools/benchmarks/notifier_bench.py.
+
+A fila daqui é só em memória: para alertas que precisam sobreviver a
+um reboot ou a horas sem internet, ver outbox.py (usa post() daqui).
+
+Uso:
+    notifier = Notifier(NTFY_SERVER, NTFY_TOPIC)
+    notifier.start()
+    notifier.send("Taquicardia (BPM=130)", title="ALERTA DE SAUDE", priority="urgent")
+    ...
+    notifier.flush(60)            # processo curto: espera a entrega (com retry)
+    notifier.stop()
+"""
+
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from reconnect import backoff_delay, percentile
+
+# ==================================================
+# CONFIGURAÇÃO
+# ==================================================
+
+NTFY_SERVER = "https://ntfy.sh"
+
+QUEUE_SIZE = 100              # mensagens aguardando entrega
+REQUEST_TIMEOUT = (3.05, 10)  # s: conexão, resposta
+MAX_ATTEMPTS = 6              # ~1 min de tentativas com o backoff padrão
+BACKOFF_BASE = 1.0            # s
+BACKOFF_MAX = 30.0            # s
+STOP_TIMEOUT = 10.0           # s para drenar a fila no encerramento
+
+LATENCY_SAMPLES = 500
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+# ==================================================
+# NOTIFIER
+# ==================================================
+
+class Notifier:
+    def __init__(self, server=NTFY_SERVER, topic=None, maxsize=QUEUE_SIZE,
+                 max_attempts=MAX_ATTEMPTS, backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX):
+        self.server = server.rstrip("/")
+        self.url = f"{self.server}/{topic}" if topic else self.server
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.thread = None
+        self.stopping = threading.Event()
+        self.busy = False             # uma mensagem em entrega (fora da fila)
+        self.rnd = random.Random()
+
+        self.session = requests.Session()
+        # Um host só: um pool pequeno basta e as conexões ficam abertas
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+
+        self.last_error = None
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.stats = {
+            "queued": 0,
+            "sent": 0,
+            "attempts": 0,
+            "retries": 0,
+            "failed": 0,
+            "dropped": 0,
+            "max_queue_depth": 0,
+        }
+
+    # ------------------------------
+    # API (não bloqueia)
+    # ------------------------------
+
+    def send(self, message, title=None, priority=None, tags=None):
+        headers = {}
+        if title:
+            headers["Title"] = title
+        if priority:
+            headers["Priority"] = priority
+        if tags:
+            headers["Tags"] = tags
+        item = (time.monotonic(), message.encode("utf-8", errors="ignore"), headers)
+
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                break
+            except queue.Full:
+                # Alerta novo vale mais que o mais antigo na fila
+                try:
+                    self.queue.get_nowait()
+                    self.stats["dropped"] += 1
+                except queue.Empty:
+                    pass
+
+        self.stats["queued"] += 1
+        depth = self.queue.qsize()
+        if depth > self.stats["max_queue_depth"]:
+            self.stats["max_queue_depth"] = depth
+        return True
+
+    # ------------------------------
+    # ENTREGA (thread)
+    # ------------------------------
+
+    def post(self, body, headers, url=None):
+        """True = entregue, False = desistir, None = tentar de novo (motivo em last_error)."""
+        self.stats["attempts"] += 1
+        try:
+            response = self.session.post(url or self.url, data=body, headers=headers, timeout=REQUEST_TIMEOUT)
+        except requests.RequestException as e:
+            self.last_error = f"{e.__class__.__name__}: {e}"
+            print(f"⚠️ ntfy: {self.last_error}")
+            return None
+
+        if response.status_code < 300:
+            self.last_error = None
+            return True
+        self.last_error = f"HTTP {response.status_code}"
+        if response.status_code in RETRY_STATUS:
+            print(f"⚠️ ntfy: HTTP {response.status_code}, tentando de novo")
+            return None
+        print(f"⚠️ ntfy: HTTP {response.status_code}, alerta descartado: {response.text[:200]}")
+        return False
+
+    def _deliver(self, item):
+        queued_at, body, headers = item
+        for attempt in range(self.max_attempts):
+            if attempt:
+                self.stats["retries"] += 1
+                delay = backoff_delay(attempt - 1, self.backoff_base, self.backoff_max, self.rnd)
+                # No encerramento não espera o backoff inteiro
+                if self.stopping.wait(delay) and attempt > 1:
+                    break
+
+            result = self.post(body, headers)
+            if result:
+                self.stats["sent"] += 1
+                self.latencies.append(time.monotonic() - queued_at)
+                return True
+            if result is False:
+                break
+
+        self.stats["failed"] += 1
+        return False
+
+    def _loop(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                if self.stopping.is_set():
+                    break
+                continue
+            self.busy = True
+            try:
+                self._deliver(item)
+            finally:
+                self.busy = False
+
+    def start(self):
+        if self.thread is None:
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self._loop, name="ntfy", daemon=True)
+            self.thread.start()
+
+    def flush(self, timeout):
+        """Espera a fila esvaziar (entregas com o backoff normal). True se esvaziou."""
+        deadline = time.monotonic() + timeout
+        while self.queue.qsize() or self.busy:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """Drena a fila (até `timeout`) e fecha as conexões."""
+        if self.thread is not None:
+            self.stopping.set()
+            self.thread.join(timeout)
+            self.thread = None
+        self.session.close()
+        print(f"📨 ntfy: {self.describe()}")
+
+    # ------------------------------
+    # MÉTRICAS
+    # ------------------------------
+
+    def get_stats(self):
+        values = list(self.latencies)
+        return {
+            **self.stats,
+            "pending": self.queue.qsize(),
+            "latency_p50": percentile(values, 50),
+            "latency_p90": percentile(values, 90),
+            "latency_max": max(values) if values else None,
+        }
+
+    def describe(self):
+        s = self.get_stats()
+        text = (
+            f"{s['sent']} entregues, {s['retries']} novas tentativas, "
+            f"{s['failed']} falhas, {s['dropped']} descartados, {s['pending']} pendentes"
+        )
+        if s["latency_p50"] is not None:
+            text += (
+                f", latência p50 {s['latency_p50'] * 1000:.0f} ms, "
+                f"p90 {s['latency_p90'] * 1000:.0f} ms, máx {s['latency_max'] * 1000:.0f} ms"
+            )
+        return text
@@ -0,0 +1,434 @@
+"""
+outbox.py
+
+Alertas persistidos no health.db antes do envio (tabela alert_outbox).
+
+Problema (notifier.py sozinho):
+- A fila de envio é só em memória: reboot da Pi, queda de energia ou
+  uplink fora por mais que as tentativas = alerta impresso e perdido
+
+Agora (Outbox, um por processo, mesma API do Notifier):
+- send() gera a chave de idempotência e grava o alerta na alert_outbox
+  na hora (INSERT OR IGNORE pela chave, conexão própria e transação
+  curta), depois acorda o dispatcher; não toca na rede. Chamar fora do
+  loop asyncio (estágio notify com blocking=True / asyncio.to_thread):
+  com o banco travado a escrita espera até o busy_timeout. De dentro do
+  loop (callback BLE, corrotina): send_soon(), que roda o send() no
+  executor do loop
+- Banco indisponível no send() (ou antes do start()): o alerta fica numa
+  fila em memória e o dispatcher grava antes de cada entrega
+- Dispatcher (thread): entrega o que está na tabela. Erro de banco
+  (ex.: "database is locked") não para a thread: loga, espera backoff
+  e tenta de novo
+- Entrega em lotes de BATCH_SIZE alertas vencidos, em ordem de criação,
+  pelo Notifier.post (Session keep-alive); cada entrega confirmada é
+  marcada `sent` na hora, numa transação curta
+- Falha temporária: tentativas + 1, próxima tentativa com backoff (sem
+  limite de tentativas, só de idade: MAX_AGE → `expired`). O resto do
+  lote espera (uplink fora: não martela o servidor)
+- Recusa definitiva (4xx): `failed`
+- No startup, o que ficou `pending` da execução anterior é enviado
+
+Chave de idempotência:
+- Padrão: hash de (tópico, mensagem, minuto da criação) — o mesmo alerta
+  reavaliado depois de um restart, ou repetido no mesmo minuto, não gera
+  uma segunda linha. Quem chama pode passar a própria chave
+- Vai no cabeçalho X-Idempotency-Key. O ntfy.sh ignora, mas um proxy
+  (ou o tools/ntfy_stub.py) descarta repetidas: a única janela de
+  reenvio é entre o 2xx e o commit do `sent` (milissegundos)
+
+Alerta entregue com atraso (> LATE_AFTER) leva a hora original no texto.
+
+Métricas (get_stats / describe / delivery_stats):
+- gravados, repetidos (chave já existente), entregues, novas tentativas,
+  falhas, expirados, pendentes no banco
+- tempo até a entrega (criação → 2xx): p50 / p90 / máx
+
+Uso:
+    ntfy = Outbox(NTFY_SERVER, NTFY_TOPIC)
+    ntfy.start(DB_PATH)           # depois do init_db (migração 8)
+    ntfy.send("Taquicardia (BPM=130)", title="ALERTA DE SAUDE", priority="urgent")
+    ntfy.send_soon("Sem dados", priority="high")    # no loop asyncio
+    ...
+    ntfy.flush(120)               # processo curto: espera a entrega (com retry)
+    ntfy.stop()
+"""
+
+import asyncio
+import functools
+import hashlib
+import queue
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import storage
+from notifier import NTFY_SERVER, Notifier
+from reconnect import backoff_delay, percentile
+
+# ==================================================
+# CONFIGURAÇÃO
+# ==================================================
+
+BATCH_SIZE = 20               # alertas por leitura da outbox
+RETRY_BASE = 2.0              # s, backoff entre tentativas do mesmo alerta
+RETRY_MAX = 300.0             # s
+MAX_AGE = 6 * 3600            # s: alerta mais velho que isso não é mais enviado
+LATE_AFTER = 120              # s: acima disso o texto leva a hora original
+IDLE_WAIT = 60.0              # s máximo dormindo sem alerta novo
+ERROR_WAIT_MAX = 30.0         # s: backoff máximo depois de erro de banco
+STOP_TIMEOUT = 10.0           # s tentando entregar no encerramento
+PRUNE_AFTER = 30 * 86400      # s: entregues/expirados mais velhos saem da tabela
+
+KEY_BUCKET = 60               # s: janela da chave padrão
+LATENCY_SAMPLES = 500
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+EXPIRED = "expired"
+
+# ==================================================
+# CHAVE / CONSULTAS
+# ==================================================
+
+def idempotency_key(topic, message, ts, bucket=KEY_BUCKET):
+    raw = f"{topic}\n{message}\n{int(ts) // bucket}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]
+
+def pending_count(conn):
+    return conn.execute("SELECT COUNT(*) FROM alert_outbox WHERE state = ?", (PENDING,)).fetchone()[0]
+
+def delivery_stats(conn, since=0):
+    """{estado: (quantidade, tempo médio até a entrega)} dos alertas criados desde `since`."""
+    rows = conn.execute("""
+        SELECT state, COUNT(*), AVG(sent_at - created_at)
+        FROM alert_outbox
+        WHERE created_at >= ?
+        GROUP BY state
+    """, (since,)).fetchall()
+    return {state: (count, avg) for state, count, avg in rows}
+
+# ==================================================
+# OUTBOX
+# ==================================================
+
+class Outbox:
+    def __init__(self, server=NTFY_SERVER, topic=None, batch_size=BATCH_SIZE, max_age=MAX_AGE,
+                 retry_base=RETRY_BASE, retry_max=RETRY_MAX):
+        self.topic = topic
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+
+        # Só o post() (Session keep-alive); a thread do Notifier não é usada
+        self.http = Notifier(server, topic)
+        self.incoming = queue.Queue()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.db_path = None
+        self.store_conn = None        # do send(), fora da thread do dispatcher
+        self.store_lock = threading.Lock()
+        self.rnd = random.Random()
+
+        self.delivery = deque(maxlen=LATENCY_SAMPLES)
+        self.stats = {
+            "recorded": 0,
+            "duplicates": 0,
+            "sent": 0,
+            "retries": 0,
+            "failed": 0,
+            "expired": 0,
+            "pending": 0,
+            "db_errors": 0,
+        }
+
+    # ------------------------------
+    # API (não bloqueia)
+    # ------------------------------
+
+    def send(self, message, title=None, priority=None, tags=None, key=None):
+        """Grava o alerta (bloqueia o tempo de uma transação curta) e acorda o dispatcher."""
+        created = time.time()
+        key = key or idempotency_key(self.topic, message, created)
+        item = (key, created, self.topic, title, priority, tags, message)
+
+        stored = False
+        if self.db_path is not None:
+            with self.store_lock:
+                try:
+                    if self.store_conn is None:
+                        self.store_conn = storage.connect(self.db_path)
+                    self._insert(self.store_conn, [item])
+                    stored = True
+                except sqlite3.Error as e:
+                    self.stats["db_errors"] += 1
+                    print(f"⚠️ Outbox: alerta não gravado agora ({e}), fica na fila do dispatcher")
+        if not stored:
+            self.incoming.put(item)
+        self.wake.set()
+        return key
+
+    def send_soon(self, message, title=None, priority=None, tags=None, key=None):
+        """send() numa thread do executor do loop: não trava o loop com o banco ocupado."""
+        send = functools.partial(self.send, message, title, priority, tags, key)
+        return asyncio.get_running_loop().run_in_executor(None, send)
+
+    # ------------------------------
+    # GRAVAÇÃO
+    # ------------------------------
+
+    def _insert(self, conn, items):
+        """Alertas → alert_outbox (uma transação; chave repetida é ignorada)."""
+        rows = [
+            (key, created, topic, title, priority, tags, message, PENDING, created)
+            for key, created, topic, title, priority, tags, message in items
+        ]
+        before = conn.total_changes
+        with conn:
+            conn.executemany("""
+                INSERT OR IGNORE INTO alert_outbox
+                    (key, created_at, topic, title, priority, tags, message, state, next_attempt_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+        inserted = conn.total_changes - before
+        self.stats["recorded"] += inserted
+        self.stats["duplicates"] += len(rows) - inserted
+
+    def _store(self, conn):
+        """Fila em memória (alertas que o send() não conseguiu gravar) → alert_outbox."""
+        items = []
+        while True:
+            try:
+                items.append(self.incoming.get_nowait())
+            except queue.Empty:
+                break
+        if not items:
+            return
+        try:
+            self._insert(conn, items)
+        except Exception:
+            # Volta para a fila: a próxima iteração tenta de novo
+            for item in items:
+                self.incoming.put(item)
+            raise
+
+    # ------------------------------
+    # DISPATCHER (thread)
+    # ------------------------------
+
+    def _deliver(self, conn, row, now):
+        """Uma linha da outbox. False = falha temporária (para o lote)."""
+        id_, key, created, topic, title, priority, tags, message, attempts = row
+
+        if now - created > self.max_age:
+            with conn:
+                conn.execute("UPDATE alert_outbox SET state = ? WHERE id = ?", (EXPIRED, id_))
+            self.stats["expired"] += 1
+            print(f"⚠️ Alerta expirado sem entrega: {message}")
+            return True
+
+        if now - created > LATE_AFTER:
+            when = datetime.fromtimestamp(created).strftime("%d/%m %H:%M:%S")
+            message = f"{message}\n(alerta de {when}, entregue com atraso)"
+
+        headers = {"X-Idempotency-Key": key}
+        if title:
+            headers["Title"] = title
+        if priority:
+            headers["Priority"] = priority
+        if tags:
+            headers["Tags"] = tags
+        url = f"{self.http.server}/{topic}" if topic else None
+
+        result = self.http.post(message.encode("utf-8", errors="ignore"), headers, url)
+        done = time.time()
+
+        if result:
+            with conn:
+                conn.execute(
+                    "UPDATE alert_outbox SET state = ?, sent_at = ?, attempts = attempts + 1, "
+                    "last_error = NULL WHERE id = ?",
+                    (SENT, done, id_)
+                )
+            self.stats["sent"] += 1
+            self.delivery.append(done - created)
+            return True
+
+        if result is False:
+            state, next_at = FAILED, done
+            self.stats["failed"] += 1
+        else:
+            state = PENDING
+            next_at = done + backoff_delay(attempts, self.retry_base, self.retry_max, self.rnd)
+            self.stats["retries"] += 1
+        with conn:
+            conn.execute(
+                "UPDATE alert_outbox SET state = ?, attempts = attempts + 1, "
+                "next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (state, next_at, self.http.last_error, id_)
+            )
+        return result is False
+
+    def _dispatch(self, conn, deadline=None):
+        """Entrega os alertas vencidos em lotes. Retorna segundos até o próximo vencimento."""
+        while deadline is None or time.monotonic() < deadline:
+            now = time.time()
+            rows = conn.execute("""
+                SELECT id, key, created_at, topic, title, priority, tags, message, attempts
+                FROM alert_outbox
+                WHERE state = ? AND next_attempt_at <= ?
+                ORDER BY created_at, id
+                LIMIT ?
+            """, (PENDING, now, self.batch_size)).fetchall()
+            if not rows:
+                break
+
+            stalled = False
+            for row in rows:
+                # O que ainda estiver só em memória vai para o banco antes do POST
+                self._store(conn)
+                if not self._deliver(conn, row, time.time()):
+                    stalled = True
+                    break
+            if stalled:
+                break
+
+        self.stats["pending"] = pending_count(conn)
+        row = conn.execute(
+            "SELECT MIN(next_attempt_at) FROM alert_outbox WHERE state = ?", (PENDING,)
+        ).fetchone()
+        if row[0] is None:
+            return IDLE_WAIT
+        return min(IDLE_WAIT, max(0.0, row[0] - time.time()))
+
+    def _prune(self, conn):
+        with conn:
+            conn.execute(
+                "DELETE FROM alert_outbox WHERE state != ? AND created_at < ?",
+                (PENDING, time.time() - PRUNE_AFTER)
+            )
+
+    def _recover(self, conn):
+        """Startup: limpeza e pendentes da execução anterior."""
+        self._prune(conn)
+        pending = pending_count(conn)
+        if pending:
+            # Rede nova depois do restart: não espera o backoff da execução anterior
+            with conn:
+                conn.execute(
+                    "UPDATE alert_outbox SET next_attempt_at = ? WHERE state = ? AND next_attempt_at > ?",
+                    (time.time(), PENDING, time.time())
+                )
+            print(f"📨 {pending} alerta(s) pendente(s) da execução anterior")
+
+    def _loop(self):
+        conn = None
+        recovered = False
+        errors = 0
+        while True:
+            stopping = self.stopping.is_set()
+            self.wake.clear()
+            try:
+                if conn is None:
+                    conn = storage.connect(self.db_path)
+                if not recovered:
+                    self._recover(conn)
+                    recovered = True
+
+                self._store(conn)
+                if stopping:
+                    # Encerramento: tenta entregar o que está vencido, até STOP_TIMEOUT
+                    self._dispatch(conn, deadline=time.monotonic() + STOP_TIMEOUT)
+                    break
+                wait = self._dispatch(conn)
+                errors = 0
+            except Exception as e:
+                # Um erro (ex.: banco travado além do busy_timeout) não encerra a
+                # thread: sem ela nada mais seria gravado nem entregue
+                self.stats["db_errors"] += 1
+                wait = backoff_delay(errors, self.retry_base, ERROR_WAIT_MAX, self.rnd)
+                errors += 1
+                print(f"⚠️ Outbox: {e.__class__.__name__}: {e} (nova tentativa em {wait:.1f}s)")
+                if stopping:
+                    break
+            self.wake.wait(wait)
+
+        if conn is not None:
+            conn.close()
+
+    def start(self, db_path=storage.DB_PATH):
+        """A partir daqui send() grava direto no banco (migração 8 aplicada antes)."""
+        if self.thread is None:
+            self.db_path = db_path
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self._loop, name="alert-outbox", daemon=True)
+            self.thread.start()
+
+    def flush(self, timeout):
+        """
+        Espera não sobrar alerta pendente (no banco ou só em memória), com
+        o backoff normal entre tentativas. True se tudo foi resolvido.
+        """
+        deadline = time.monotonic() + timeout
+        conn = storage.connect(self.db_path)
+        try:
+            while True:
+                try:
+                    if self.incoming.empty() and pending_count(conn) == 0:
+                        return True
+                except sqlite3.Error:
+                    pass
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.2)
+        finally:
+            conn.close()
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        if self.thread is not None:
+            self.stopping.set()
+            self.wake.set()
+            self.thread.join(timeout + 5)
+            self.thread = None
+        with self.store_lock:
+            if self.store_conn is not None:
+                self.store_conn.close()
+                self.store_conn = None
+        self.http.session.close()
+        print(f"📨 Alertas: {self.describe()}")
+
+    # ------------------------------
+    # MÉTRICAS
+    # ------------------------------
+
+    def get_stats(self):
+        values = list(self.delivery)
+        return {
+            **self.stats,
+            "delivery_p50": percentile(values, 50),
+            "delivery_p90": percentile(values, 90),
+            "delivery_max": max(values) if values else None,
+        }
+
+    def describe(self):
+        s = self.get_stats()
+        text = (
+            f"{s['sent']} entregues, {s['pending']} pendentes, {s['retries']} novas tentativas, "
+            f"{s['failed']} recusados, {s['expired']} expirados, {s['duplicates']} repetidos"
+        )
+        if s["db_errors"]:
+            text += f", {s['db_errors']} erros de banco"
+        if not self.incoming.empty():
+            text += f", {self.incoming.qsize()} só em memória"
+        if s["delivery_p50"] is not None:
+            text += (
+                f", até a entrega p50 {s['delivery_p50']:.1f}s, "
+                f"p90 {s['delivery_p90']:.1f}s, máx {s['delivery_max']:.1f}s"
+            )
+        return text
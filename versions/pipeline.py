@@ -0,0 +1,231 @@
+"""
+pipeline.py
+
+Pipeline asyncio em estágios para as leituras BLE.
+
+Problema:
+- hr_notification fazia print, save_bpm e requests.post (timeout=5)
+  dentro do callback do bleak
+- Um alerta lento congelava o loop asyncio por até 5 s e notificações
+  BLE eram perdidas
+
+Agora:
+- O callback só chama submit(): coloca o payload numa fila e retorna
+- Cada estágio (decode → persist → evaluate → notify) tem sua fila
+  limitada (asyncio.Queue) e sua própria task
+- Handler devolve o item para o próximo estágio, ou None para encerrar
+- Handlers bloqueantes (ex.: HTTP) rodam numa thread (blocking=True)
+
+Backpressure / política de descarte por estágio:
+- BLOCK        → o estágio anterior espera vaga (propaga a pressão)
+- DROP_OLDEST  → descarta o item mais antigo da fila (dado recente vale mais)
+- DROP_NEWEST  → descarta o item que chegou
+- O callback BLE nunca espera: num estágio BLOCK, submit() conta como descarte
+
+Métricas por estágio (get_stats / log_stats):
+- itens processados, descartados, erros, profundidade máxima da fila
+- latência (espera na fila + processamento): média e máxima
+- latência fim a fim (submit → item sai do pipeline)
+"""
+
+import asyncio
+import inspect
+import time
+
+# ==================================================
+# CONFIGURAÇÃO
+# ==================================================
+
+BLOCK = "block"
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+
+DEFAULT_QUEUE_SIZE = 256
+STATS_INTERVAL = 600          # segundos entre linhas de métricas no log
+
+# ==================================================
+# ESTÁGIO
+# ==================================================
+
+class Stage:
+    def __init__(self, name, handler, maxsize=DEFAULT_QUEUE_SIZE, policy=BLOCK, blocking=False):
+        self.name = name
+        self.handler = handler
+        self.maxsize = maxsize
+        self.policy = policy
+        self.blocking = blocking
+        self.queue = None         # criada no start(), dentro do loop
+        self.task = None
+
+        self.stats = {
+            "processed": 0,
+            "dropped": 0,
+            "errors": 0,
+            "max_depth": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+        }
+
+    def offer(self, envelope):
+        """Enfileira sem esperar. Retorna False se o item foi descartado."""
+        queue = self.queue
+        if queue.full():
+            if self.policy == DROP_OLDEST:
+                queue.get_nowait()
+                queue.task_done()
+                self.stats["dropped"] += 1
+            else:
+                self.stats["dropped"] += 1
+                return False
+
+        queue.put_nowait(envelope)
+        depth = queue.qsize()
+        if depth > self.stats["max_depth"]:
+            self.stats["max_depth"] = depth
+        return True
+
+    async def put(self, envelope):
+        """Enfileira vindo do estágio anterior (espera vaga se BLOCK)."""
+        if self.policy != BLOCK:
+            return self.offer(envelope)
+
+        await self.queue.put(envelope)
+        depth = self.queue.qsize()
+        if depth > self.stats["max_depth"]:
+            self.stats["max_depth"] = depth
+        return True
+
+    async def run(self, next_stage, done):
+        while True:
+            entered, origin, item = await self.queue.get()
+            try:
+                try:
+                    if self.blocking:
+                        result = await asyncio.to_thread(self.handler, item)
+                    else:
+                        result = self.handler(item)
+                        if inspect.isawaitable(result):
+                            result = await result
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    print(f"⚠️ Estágio {self.name}: {e}")
+                    result = None
+
+                now = time.monotonic()
+                elapsed_ms = (now - entered) * 1000
+                self.stats["processed"] += 1
+                self.stats["total_ms"] += elapsed_ms
+                if elapsed_ms > self.stats["max_ms"]:
+                    self.stats["max_ms"] = elapsed_ms
+
+                if result is None or next_stage is None:
+                    done(origin, now)
+                else:
+                    await next_stage.put((now, origin, result))
+            finally:
+                # Só depois de repassar: stop() drena estágio a estágio
+                self.queue.task_done()
+
+# ==================================================
+# PIPELINE
+# ==================================================
+
+class Pipeline:
+    def __init__(self, stages):
+        self.stages = list(stages)
+        self.by_name = {stage.name: stage for stage in self.stages}
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "e2e_total_ms": 0.0,
+            "e2e_max_ms": 0.0,
+        }
+        self._stats_task = None
+
+    def _done(self, origin, now):
+        elapsed_ms = (now - origin) * 1000
+        self.stats["completed"] += 1
+        self.stats["e2e_total_ms"] += elapsed_ms
+        if elapsed_ms > self.stats["e2e_max_ms"]:
+            self.stats["e2e_max_ms"] = elapsed_ms
+
+    def start(self, stats_interval=STATS_INTERVAL):
+        """Cria as filas e as tasks. Precisa rodar dentro do loop asyncio."""
+        if self.stages[0].task is not None:
+            return
+
+        for stage in self.stages:
+            stage.queue = asyncio.Queue(maxsize=stage.maxsize)
+        for i, stage in enumerate(self.stages):
+            next_stage = self.stages[i + 1] if i + 1 < len(self.stages) else None
+            stage.task = asyncio.create_task(stage.run(next_stage, self._done))
+        if stats_interval:
+            self._stats_task = asyncio.create_task(self._log_periodically(stats_interval))
+
+    def submit(self, item, stage=None):
+        """
+        Entrada do callback BLE: nunca espera.
+        `stage` permite injetar direto num estágio (ex.: alerta de ausência
+        de dados vai direto para "notify").
+        """
+        target = self.by_name[stage] if stage else self.stages[0]
+        if target.queue is None:
+            return False
+        now = time.monotonic()
+        self.stats["submitted"] += 1
+        return target.offer((now, now, item))
+
+    async def stop(self, timeout=5.0):
+        """Drena as filas em ordem (até `timeout`) e cancela as tasks."""
+        if self.stages[0].task is None:
+            return
+
+        try:
+            for stage in self.stages:
+                await asyncio.wait_for(stage.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print("⚠️ Pipeline encerrado com itens pendentes")
+
+        tasks = [stage.task for stage in self.stages]
+        if self._stats_task:
+            tasks.append(self._stats_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        for stage in self.stages:
+            stage.task = None
+        self._stats_task = None
+        self.log_stats()
+
+    async def _log_periodically(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            self.log_stats()
+
+    def get_stats(self):
+        result = {"pipeline": dict(self.stats)}
+        done = self.stats["completed"]
+        result["pipeline"]["e2e_avg_ms"] = self.stats["e2e_total_ms"] / done if done else 0.0
+
+        for stage in self.stages:
+            s = dict(stage.stats)
+            s["depth"] = stage.queue.qsize() if stage.queue else 0
+            s["avg_ms"] = s["total_ms"] / s["processed"] if s["processed"] else 0.0
+            result[stage.name] = s
+        return result
+
+    def log_stats(self):
+        stats = self.get_stats()
+        p = stats["pipeline"]
+        print(
+            f"📊 Pipeline: {p['submitted']} entradas, {p['completed']} concluídas, "
+            f"fim a fim médio {p['e2e_avg_ms']:.1f} ms, máx {p['e2e_max_ms']:.1f} ms"
+        )
+        for stage in self.stages:
+            s = stats[stage.name]
+            print(
+                f"   {stage.name:<9} {s['processed']:>7} ok  {s['dropped']:>5} descartados  "
+                f"{s['errors']:>3} erros  fila máx {s['max_depth']:>4}  "
+                f"médio {s['avg_ms']:.1f} ms  máx {s['max_ms']:.1f} ms"
+            )
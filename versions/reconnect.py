@@ -0,0 +1,188 @@
+"""
+reconnect.py
+
+Reconexão guiada por anúncios BLE (advertisements).
+
+Antes:
+- Cada supervisor() tentava BleakClient(MAC) a cada RECONNECT_DELAY (10 s)
+- Com a pulseira fora de alcance, cada tentativa esperava o timeout
+  inteiro de conexão e deixava o adaptador BlueZ ocupado
+
+Agora (Reconnector):
+- Escuta os anúncios com BleakScanner e conecta assim que a pulseira
+  aparece com RSSI utilizável (>= RSSI_MIN)
+- O BLEDevice do anúncio vai direto para BleakClient (sem novo scan)
+- Sem anúncio dentro da janela: a janela cresce em backoff exponencial
+  com jitter (BACKOFF_BASE..BACKOFF_MAX) e a escuta continua
+- A cada BLIND_EVERY janelas vazias, uma tentativa às cegas pelo MAC
+  (caso os anúncios não estejam chegando ao scanner)
+- Sessão que caiu logo (auth, GATT, watchdog) ou tentativa que falhou:
+  falhas + 1 e espera backoff_delay(falhas) antes de tentar de novo,
+  mesmo com a pulseira anunciando (sem loop de reconexão apertado)
+- Só uma sessão estável (>= STABLE_SESSION) zera o backoff
+
+Métricas:
+- latência de reconexão (perda → conectado): p50 / p90 / máx
+- conexões via anúncio x às cegas, falhas
+
+Comparação com o intervalo fixo:
+    python versions/tools/benchmarks/reconnect_sim.py
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+
+# ==================================================
+# CONFIGURAÇÃO
+# ==================================================
+
+RSSI_MIN = -90              # dBm; abaixo disso a conexão costuma falhar
+BACKOFF_BASE = 2.0          # s, janela de escuta inicial
+BACKOFF_MAX = 120.0         # s
+CONNECT_TIMEOUT = 20.0      # s, timeout do BleakClient
+BLIND_EVERY = 3             # janelas vazias entre tentativas às cegas
+STABLE_SESSION = 300.0      # s conectado para a sessão zerar o backoff
+MAX_EXPONENT = 16           # 2^16 · base já passa do teto; failures continua contando
+
+LATENCY_SAMPLES = 500
+
+# ==================================================
+# BACKOFF
+# ==================================================
+
+def backoff_delay(failures, base=BACKOFF_BASE, cap=BACKOFF_MAX, rnd=random):
+    """Janela com jitter: uniforme entre metade e o total de min(cap, base·2^n)."""
+    # Expoente limitado: pulseira sumida por dias não estoura o float
+    delay = min(cap, base * (2 ** min(failures, MAX_EXPONENT)))
+    return rnd.uniform(delay / 2, delay)
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+# ==================================================
+# SCANNER
+# ==================================================
+
+async def find_band(mac, rssi_min=RSSI_MIN, timeout=BACKOFF_BASE, adapter=None):
+    """
+    BLEDevice da pulseira se um anúncio com RSSI >= rssi_min chegar a tempo.
+    `adapter` (ex.: "hci1") escolhe o controlador; None usa o padrão.
+    """
+    # Import local: o simulador (tools/benchmarks) usa este módulo sem bleak
+    from bleak import BleakScanner
+
+    mac = mac.upper()
+    found = asyncio.get_running_loop().create_future()
+
+    def on_advert(device, adv):
+        if device.address.upper() == mac and adv.rssi >= rssi_min and not found.done():
+            found.set_result(device)
+
+    kwargs = {"adapter": adapter} if adapter else {}
+    scanner = BleakScanner(detection_callback=on_advert, **kwargs)
+    await scanner.start()
+    try:
+        return await asyncio.wait_for(found, timeout)
+    except asyncio.TimeoutError:
+        return None
+    finally:
+        await scanner.stop()
+
+# ==================================================
+# RECONNECTOR
+# ==================================================
+
+class Reconnector:
+    def __init__(self, mac, rssi_min=RSSI_MIN):
+        self.mac = mac
+        self.rssi_min = rssi_min
+        self.failures = 0
+        self.lost_at = time.monotonic()     # a primeira conexão também conta
+        self.connected_at = None
+        self.retry_at = 0.0                 # monotonic: antes disso não tenta de novo
+        self.up = False
+        self.via = None
+
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.stats = {
+            "advert_connects": 0,
+            "blind_attempts": 0,
+            "failures": 0,
+        }
+
+    async def wait(self, adapter=None):
+        """
+        Espera a pulseira aparecer. Retorna o BLEDevice (anúncio) ou o MAC
+        (nenhum anúncio na janela: tentativa às cegas).
+        """
+        delay = self.retry_at - time.monotonic()
+        if delay > 0:
+            print(f"⏳ Nova tentativa em {delay:.0f}s ({self.failures} falhas seguidas)")
+            await asyncio.sleep(delay)
+
+        while True:
+            window = backoff_delay(self.failures)
+            device = await find_band(self.mac, self.rssi_min, window, adapter)
+            if device is not None:
+                self.via = "anúncio"
+                return device
+
+            self.failures += 1
+            if self.failures % BLIND_EVERY == 0:
+                self.via = "às cegas"
+                self.stats["blind_attempts"] += 1
+                return self.mac
+
+    def connected(self):
+        latency = time.monotonic() - self.lost_at
+        self.latencies.append(latency)
+        if self.via == "anúncio":
+            self.stats["advert_connects"] += 1
+
+        self.up = True
+        self.connected_at = time.monotonic()
+        print(f"🔁 Reconectado em {latency:.1f}s (via {self.via}) — {self.describe()}")
+        return latency
+
+    def disconnected(self):
+        """Chamado quando a sessão termina ou a tentativa falha."""
+        now = time.monotonic()
+        if self.up:
+            self.up = False
+            self.lost_at = now
+            if now - self.connected_at >= STABLE_SESSION:
+                self.failures = 0
+                self.retry_at = 0.0
+                return
+        else:
+            self.stats["failures"] += 1
+
+        # Falhou ou durou pouco: o próximo wait() espera o backoff
+        self.failures += 1
+        self.retry_at = now + backoff_delay(self.failures)
+
+    def summary(self):
+        values = list(self.latencies)
+        return {
+            "count": len(values),
+            "p50": percentile(values, 50),
+            "p90": percentile(values, 90),
+            "max": max(values) if values else None,
+            **self.stats,
+        }
+
+    def describe(self):
+        s = self.summary()
+        if not s["count"]:
+            return "sem reconexões"
+        return (
+            f"p50 {s['p50']:.1f}s, p90 {s['p90']:.1f}s, máx {s['max']:.1f}s "
+            f"({s['count']} reconexões, {s['advert_connects']} via anúncio, "
+            f"{s['blind_attempts']} às cegas)"
+        )
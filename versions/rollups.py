@@ -0,0 +1,346 @@
+"""
+rollups.py
+
+Agregados de batimento cardíaco mantidos incrementalmente.
+
+Tabelas (uma linha por intervalo):
+- heart_rate_1m → por minuto
+- heart_rate_1h → por hora
+- heart_rate_1d → por dia (meia-noite local)
+
+Cada linha guarda count, sum, sum_sq, min e max. Com isso dá para
+combinar intervalos e obter média, desvio padrão, mínimo e máximo
+sem reler as amostras brutas (~86 mil por dia).
+
+- apply()       → chamado pelo writer a cada lote gravado (mesma transação)
+- range_stats() → estatísticas de qualquer intervalo lendo poucas linhas
+- rebuild()     → recria os agregados a partir do bruto (health.db + shards)
+
+Só a pulseira principal (device_id = 0) entra nos agregados; as tabelas
+são indexadas só pelo intervalo. As outras pulseiras são consultadas no
+bruto (shards.raw_stats(..., device_id=N)).
+
+Reconstrução manual:
+    python versions/rollups.py --db health.db
+"""
+
+import argparse
+import math
+from datetime import datetime, time as dtime, timedelta
+from pathlib import Path
+
+import shards
+from migrations import transaction
+
+# ==================================================
+# CONFIGURAÇÃO
+# ==================================================
+
+DB_PATH = Path("health.db")
+
+MINUTE = 60
+HOUR = 3600
+
+TABLE_MINUTE = "heart_rate_1m"
+TABLE_HOUR = "heart_rate_1h"
+TABLE_DAY = "heart_rate_1d"
+
+ROLLUP_TABLES = (TABLE_MINUTE, TABLE_HOUR, TABLE_DAY)
+
+CREATE_SQL = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        bucket INTEGER PRIMARY KEY,
+        count INTEGER NOT NULL,
+        sum INTEGER NOT NULL,
+        sum_sq INTEGER NOT NULL,
+        min INTEGER NOT NULL,
+        max INTEGER NOT NULL
+    )
+"""
+
+UPSERT_SQL = """
+    INSERT INTO {name} (bucket, count, sum, sum_sq, min, max)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(bucket) DO UPDATE SET
+        count = count + excluded.count,
+        sum = sum + excluded.sum,
+        sum_sq = sum_sq + excluded.sum_sq,
+        min = MIN(min, excluded.min),
+        max = MAX(max, excluded.max)
+"""
+
+# Meia-noite local do epoch `bucket` (SQLite usa o mesmo fuso do processo)
+SQL_LOCAL_DAY = (
+    "CAST(strftime('%s', {col}, 'unixepoch', 'localtime', 'start of day', 'utc') AS INTEGER)"
+)
+
+# ==================================================
+# INTERVALOS
+# ==================================================
+
+def local_day_start(ts):
+    day = datetime.fromtimestamp(ts).date()
+    return int(datetime.combine(day, dtime.min).timestamp())
+
+def next_local_day(day_start):
+    day = datetime.fromtimestamp(day_start).date() + timedelta(days=1)
+    return int(datetime.combine(day, dtime.min).timestamp())
+
+def _floor(ts, size):
+    return ts - ts % size
+
+def _ceil(ts, size):
+    return -(-ts // size) * size
+
+# ==================================================
+# SCHEMA
+# ==================================================
+
+def create_tables(conn):
+    for name in ROLLUP_TABLES:
+        conn.execute(CREATE_SQL.format(name=name))
+
+# ==================================================
+# ATUALIZAÇÃO INCREMENTAL
+# ==================================================
+
+def _merge(acc, key, count, total, total_sq, lo, hi):
+    cur = acc.get(key)
+    if cur is None:
+        acc[key] = [count, total, total_sq, lo, hi]
+    else:
+        cur[0] += count
+        cur[1] += total
+        cur[2] += total_sq
+        if lo < cur[3]:
+            cur[3] = lo
+        if hi > cur[4]:
+            cur[4] = hi
+
+def aggregate(rows):
+    """rows: [(ts, bpm), ...] → dicionários {bucket: [count, sum, sum_sq, min, max]}."""
+    minutes = {}
+    for ts, bpm in rows:
+        _merge(minutes, _floor(ts, MINUTE), 1, bpm, bpm * bpm, bpm, bpm)
+
+    hours = {}
+    for bucket, agg in minutes.items():
+        _merge(hours, _floor(bucket, HOUR), *agg)
+
+    days = {}
+    day_of_hour = {}
+    for bucket, agg in hours.items():
+        day = day_of_hour.get(bucket)
+        if day is None:
+            day = day_of_hour[bucket] = local_day_start(bucket)
+        _merge(days, day, *agg)
+
+    return {TABLE_MINUTE: minutes, TABLE_HOUR: hours, TABLE_DAY: days}
+
+def apply(conn, rows):
+    """Soma um lote de (ts, bpm) aos agregados. Deve rodar na transação do INSERT."""
+    for name, buckets in aggregate(rows).items():
+        conn.executemany(
+            UPSERT_SQL.format(name=name),
+            [(bucket, *agg) for bucket, agg in buckets.items()]
+        )
+
+# ==================================================
+# RECONSTRUÇÃO
+# ==================================================
+
+def _rebuild_day(conn, day_start, day_end, source):
+    has_raw = conn.execute(
+        f"SELECT 1 FROM {source} WHERE ts >= ? AND ts < ? LIMIT 1",
+        (day_start, day_end)
+    ).fetchone()
+    if not has_raw:
+        # Bruto já descartado pela retenção: mantém os agregados existentes
+        return False
+
+    for name in ROLLUP_TABLES:
+        conn.execute(
+            f"DELETE FROM {name} WHERE bucket >= ? AND bucket < ?",
+            (day_start, day_end)
+        )
+
+    conn.execute(f"""
+        INSERT INTO {TABLE_MINUTE} (bucket, count, sum, sum_sq, min, max)
+        SELECT ts - ts % {MINUTE}, COUNT(*), SUM(bpm), SUM(bpm * bpm), MIN(bpm), MAX(bpm)
+        FROM {source}
+        WHERE ts >= ? AND ts < ?
+        GROUP BY 1
+    """, (day_start, day_end))
+
+    conn.execute(f"""
+        INSERT INTO {TABLE_HOUR} (bucket, count, sum, sum_sq, min, max)
+        SELECT bucket - bucket % {HOUR}, SUM(count), SUM(sum), SUM(sum_sq), MIN(min), MAX(max)
+        FROM {TABLE_MINUTE}
+        WHERE bucket >= ? AND bucket < ?
+        GROUP BY 1
+    """, (day_start, day_end))
+
+    conn.execute(f"""
+        INSERT INTO {TABLE_DAY} (bucket, count, sum, sum_sq, min, max)
+        SELECT {SQL_LOCAL_DAY.format(col='bucket')}, SUM(count), SUM(sum), SUM(sum_sq), MIN(min), MAX(max)
+        FROM {TABLE_HOUR}
+        WHERE bucket >= ? AND bucket < ?
+        GROUP BY 1
+    """, (day_start, day_end))
+
+    return True
+
+def _raw_bounds(conn):
+    primary = shards.device_filter(conn, "main", shards.PRIMARY_DEVICE)
+    lo, hi = conn.execute(
+        f"SELECT MIN(ts), MAX(ts) FROM main.heart_rate WHERE {primary}"
+    ).fetchone()
+    for year, month in shards.shard_months(conn):
+        ny, nm = shards.next_month(year, month)
+        first, last = shards.month_start(year, month), shards.month_start(ny, nm) - 1
+        lo = first if lo is None else min(lo, first)
+        hi = last if hi is None else max(hi, last)
+    return lo, hi
+
+def rebuild(conn, start=None, end=None):
+    """
+    Recria os agregados a partir do bruto, um dia por transação
+    (o writer BLE continua gravando entre os dias). Meses arquivados
+    são lidos do shard; dias sem bruto algum mantêm os agregados.
+    Conexão em autocommit (isolation_level=None).
+    """
+    create_tables(conn)
+
+    lo, hi = _raw_bounds(conn)
+    if lo is None:
+        return 0
+
+    if start is not None:
+        lo = max(lo, start)
+    if end is not None:
+        hi = min(hi, end - 1)
+
+    # Sem device_id (ainda antes da migração 5) todo o bruto é da principal
+    primary = shards.device_filter(conn, "main", shards.PRIMARY_DEVICE)
+
+    days = 0
+    for year, month, month_lo, month_hi in shards.months_in_range(lo, hi + 1):
+        source = f"(SELECT id, ts, bpm FROM main.heart_rate WHERE {primary})"
+        alias = shards.attach(conn, year, month)
+        try:
+            archived = alias and shards.device_filter(conn, alias, shards.PRIMARY_DEVICE)
+            if archived:
+                # UNION remove as linhas que estão nos dois lados (arquivamento interrompido)
+                source = (
+                    f"(SELECT id, ts, bpm FROM main.heart_rate WHERE {primary} "
+                    f"UNION SELECT id, ts, bpm FROM {alias}.heart_rate WHERE {archived})"
+                )
+
+            day_start = local_day_start(max(lo, month_lo))
+            while day_start < min(hi + 1, month_hi):
+                day_end = next_local_day(day_start)
+                with transaction(conn, "IMMEDIATE"):
+                    if _rebuild_day(conn, day_start, day_end, source):
+                        days += 1
+                day_start = day_end
+        finally:
+            if alias:
+                shards.detach(conn, alias)
+
+    return days
+
+# ==================================================
+# CONSULTA POR INTERVALO
+# ==================================================
+
+def split_range(start, end):
+    """
+    Quebra [start, end) em pedaços atendidos pela tabela mais grossa possível:
+    dias inteiros → heart_rate_1d, horas inteiras → heart_rate_1h,
+    minutos inteiros → heart_rate_1m e as pontas em segundos → heart_rate.
+    """
+    pieces = []
+
+    m0, m1 = _ceil(start, MINUTE), _floor(end, MINUTE)
+    if m0 >= m1:
+        return [("heart_rate", start, end)]
+    pieces.append(("heart_rate", start, m0))
+    pieces.append(("heart_rate", m1, end))
+
+    h0, h1 = _ceil(m0, HOUR), _floor(m1, HOUR)
+    if h0 >= h1:
+        pieces.append((TABLE_MINUTE, m0, m1))
+        return [p for p in pieces if p[1] < p[2]]
+    pieces.append((TABLE_MINUTE, m0, h0))
+    pieces.append((TABLE_MINUTE, h1, m1))
+
+    d0 = local_day_start(h0)
+    if d0 < h0:
+        d0 = next_local_day(d0)
+    d1 = local_day_start(h1)
+
+    # Dias inteiros só se a meia-noite local cair em hora cheia
+    if d0 < d1 and d0 % HOUR == 0 and d1 % HOUR == 0:
+        pieces.append((TABLE_HOUR, h0, d0))
+        pieces.append((TABLE_HOUR, d1, h1))
+        pieces.append((TABLE_DAY, d0, d1))
+    else:
+        pieces.append((TABLE_HOUR, h0, h1))
+
+    return [p for p in pieces if p[1] < p[2]]
+
+def _query_piece(conn, table, start, end):
+    if table == "heart_rate":
+        # Bruto pode estar no health.db ou num shard mensal arquivado
+        return shards.raw_stats(conn, start, end)
+
+    return conn.execute(f"""
+        SELECT SUM(count), SUM(sum), SUM(sum_sq), MIN(min), MAX(max)
+        FROM {table} WHERE bucket >= ? AND bucket < ?
+    """, (start, end)).fetchone()
+
+def range_stats(conn, start, end):
+    """Estatísticas de heart_rate em [start, end) (epoch). None se não houver dados."""
+    acc = {}
+    for table, a, b in split_range(start, end):
+        count, total, total_sq, lo, hi = _query_piece(conn, table, a, b)
+        if count:
+            _merge(acc, 0, count, total, total_sq, lo, hi)
+
+    if not acc:
+        return None
+
+    count, total, total_sq, lo, hi = acc[0]
+    mean = total / count
+    variance = max(0.0, total_sq / count - mean * mean)
+
+    return {
+        "total": int(count),
+        "avg": round(mean, 1),
+        "min": int(lo),
+        "max": int(hi),
+        "std": round(math.sqrt(variance), 1),
+    }
+
+# ==================================================
+# MAIN
+# ==================================================
+
+def main():
+    import storage
+
+    parser = argparse.ArgumentParser(description="Reconstrói os agregados de BPM")
+    parser.add_argument("--db", default=str(DB_PATH))
+    args = parser.parse_args()
+
+    storage.init_db(args.db)
+
+    conn = storage.connect(args.db)
+    conn.isolation_level = None
+    days = rebuild(conn)
+    conn.close()
+
+    print(f"✅ Agregados reconstruídos ({days} dias)")
+
+if __name__ == "__main__":
+    main()
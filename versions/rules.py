@@ -0,0 +1,378 @@
+"""
+rules.py
+
+Regras de alerta declarativas (arquivo JSON) compiladas em avaliadores.
+
+Antes:
+- Limites como constantes em cada script, divergindo entre versões
+  (BRADY_LIMIT 45 na v4 e 50 na v8, TACHY_LIMIT 120 x 110,
+  NO_DATA_TIMEOUT...)
+- Lógica escrita à mão em hr_notification / check_alerts /
+  evaluate_stage; mudar um limite = editar código e reconectar
+
+Agora:
+- Regras num arquivo (ver alert_rules.example.json); sem arquivo valem
+  DEFAULT_RULES (os limites da v7/v8) ou as padrão do script
+  (RuleFile(path, defaults), ex.: V4_RULES na v4)
+- Cada regra vira um avaliador pequeno com estado próprio; por amostra,
+  custo O(1) por regra (a de variação usa deques monotônicas: O(1)
+  amortizado, sem reler a janela)
+- RuleFile.reload() relê o arquivo quando o mtime muda: os scripts
+  chamam a cada RELOAD_INTERVAL, sem reconectar à pulseira. Regras que
+  não mudaram mantêm o estado (uma sustentada em curso não recomeça).
+  Arquivo inválido: mantém as regras anteriores e avisa
+
+Tipos (campo "kind"):
+- threshold → "below" e/ou "above": ativa a cada amostra fora do limite
+- sustained → "below"/"above" por "for" segundos e/ou "samples" amostras
+  seguidas (buraco maior que "max_gap" recomeça a contagem)
+- rate      → variação de pelo menos "delta" BPM dentro de "within"
+  segundos; "direction": "up", "down" ou "any"
+- absence   → nenhuma amostra há mais de "after" segundos (avaliada no
+  tick periódico, não por amostra)
+
+Comuns a todas:
+- "name" (único), "severity" ("urgent", "high", "default"...: vira a
+  prioridade do ntfy), "message" (modelo com {bpm}, {delta}, {seconds},
+  {minutes}, {name})
+- "states": estados da pulseira em que a regra vale (padrão
+  ["IN_USE"]; ex.: nada de bradicardia com a pulseira no carregador)
+
+Envio (usados pelo alert_index.py, não pelos avaliadores):
+- "cooldown": s entre avisos repetidos da mesma regra, pulseira e
+  severidade enquanto ela continua ativa (padrão 600)
+- "escalate": [{"after": s, "severity": ...}]: ativa há `after` s sem
+  parar → aviso com a severidade mais alta
+- "resolve_after": s sem disparar para a regra contar como resolvida
+  (padrão 120); "resolved_message" (null = sem aviso de resolvida)
+
+Uso:
+    rule_file = RuleFile("alert_rules.json")
+    evaluator = Evaluator(rule_file.rules)
+    for rule, message in evaluator.sample(ts, bpm, wearable_state): ...
+    for rule, message in evaluator.tick(time.time(), wearable_state): ...
+    if rule_file.reload():
+        evaluator.load(rule_file.rules)
+"""
+
+import json
+import os
+from collections import deque
+from pathlib import Path
+
+# ==================================================
+# CONFIGURAÇÃO
+# ==================================================
+
+RULES_PATH = Path("alert_rules.json")
+RELOAD_INTERVAL = 5.0         # s entre verificações do mtime do arquivo
+
+DEFAULT_STATES = ("IN_USE",)
+DEFAULT_MAX_GAP = 30.0        # s: buraco que recomeça uma sustentada
+DEFAULT_COOLDOWN = 600.0      # s entre avisos repetidos (o ALERT_COOLDOWN antigo)
+DEFAULT_RESOLVE_AFTER = 120.0 # s sem disparar = resolvida
+DEFAULT_RESOLVED_MESSAGE = "{name}: normalizado (ativo por {minutes} min)"
+
+DEFAULT_RULES = [
+    {"name": "bradicardia", "kind": "threshold", "below": 50, "severity": "urgent",
+     "message": "Bradicardia (BPM={bpm})"},
+    {"name": "taquicardia", "kind": "threshold", "above": 110, "severity": "urgent",
+     "message": "Taquicardia (BPM={bpm})"},
+    {"name": "sem_dados", "kind": "absence", "after": 300, "severity": "high",
+     "message": "Sem dados de batimento há {minutes} minutos"},
+]
+
+# ==================================================
+# AVALIADORES (um por regra e por pulseira)
+# ==================================================
+
+def _outside(below, above):
+    """Condição de limite como função (evita ifs por amostra)."""
+    if below is not None and above is not None:
+        return lambda bpm: bpm <= below or bpm >= above
+    if below is not None:
+        return lambda bpm: bpm <= below
+    return lambda bpm: bpm >= above
+
+class ThresholdState:
+    __slots__ = ("test",)
+
+    def __init__(self, rule):
+        self.test = _outside(rule.spec.get("below"), rule.spec.get("above"))
+
+    def sample(self, ts, bpm):
+        return {"bpm": bpm} if self.test(bpm) else None
+
+    def tick(self, now):
+        return None
+
+    def reset(self):
+        pass
+
+class SustainedState:
+    __slots__ = ("test", "duration", "samples", "max_gap", "since", "count", "last_ts")
+
+    def __init__(self, rule):
+        spec = rule.spec
+        self.test = _outside(spec.get("below"), spec.get("above"))
+        self.duration = spec.get("for", 0)
+        self.samples = spec.get("samples", 1)
+        self.max_gap = spec.get("max_gap", DEFAULT_MAX_GAP)
+        self.reset()
+
+    def sample(self, ts, bpm):
+        if not self.test(bpm):
+            self.reset()
+            return None
+        if self.last_ts is not None and ts - self.last_ts > self.max_gap:
+            self.reset()
+        if self.since is None:
+            self.since = ts
+        self.count += 1
+        self.last_ts = ts
+        seconds = ts - self.since
+        if self.count >= self.samples and seconds >= self.duration:
+            return {"bpm": bpm, "seconds": int(seconds), "minutes": int(seconds // 60)}
+        return None
+
+    def tick(self, now):
+        return None
+
+    def reset(self):
+        self.since = None
+        self.count = 0
+        self.last_ts = None
+
+class RateState:
+    __slots__ = ("delta", "within", "up", "down", "lows", "highs")
+
+    def __init__(self, rule):
+        spec = rule.spec
+        direction = spec.get("direction", "any")
+        self.delta = spec["delta"]
+        self.within = spec["within"]
+        self.up = direction in ("up", "any")
+        self.down = direction in ("down", "any")
+        self.lows = deque()
+        self.highs = deque()
+
+    def sample(self, ts, bpm):
+        # Deques monotônicas: mínimo e máximo da janela sempre na ponta
+        lows, highs = self.lows, self.highs
+        cutoff = ts - self.within
+        while lows and lows[0][0] < cutoff:
+            lows.popleft()
+        while highs and highs[0][0] < cutoff:
+            highs.popleft()
+
+        rise = bpm - lows[0][1] if lows else 0
+        fall = highs[0][1] - bpm if highs else 0
+
+        while lows and lows[-1][1] >= bpm:
+            lows.pop()
+        lows.append((ts, bpm))
+        while highs and highs[-1][1] <= bpm:
+            highs.pop()
+        highs.append((ts, bpm))
+
+        if self.up and rise >= self.delta:
+            return {"bpm": bpm, "delta": rise}
+        if self.down and fall >= self.delta:
+            return {"bpm": bpm, "delta": fall}
+        return None
+
+    def tick(self, now):
+        return None
+
+    def reset(self):
+        self.lows.clear()
+        self.highs.clear()
+
+class AbsenceState:
+    __slots__ = ("after", "last_ts")
+
+    def __init__(self, rule):
+        self.after = rule.spec["after"]
+        self.last_ts = None
+
+    def sample(self, ts, bpm):
+        self.last_ts = ts
+        return None
+
+    def tick(self, now):
+        # Só depois da primeira amostra (igual ao NO_DATA_TIMEOUT antigo)
+        if self.last_ts is None:
+            return None
+        seconds = now - self.last_ts
+        if seconds > self.after:
+            return {"seconds": int(seconds), "minutes": int(seconds // 60)}
+        return None
+
+    def reset(self):
+        pass
+
+KINDS = {
+    "threshold": (ThresholdState, ()),
+    "sustained": (SustainedState, ()),
+    "rate": (RateState, ("delta", "within")),
+    "absence": (AbsenceState, ("after",)),
+}
+
+# ==================================================
+# REGRAS
+# ==================================================
+
+class _Fields(dict):
+    # Campo ausente no modelo fica visível em vez de derrubar o alerta
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+class Rule:
+    def __init__(self, spec):
+        self.spec = spec
+        self.name = spec["name"]
+        self.kind = spec["kind"]
+        self.severity = spec.get("severity", "default")
+        self.template = spec.get("message", self.name + " (BPM={bpm})")
+        self.states = frozenset(spec.get("states", DEFAULT_STATES))
+        self.cooldown = spec.get("cooldown", DEFAULT_COOLDOWN)
+        self.resolve_after = spec.get("resolve_after", DEFAULT_RESOLVE_AFTER)
+        self.resolved_template = spec.get("resolved_message", DEFAULT_RESOLVED_MESSAGE)
+        # [(após s ativa, severidade)], em ordem crescente
+        self.escalate = sorted((tier["after"], tier["severity"]) for tier in spec.get("escalate", ()))
+        self.factory = KINDS[self.kind][0]
+        self.ticks = self.kind == "absence"
+        # Identidade para o reload: mesma regra = mesmo estado
+        self.signature = json.dumps(spec, sort_keys=True)
+
+    def new_state(self):
+        return self.factory(self)
+
+    def format(self, fields):
+        fields = _Fields(fields)
+        fields["name"] = self.name
+        return self.template.format_map(fields)
+
+    def format_resolved(self, seconds):
+        if self.resolved_template is None:
+            return None
+        fields = _Fields(seconds=int(seconds), minutes=int(seconds // 60), name=self.name)
+        return self.resolved_template.format_map(fields)
+
+def compile_rules(specs, source="regras"):
+    """Valida e compila a lista de regras. ValueError com o motivo."""
+    if not isinstance(specs, list):
+        raise ValueError(f"{source}: esperado uma lista de regras")
+
+    rules = []
+    seen = set()
+    for i, spec in enumerate(specs):
+        where = f"{source}, regra {i + 1}"
+        if not isinstance(spec, dict) or "name" not in spec:
+            raise ValueError(f"{where}: precisa de \"name\"")
+        if spec["name"] in seen:
+            raise ValueError(f"{where}: nome repetido \"{spec['name']}\"")
+        seen.add(spec["name"])
+
+        kind = spec.get("kind")
+        if kind not in KINDS:
+            raise ValueError(f"{where}: kind inválido {kind!r} (use {', '.join(KINDS)})")
+        for field in KINDS[kind][1]:
+            if field not in spec:
+                raise ValueError(f"{where}: {kind} precisa de \"{field}\"")
+        if kind in ("threshold", "sustained") and "below" not in spec and "above" not in spec:
+            raise ValueError(f"{where}: {kind} precisa de \"below\" e/ou \"above\"")
+        if spec.get("direction", "any") not in ("up", "down", "any"):
+            raise ValueError(f"{where}: direction deve ser up, down ou any")
+        escalate = spec.get("escalate", [])
+        if not isinstance(escalate, list) or not all(
+            isinstance(tier, dict) and "after" in tier and "severity" in tier for tier in escalate
+        ):
+            raise ValueError(f"{where}: escalate deve ser uma lista de {{\"after\", \"severity\"}}")
+
+        rules.append(Rule(spec))
+    return rules
+
+def load_rules(path=RULES_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            specs = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{path}: JSON inválido ({e})")
+    return compile_rules(specs, str(path))
+
+class RuleFile:
+    """Regras de um arquivo com recarga pelo mtime (`defaults` se não existe)."""
+
+    def __init__(self, path=RULES_PATH, defaults=DEFAULT_RULES):
+        self.path = Path(path)
+        self.mtime = None
+        self.rules = compile_rules(defaults, "regras padrão")
+        self.reloads = 0
+        if self.path.exists():
+            self.reload()
+        else:
+            print(f"📋 {self.path} não encontrado, usando as regras padrão")
+
+    def reload(self):
+        """Relê se o arquivo mudou. True se as regras foram trocadas."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self.mtime:
+            return False
+        self.mtime = mtime
+
+        try:
+            rules = load_rules(self.path)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Regras não recarregadas, mantendo as anteriores: {e}")
+            return False
+
+        self.rules = rules
+        self.reloads += 1
+        print(f"📋 {len(rules)} regras carregadas de {self.path}: " + ", ".join(r.name for r in rules))
+        return True
+
+# ==================================================
+# AVALIAÇÃO (uma instância por pulseira)
+# ==================================================
+
+class Evaluator:
+    def __init__(self, rules):
+        self.entries = []
+        self.load(rules)
+
+    def load(self, rules):
+        """Troca as regras mantendo o estado das que não mudaram."""
+        previous = {rule.signature: st for rule, st in self.entries}
+        self.entries = [(rule, previous.get(rule.signature) or rule.new_state()) for rule in rules]
+        self.ticking = [(rule, st) for rule, st in self.entries if rule.ticks]
+
+    def sample(self, ts, bpm, state="IN_USE"):
+        """[(regra, mensagem), ...] das regras ativas nesta amostra."""
+        fired = []
+        for rule, st in self.entries:
+            if state not in rule.states:
+                # Fora do estado: janelas e contagens recomeçam; a de
+                # ausência continua anotando a última amostra
+                st.reset()
+                if rule.ticks:
+                    st.sample(ts, bpm)
+                continue
+            fields = st.sample(ts, bpm)
+            if fields is not None:
+                fired.append((rule, rule.format(fields)))
+        return fired
+
+    def tick(self, now, state="IN_USE"):
+        """Regras avaliadas pelo relógio (ausência de dados)."""
+        fired = []
+        for rule, st in self.ticking:
+            if state not in rule.states:
+                continue
+            fields = st.tick(now)
+            if fields is not None:
+                fired.append((rule, rule.format(fields)))
+        return fired
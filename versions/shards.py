@@ -0,0 +1,387 @@
+"""
+shards.py
+
+Particionamento mensal das amostras brutas de BPM + retenção.
+
+Layout:
+- health.db                     → mês corrente (e recentes), agregados, eventos
+- shards/health_YYYY_MM.db      → amostras brutas de heart_rate de meses fechados
+
+Os agregados (rollups.py) ficam sempre no health.db, então relatórios
+continuam funcionando mesmo depois que o bruto sai do arquivo quente.
+
+Várias pulseiras (migração 5):
+- Shards guardam device_id como o health.db; retenção e arquivamento
+  valem para todas as pulseiras
+- Consultas recebem device_id (padrão 0, a pulseira principal)
+- Shard antigo, sem a coluna, ganha device_id = 0 quando é reaberto
+  para escrita; só leitura → conta como só da principal
+
+Consultas:
+- raw_stats() / iter_heart_rate() recebem um intervalo [start, end)
+- Só os shards dos meses tocados pelo intervalo são anexados (ATTACH)
+  e desanexados logo depois
+- Mês com shard: shard e health.db são lidos juntos; ids que estão nos
+  dois (arquivamento interrompido) contam uma vez e iter_heart_rate
+  intercala os dois lados por ts
+
+Retenção:
+- apply_retention(keep_months=N) move (archive) ou apaga (drop) o bruto
+  com mais de N meses do health.db
+- drop só apaga a pulseira principal (a única com agregados); as outras
+  são arquivadas mesmo assim, senão perderiam o histórico inteiro
+- Cópia primeiro, remoção depois (INSERT OR IGNORE): se cair no meio,
+  rodar de novo não perde nem duplica amostras
+
+Uso:
+    python versions/shards.py --db health.db --keep-months 3
+    python versions/shards.py --db health.db --keep-months 6 --drop --vacuum
+"""
+
+import argparse
+import heapq
+from datetime import datetime, date
+from operator import itemgetter
+from pathlib import Path
+
+from migrations import transaction
+
+# ==================================================
+# CONFIGURAÇÃO
+# ==================================================
+
+DB_PATH = Path("health.db")
+
+SHARD_DIR = "shards"
+SHARD_NAME = "health_{year:04d}_{month:02d}.db"
+
+KEEP_MONTHS = 3          # meses de bruto mantidos no health.db
+DELETE_CHUNK = 5000      # linhas removidas por transação
+FETCH_SIZE = 1000
+
+PRIMARY_DEVICE = 0          # pulseira principal (agregados, HRV)
+
+SHARD_TABLE = """
+    CREATE TABLE IF NOT EXISTS {alias}.heart_rate (
+        id INTEGER PRIMARY KEY,
+        ts INTEGER NOT NULL,
+        bpm INTEGER NOT NULL,
+        device_id INTEGER NOT NULL DEFAULT 0
+    )
+"""
+
+SHARD_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS {alias}.idx_heart_rate_ts ON heart_rate (ts, bpm)",
+    "CREATE INDEX IF NOT EXISTS {alias}.idx_heart_rate_device_ts ON heart_rate (device_id, ts, bpm)",
+)
+
+# ==================================================
+# MESES
+# ==================================================
+
+def month_start(year, month):
+    return int(datetime(year, month, 1).timestamp())
+
+def next_month(year, month):
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+def months_in_range(start, end):
+    """[(ano, mês, início, fim), ...] dos meses locais tocados por [start, end)."""
+    if start >= end:
+        return []
+
+    first = datetime.fromtimestamp(start)
+    year, month = first.year, first.month
+
+    months = []
+    while True:
+        lo = month_start(year, month)
+        if lo >= end:
+            break
+        ny, nm = next_month(year, month)
+        months.append((year, month, lo, month_start(ny, nm)))
+        year, month = ny, nm
+    return months
+
+# ==================================================
+# ARQUIVOS / ATTACH
+# ==================================================
+
+def main_db_path(conn):
+    for _, name, path in conn.execute("PRAGMA database_list"):
+        if name == "main":
+            return Path(path)
+    return DB_PATH
+
+def shard_path(conn, year, month):
+    return main_db_path(conn).parent / SHARD_DIR / SHARD_NAME.format(year=year, month=month)
+
+def list_shards(conn):
+    folder = main_db_path(conn).parent / SHARD_DIR
+    if not folder.exists():
+        return []
+    return sorted(folder.glob("health_*.db"))
+
+def shard_months(conn):
+    months = []
+    for path in list_shards(conn):
+        _, year, month = path.stem.split("_")
+        months.append((int(year), int(month)))
+    return months
+
+def attach(conn, year, month, create=False):
+    """Anexa o shard do mês. Retorna o alias, ou None se o shard não existir."""
+    path = shard_path(conn, year, month)
+    if not path.exists():
+        if not create:
+            return None
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+    alias = f"shard_{year:04d}_{month:02d}"
+    conn.execute("ATTACH DATABASE ? AS " + alias, (str(path),))
+    if create:
+        conn.execute(SHARD_TABLE.format(alias=alias))
+        if not has_device_column(conn, alias):
+            # Shard de antes das várias pulseiras: tudo era da principal
+            conn.execute(
+                f"ALTER TABLE {alias}.heart_rate ADD COLUMN device_id INTEGER NOT NULL DEFAULT 0"
+            )
+        for sql in SHARD_INDEXES:
+            conn.execute(sql.format(alias=alias))
+    return alias
+
+def detach(conn, alias):
+    conn.execute(f"DETACH DATABASE {alias}")
+
+def has_device_column(conn, alias="main"):
+    return any(row[1] == "device_id" for row in conn.execute(f"PRAGMA {alias}.table_info(heart_rate)"))
+
+def device_filter(conn, alias, device_id):
+    """
+    Condição SQL da pulseira em {alias}.heart_rate ("1" = todas as linhas),
+    ou None se ali não pode haver amostras dela.
+    """
+    if has_device_column(conn, alias):
+        return f"device_id = {int(device_id)}"
+    # Shard antigo (ou health.db antes da migração 5): só a principal
+    return "1" if device_id == PRIMARY_DEVICE else None
+
+def device_ids(conn):
+    """Pulseiras que podem ter bruto: a principal + as cadastradas em `devices`."""
+    ids = [PRIMARY_DEVICE]
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'devices'").fetchone():
+        ids += [row[0] for row in conn.execute("SELECT id FROM devices ORDER BY id") if row[0] != PRIMARY_DEVICE]
+    return ids
+
+# ==================================================
+# CONSULTAS ROTEADAS
+# ==================================================
+
+def _month_selects(conn, alias, device_id, columns, min_id=None, max_id=None):
+    """
+    SELECTs (parâmetros: início e fim de ts) das amostras da pulseira num
+    mês: o shard, se houver, e o health.db. Linhas do health.db que já estão
+    no shard (arquivamento interrompido antes do DELETE) ficam de fora,
+    então cada id conta uma vez. min_id < id <= max_id, se dados.
+    """
+    ids = "" if min_id is None else f" AND id > {int(min_id)}"
+    ids += "" if max_id is None else f" AND id <= {int(max_id)}"
+    selects = []
+    shard = alias and device_filter(conn, alias, device_id)
+    if shard:
+        selects.append(
+            f"SELECT {columns} FROM {alias}.heart_rate WHERE ts >= ? AND ts < ? AND {shard}{ids}"
+        )
+    main = device_filter(conn, "main", device_id)
+    if main:
+        archived = f" AND NOT EXISTS (SELECT 1 FROM {alias}.heart_rate s WHERE s.id = m.id)" if alias else ""
+        selects.append(
+            f"SELECT {columns} FROM main.heart_rate m WHERE ts >= ? AND ts < ? AND {main}{ids}{archived}"
+        )
+    return selects
+
+def _fetch(cur, fetch_size):
+    while True:
+        rows = cur.fetchmany(fetch_size)
+        if not rows:
+            return
+        yield from rows
+
+def raw_stats(conn, start, end, device_id=PRIMARY_DEVICE):
+    """(count, sum, sum_sq, min, max) das amostras brutas da pulseira em [start, end)."""
+    count, total, total_sq, lo, hi = 0, 0, 0, None, None
+
+    for year, month, m_lo, m_hi in months_in_range(start, end):
+        a, b = max(start, m_lo), min(end, m_hi)
+        alias = attach(conn, year, month)
+        try:
+            selects = _month_selects(conn, alias, device_id, "bpm")
+            if not selects:
+                continue
+            row = conn.execute(f"""
+                SELECT COUNT(*), SUM(bpm), SUM(bpm * bpm), MIN(bpm), MAX(bpm)
+                FROM ({" UNION ALL ".join(selects)})
+            """, (a, b) * len(selects)).fetchone()
+        finally:
+            if alias:
+                detach(conn, alias)
+
+        if row[0]:
+            count += row[0]
+            total += row[1]
+            total_sq += row[2]
+            lo = row[3] if lo is None else min(lo, row[3])
+            hi = row[4] if hi is None else max(hi, row[4])
+
+    return count, total, total_sq, lo, hi
+
+def iter_heart_rate(conn, start, end, fetch_size=FETCH_SIZE, device_id=PRIMARY_DEVICE,
+                    min_id=None, max_id=None):
+    """Gera (ts, bpm) da pulseira em [start, end), em ordem de ts, sem carregar tudo na memória."""
+    for year, month, m_lo, m_hi in months_in_range(start, end):
+        a, b = max(start, m_lo), min(end, m_hi)
+        alias = attach(conn, year, month)
+        cursors = []
+        try:
+            for sql in _month_selects(conn, alias, device_id, "ts, bpm", min_id, max_id):
+                cursors.append(conn.execute(sql + " ORDER BY ts", (a, b)))
+            # Shard e health.db vêm cada um em ordem de ts: intercala os dois
+            yield from heapq.merge(*(_fetch(cur, fetch_size) for cur in cursors), key=itemgetter(0))
+        finally:
+            for cur in cursors:
+                cur.close()
+            if alias:
+                detach(conn, alias)
+
+def last_id(conn):
+    """Maior id já dado a uma amostra de heart_rate (vale também para os shards)."""
+    row = None
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'").fetchone():
+        # AUTOINCREMENT: continua valendo depois que o bruto sai do health.db
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'heart_rate'").fetchone()
+    if row is None:
+        row = conn.execute("SELECT COALESCE(MAX(id), 0) FROM main.heart_rate").fetchone()
+    return row[0]
+
+def iter_ids(conn, after_id, upto_id, before, fetch_size=FETCH_SIZE):
+    """
+    Gera (id, device_id, ts) das amostras com after_id < id <= upto_id e
+    ts < before, no health.db e em todos os shards (busca pelo id, não
+    pelo ts). Pode repetir um id que está nos dois lados.
+    """
+    sources = [(None, None)] + shard_months(conn)
+    for year, month in sources:
+        alias = "main" if year is None else attach(conn, year, month)
+        device = "device_id" if has_device_column(conn, alias) else str(PRIMARY_DEVICE)
+        cur = conn.execute(
+            f"SELECT id, {device}, ts FROM {alias}.heart_rate "
+            f"WHERE id > ? AND id <= ? AND ts < ?",
+            (after_id, upto_id, before)
+        )
+        try:
+            yield from _fetch(cur, fetch_size)
+        finally:
+            cur.close()
+            if alias != "main":
+                detach(conn, alias)
+
+# ==================================================
+# RETENÇÃO
+# ==================================================
+
+def retention_cutoff(keep_months, today=None):
+    """Início do mês mais antigo que continua no health.db."""
+    today = today or date.today()
+    year, month = today.year, today.month - keep_months
+    while month < 1:
+        month += 12
+        year -= 1
+    return month_start(year, month)
+
+def _delete_range(conn, start, end, chunk=DELETE_CHUNK, device_id=None):
+    where = "1" if device_id is None else device_filter(conn, "main", device_id)
+    deleted = 0
+    while True:
+        with transaction(conn, "IMMEDIATE"):
+            cur = conn.execute(f"""
+                DELETE FROM main.heart_rate WHERE id IN (
+                    SELECT id FROM main.heart_rate
+                    WHERE ts >= ? AND ts < ? AND {where} LIMIT ?
+                )
+            """, (start, end, chunk))
+        deleted += cur.rowcount
+        if cur.rowcount < chunk:
+            return deleted
+
+def archive_month(conn, year, month, lo, hi):
+    alias = attach(conn, year, month, create=True)
+    try:
+        with transaction(conn, "IMMEDIATE"):
+            conn.execute(f"""
+                INSERT OR IGNORE INTO {alias}.heart_rate (id, ts, bpm, device_id)
+                SELECT id, ts, bpm, device_id FROM main.heart_rate
+                WHERE ts >= ? AND ts < ?
+            """, (lo, hi))
+    finally:
+        detach(conn, alias)
+
+    return _delete_range(conn, lo, hi)
+
+def apply_retention(conn, keep_months=KEEP_MONTHS, drop=False, today=None):
+    """
+    Tira do health.db o bruto anterior a `keep_months` meses (todas as pulseiras).
+    archive (padrão) → move para shards/ ; drop → apaga a principal (coberta
+    pelos agregados) e arquiva as outras. Agregados não são tocados. Conexão em autocommit (isolation_level=None).
+    """
+    cutoff = retention_cutoff(keep_months, today)
+    oldest = conn.execute("SELECT MIN(ts) FROM main.heart_rate").fetchone()[0]
+    if oldest is None or oldest >= cutoff:
+        return {}
+
+    moved = {}
+    for year, month, lo, hi in months_in_range(oldest, cutoff):
+        count = 0
+        if drop:
+            count = _delete_range(conn, lo, hi, device_id=PRIMARY_DEVICE)
+        # Sem drop: tudo; com drop: só o que sobrou (outras pulseiras)
+        if conn.execute("SELECT 1 FROM main.heart_rate WHERE ts >= ? AND ts < ? LIMIT 1", (lo, hi)).fetchone():
+            count += archive_month(conn, year, month, lo, hi)
+        if count:
+            moved[f"{year:04d}-{month:02d}"] = count
+
+    return moved
+
+# ==================================================
+# MAIN
+# ==================================================
+
+def main():
+    import storage
+
+    parser = argparse.ArgumentParser(description="Retenção / shards mensais do health.db")
+    parser.add_argument("--db", default=str(DB_PATH))
+    parser.add_argument("--keep-months", type=int, default=KEEP_MONTHS)
+    parser.add_argument("--drop", action="store_true", help="apaga a pulseira principal em vez de arquivar (as outras são arquivadas)")
+    parser.add_argument("--vacuum", action="store_true", help="compacta o health.db no final")
+    args = parser.parse_args()
+
+    storage.init_db(args.db)
+
+    conn = storage.connect(args.db)
+    conn.isolation_level = None
+    moved = apply_retention(conn, args.keep_months, args.drop)
+
+    action = "apagadas/arquivadas" if args.drop else "arquivadas"
+    for month, count in moved.items():
+        print(f"📦 {month}: {count} amostras {action}")
+    if not moved:
+        print("Nada para arquivar.")
+
+    if args.vacuum:
+        conn.execute("VACUUM")
+        print("🧹 health.db compactado")
+
+    conn.close()
+
+if __name__ == "__main__":
+    main()
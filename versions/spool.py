@@ -0,0 +1,256 @@
+"""
+spool.py
+
+Journal append-only em disco para leituras ainda não gravadas no SQLite.
+
+Problema:
+- Se o SQLite falha (banco travado, disco cheio, soluço do cartão SD),
+  a leitura estava só na memória e se perdia
+
+Agora (usado por storage.py):
+- Toda leitura vai primeiro para o journal (spool/readings.spool)
+  e só depois para a fila do writer
+- Cada registro tem número de sequência e CRC32
+- O writer grava no SQLite e, na mesma transação, o último seq gravado
+  (tabela spool_state)
+- No startup, ou quando o banco volta, o que estiver no journal com
+  seq maior que o gravado é reaplicado em lote
+- Quando tudo foi gravado, o journal é truncado
+
+Durabilidade:
+- Escrita bufferizada + flush para o SO a cada registro (sobrevive a
+  crash do processo)
+- fsync periódico (SYNC_INTERVAL), não por amostra
+- Pelo menos uma vez: um registro só sai do journal depois do commit
+
+Formato do registro:
+    crc32 (4) | tamanho (2) | seq (8) | tabela (1) | ts (8) | [device (2)] | valor
+    valor: int64 para heart_rate/battery_level, UTF-8 para wearable_events
+    device: só quando a tabela tem o bit DEVICE_FLAG (pulseira ≠ 0);
+    registros da pulseira principal continuam no formato antigo
+"""
+
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+
+# ==================================================
+# CONFIGURAÇÃO
+# ==================================================
+
+SPOOL_DIR = "spool"
+SPOOL_FILE = "readings.spool"
+
+SYNC_INTERVAL = 2.0       # segundos entre fsyncs
+
+HEADER = struct.Struct(">IH")     # crc32, tamanho do corpo
+BODY = struct.Struct(">QBq")      # seq, tabela, ts
+INT_VALUE = struct.Struct(">q")
+DEVICE = struct.Struct(">H")
+
+DEVICE_FLAG = 0x80
+
+TABLE_CODES = {
+    "heart_rate": 1,
+    "battery_level": 2,
+    "wearable_events": 3,
+}
+TABLE_NAMES = {code: name for name, code in TABLE_CODES.items()}
+TEXT_TABLES = {"wearable_events"}
+
+# ==================================================
+# ESTADO
+# ==================================================
+
+_lock = threading.Lock()
+_file = None
+_path = None
+_last_seq = 0
+_dirty = False
+
+stats = {
+    "appended": 0,
+    "syncs": 0,
+    "replayed": 0,
+    "truncations": 0,
+    "corrupt_tail": 0,
+}
+
+# ==================================================
+# CODIFICAÇÃO
+# ==================================================
+
+def encode_record(seq, table, ts, value, device=0):
+    if table in TEXT_TABLES:
+        raw = str(value).encode("utf-8")
+    else:
+        raw = INT_VALUE.pack(int(value))
+
+    code = TABLE_CODES[table]
+    if device:
+        code |= DEVICE_FLAG
+        raw = DEVICE.pack(device) + raw
+
+    body = BODY.pack(seq, code, int(ts)) + raw
+    return HEADER.pack(zlib.crc32(body), len(body)) + body
+
+def read_records(path, after_seq=0, limit=None):
+    """
+    Gera (seq, tabela, (ts, valor, device)) com seq > after_seq, até `limit` bytes.
+    Para no primeiro registro incompleto ou com CRC inválido (cauda de um crash).
+    """
+    path = Path(path)
+    if not path.exists():
+        return
+
+    with open(path, "rb") as f:
+        while True:
+            if limit is not None and f.tell() >= limit:
+                return
+            head = f.read(HEADER.size)
+            if not head:
+                return
+            if len(head) < HEADER.size:
+                stats["corrupt_tail"] += 1
+                return
+
+            crc, size = HEADER.unpack(head)
+            body = f.read(size)
+            if len(body) < size or zlib.crc32(body) != crc:
+                stats["corrupt_tail"] += 1
+                return
+
+            seq, code, ts = BODY.unpack_from(body)
+            if seq <= after_seq:
+                continue
+
+            raw = body[BODY.size:]
+            device = 0
+            if code & DEVICE_FLAG:
+                device = DEVICE.unpack_from(raw)[0]
+                raw = raw[DEVICE.size:]
+
+            table = TABLE_NAMES[code & ~DEVICE_FLAG]
+            if table in TEXT_TABLES:
+                value = raw.decode("utf-8")
+            else:
+                value = INT_VALUE.unpack(raw)[0]
+
+            yield seq, table, (ts, value, device)
+
+def scan(path):
+    """(último seq, bytes válidos) do journal; ignora a cauda corrompida."""
+    last, valid = 0, 0
+    path = Path(path)
+    if not path.exists():
+        return last, valid
+
+    with open(path, "rb") as f:
+        while True:
+            head = f.read(HEADER.size)
+            if len(head) < HEADER.size:
+                break
+            crc, size = HEADER.unpack(head)
+            body = f.read(size)
+            if len(body) < size or zlib.crc32(body) != crc:
+                break
+            last = BODY.unpack_from(body)[0]
+            valid = f.tell()
+    return last, valid
+
+# ==================================================
+# API
+# ==================================================
+
+def spool_path(db_path):
+    return Path(db_path).parent / SPOOL_DIR / SPOOL_FILE
+
+def open_spool(path, committed_seq=0):
+    global _file, _path, _last_seq, _dirty
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    last, valid = scan(path)
+    if path.exists() and path.stat().st_size > valid:
+        # Cauda de um crash no meio de uma escrita: corta para anexar depois dela
+        stats["corrupt_tail"] += 1
+        with open(path, "r+b") as f:
+            f.truncate(valid)
+
+    with _lock:
+        _path = path
+        _last_seq = max(committed_seq, last)
+        _file = open(path, "ab")
+        _dirty = False
+
+def is_open():
+    return _file is not None
+
+def append(table, row, then=None):
+    """
+    Grava o registro no journal e devolve o seq.
+    `then(seq)` roda ainda sob o lock (mantém a ordem de seq ao enfileirar).
+    """
+    global _last_seq, _dirty
+
+    ts, value, device = row
+    with _lock:
+        _last_seq += 1
+        seq = _last_seq
+        _file.write(encode_record(seq, table, ts, value, device))
+        _file.flush()
+        _dirty = True
+        stats["appended"] += 1
+        if then is not None:
+            then(seq)
+    return seq
+
+def sync():
+    """fsync se houve escrita desde o último (chamado pelo writer)."""
+    global _dirty
+
+    with _lock:
+        if _file is None or not _dirty:
+            return
+        os.fsync(_file.fileno())
+        _dirty = False
+        stats["syncs"] += 1
+
+def truncate_if_drained(committed_seq):
+    """Esvazia o journal quando tudo nele já está no SQLite."""
+    global _dirty
+
+    with _lock:
+        if _file is None or committed_seq < _last_seq:
+            return False
+        if _file.tell() == 0:
+            return True
+        _file.truncate(0)
+        _file.seek(0)
+        _dirty = False
+        stats["truncations"] += 1
+        return True
+
+def pending(after_seq):
+    """Registros do journal ainda não gravados (seq > after_seq)."""
+    with _lock:
+        if _file is None:
+            return iter(())
+        _file.flush()
+        path, limit = _path, _file.tell()
+    # Só até o tamanho atual: registros anexados depois chegam pela fila
+    return read_records(path, after_seq, limit)
+
+def close():
+    global _file
+
+    with _lock:
+        if _file is None:
+            return
+        _file.flush()
+        os.fsync(_file.fileno())
+        _file.close()
+        _file = None
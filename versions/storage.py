@@ -0,0 +1,483 @@
+"""
+storage.py
+
+Camada de gravação no SQLite (write-behind).
+
+Motivo:
+- Cada save_bpm abria uma conexão, fazia 1 INSERT e 1 commit
+- No cartão SD da Raspberry Pi cada commit custa um fsync
+- Isso rodava dentro do callback BLE e travava o loop asyncio
+
+Agora:
+- save_bpm / save_event / save_battery apenas enfileiram a leitura
+- Fila limitada (WRITE_QUEUE_SIZE)
+- Uma thread dedicada grava em transações agrupadas
+- Flush por tamanho (FLUSH_MAX_ROWS) ou por tempo (FLUSH_INTERVAL)
+- Flush final no encerramento (stop_writer)
+- Contadores de profundidade da fila e latência de flush (get_stats)
+
+Conexões:
+- health.db em modo WAL (leitores não bloqueiam o writer BLE)
+- PRAGMAs ajustados para o cartão SD (synchronous, cache, mmap)
+- Uma conexão persistente por processo para leitura (get_connection)
+- A thread do writer mantém a sua própria conexão e faz o checkpoint
+
+Schema:
+- Versionado em migrations.py (aplicado por init_db)
+- Timestamps em epoch (INTEGER, coluna `ts`) com índices por intervalo
+- Agregados minuto/hora/dia atualizados no mesmo lote (rollups.py)
+- Leituras brutas com device_id (migração 5): 0 é a pulseira principal,
+  as demais vêm do supervisor de várias pulseiras (v9_multi_band.py)
+  e são cadastradas em `devices` (register_device)
+
+Durabilidade:
+- Cada leitura vai antes para o journal em disco (spool.py)
+- Se a fila lota ou o SQLite falha, o journal é reaplicado em lote
+  no startup e quando o banco volta
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, time as dtime, timedelta
+from pathlib import Path
+
+import migrations
+import rollups
+import spool
+
+# ==================================================
+# CONFIGURAÇÃO
+# ==================================================
+
+DB_PATH = Path("health.db")
+
+WRITE_QUEUE_SIZE = 5000       # leituras pendentes no máximo
+FLUSH_MAX_ROWS = 200          # grava quando o lote atinge este tamanho
+FLUSH_INTERVAL = 5.0          # ... ou quando o lote mais antigo tem esta idade (s)
+PUT_TIMEOUT = 0.05            # espera máxima do callback se a fila estiver cheia
+MAX_PENDING_ROWS = FLUSH_MAX_ROWS * 10   # lote retido após falha de gravação
+
+BUSY_TIMEOUT_MS = 5000
+CHECKPOINT_INTERVAL = 300     # checkpoint PASSIVE do WAL a cada N segundos
+REPLAY_RETRY = 10.0           # nova tentativa de reaplicar o journal (s)
+REPLAY_CHUNK = FLUSH_MAX_ROWS * 5
+
+# WAL + synchronous=NORMAL: um fsync por checkpoint, não por commit.
+# Uma queda de energia pode perder só as últimas transações, nunca corromper.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-8000",          # ~8 MB de cache de páginas
+    "PRAGMA mmap_size=67108864",        # 64 MB mapeados em memória
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA wal_autocheckpoint=1000",   # páginas; rede de segurança
+    "PRAGMA journal_size_limit=16777216",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+)
+
+INSERT_SQL = {
+    "heart_rate": "INSERT INTO heart_rate (ts, bpm, device_id) VALUES (?, ?, ?)",
+    "wearable_events": "INSERT INTO wearable_events (ts, event, device_id) VALUES (?, ?, ?)",
+    "battery_level": "INSERT INTO battery_level (ts, level, device_id) VALUES (?, ?, ?)",
+    "hrv_summary": """
+        INSERT OR REPLACE INTO hrv_summary (ts, window_s, count, mean_rr, rmssd, sdnn, pnn50)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """,
+    "activity_1m": """
+        INSERT INTO activity_1m (bucket, device_id, steps, distance_m, calories, total_steps)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(device_id, bucket) DO UPDATE SET
+            steps = steps + excluded.steps,
+            distance_m = distance_m + excluded.distance_m,
+            calories = calories + excluded.calories,
+            total_steps = MAX(total_steps, excluded.total_steps)
+    """,
+}
+
+# ==================================================
+# ESTADO DO WRITER
+# ==================================================
+
+_connection = None
+_connection_lock = threading.Lock()
+
+_queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+_writer_thread = None
+_STOP = object()
+
+# Último seq do journal já gravado no SQLite (só a thread do writer altera)
+_committed_seq = 0
+_replay_needed = threading.Event()
+
+stats = {
+    "queued": 0,
+    "written": 0,
+    "dropped": 0,
+    "flushes": 0,
+    "flush_errors": 0,
+    "last_flush_ms": 0.0,
+    "max_flush_ms": 0.0,
+    "total_flush_ms": 0.0,
+    "max_queue_depth": 0,
+    "checkpoints": 0,
+    "spooled_only": 0,
+    "replayed": 0,
+}
+
+# ==================================================
+# CONEXÕES
+# ==================================================
+
+def connect(db_path=DB_PATH):
+    conn = sqlite3.connect(
+        db_path,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def get_connection(db_path=DB_PATH):
+    """Conexão persistente do processo (reutilizada por relatórios e consultas)."""
+    global _connection
+
+    with _connection_lock:
+        if _connection is None:
+            _connection = connect(db_path)
+        return _connection
+
+def close_connection():
+    global _connection
+
+    with _connection_lock:
+        if _connection is not None:
+            _connection.close()
+            _connection = None
+
+def checkpoint(conn, mode="PASSIVE"):
+    try:
+        conn.execute(f"PRAGMA wal_checkpoint({mode})")
+        stats["checkpoints"] += 1
+    except sqlite3.Error as e:
+        print(f"⚠️ Checkpoint WAL falhou: {e}")
+
+# ==================================================
+# SCHEMA
+# ==================================================
+
+def init_db(db_path=DB_PATH):
+    conn = connect(db_path)
+    migrations.migrate(conn)
+    conn.close()
+
+def register_device(mac, name=None, db_path=DB_PATH):
+    """device_id da pulseira (cadastra na primeira vez; atualiza o nome)."""
+    mac = mac.upper()
+    conn = connect(db_path)
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO devices (mac, name) VALUES (?, ?) "
+                "ON CONFLICT(mac) DO UPDATE SET name = COALESCE(excluded.name, name)",
+                (mac, name)
+            )
+        return conn.execute("SELECT id FROM devices WHERE mac = ?", (mac,)).fetchone()[0]
+    finally:
+        conn.close()
+
+# ==================================================
+# TIMESTAMPS
+# ==================================================
+
+def to_epoch(ts):
+    """Aceita datetime, texto "YYYY-mm-dd HH:MM:SS" (hora local) ou número."""
+    if isinstance(ts, datetime):
+        return int(ts.timestamp())
+    if isinstance(ts, str):
+        return int(datetime.fromisoformat(ts).timestamp())
+    return int(ts)
+
+def day_bounds(day):
+    """Intervalo [início, fim) do dia local, em epoch."""
+    start = datetime.combine(day, dtime.min)
+    return int(start.timestamp()), int((start + timedelta(days=1)).timestamp())
+
+# ==================================================
+# API DE ESCRITA (chamada nos callbacks BLE)
+# ==================================================
+
+def _put_spooled(seq, table, row):
+    # Roda sob o lock do journal: a ordem da fila segue a ordem de seq
+    try:
+        _queue.put_nowait((seq, table, row))
+    except queue.Full:
+        # Já está no journal: o writer reaplica antes do próximo flush
+        _replay_needed.set()
+        stats["spooled_only"] += 1
+
+def enqueue(table, row, durable=True):
+    """
+    durable=False pula o journal (só fila em memória): para dados
+    derivados, que o journal não sabe codificar e podem ser recalculados.
+    """
+    if durable and spool.is_open():
+        try:
+            spool.append(table, row, then=lambda seq: _put_spooled(seq, table, row))
+            stats["queued"] += 1
+            return True
+        except OSError as e:
+            print(f"⚠️ Journal indisponível ({e}), enfileirando só em memória")
+
+    try:
+        _queue.put((None, table, row), timeout=PUT_TIMEOUT)
+    except queue.Full:
+        stats["dropped"] += 1
+        print(f"⚠️ Fila de gravação cheia, leitura descartada ({table})")
+        return False
+
+    stats["queued"] += 1
+    depth = _queue.qsize()
+    if depth > stats["max_queue_depth"]:
+        stats["max_queue_depth"] = depth
+    return True
+
+def save_bpm(ts, bpm, device=0):
+    return enqueue("heart_rate", (to_epoch(ts), bpm, device))
+
+def save_event(ts, event, device=0):
+    return enqueue("wearable_events", (to_epoch(ts), event, device))
+
+def save_battery(ts, level, device=0):
+    return enqueue("battery_level", (to_epoch(ts), level, device))
+
+def save_hrv(row):
+    """row: (ts, window_s, count, mean_rr, rmssd, sdnn, pnn50) — ver hrv.py"""
+    return enqueue("hrv_summary", row, durable=False)
+
+def save_activity(row):
+    """row: (bucket, device_id, steps, distance_m, calories, total_steps) — ver activity.py"""
+    return enqueue("activity_1m", row, durable=False)
+
+# ==================================================
+# FLUSH
+# ==================================================
+
+def _flush(conn, batch):
+    global _committed_seq
+
+    started = time.perf_counter()
+
+    grouped = {}
+    written = 0
+    max_seq = _committed_seq
+    for seq, table, row in batch:
+        if seq is not None:
+            if seq <= _committed_seq:
+                continue    # já gravado por um replay do journal
+            if seq > max_seq:
+                max_seq = seq
+        grouped.setdefault(table, []).append(row)
+        written += 1
+
+    with conn:
+        for table, rows in grouped.items():
+            conn.executemany(INSERT_SQL[table], rows)
+            if table == "heart_rate":
+                # Agregados (e shards/arquivo) cobrem a pulseira principal
+                rollups.apply(conn, [(ts, bpm) for ts, bpm, device in rows if device == 0])
+        if max_seq > _committed_seq:
+            conn.execute(
+                "UPDATE spool_state SET committed_seq = ? WHERE id = 1",
+                (max_seq,)
+            )
+
+    _committed_seq = max_seq
+    spool.truncate_if_drained(_committed_seq)
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    stats["flushes"] += 1
+    stats["written"] += written
+    stats["last_flush_ms"] = elapsed_ms
+    stats["total_flush_ms"] += elapsed_ms
+    if elapsed_ms > stats["max_flush_ms"]:
+        stats["max_flush_ms"] = elapsed_ms
+
+def _try_flush(conn, batch):
+    try:
+        _flush(conn, batch)
+        return True
+    except sqlite3.Error as e:
+        stats["flush_errors"] += 1
+        print(f"⚠️ Erro ao gravar lote ({len(batch)} linhas): {e}")
+        return False
+
+# ==================================================
+# REPLAY DO JOURNAL
+# ==================================================
+
+def read_committed_seq(conn):
+    row = conn.execute("SELECT committed_seq FROM spool_state WHERE id = 1").fetchone()
+    return row[0] if row else 0
+
+def _replay(conn):
+    """Grava em lote tudo do journal com seq > _committed_seq."""
+    chunk = []
+    replayed = 0
+    for item in spool.pending(_committed_seq):
+        chunk.append(item)
+        if len(chunk) >= REPLAY_CHUNK:
+            if not _try_flush(conn, chunk):
+                return False
+            replayed += len(chunk)
+            chunk = []
+    if chunk:
+        if not _try_flush(conn, chunk):
+            return False
+        replayed += len(chunk)
+
+    if replayed:
+        stats["replayed"] += replayed
+        print(f"💾 Journal reaplicado: {replayed} leituras")
+    return True
+
+# ==================================================
+# THREAD DO WRITER
+# ==================================================
+
+def _writer_loop(db_path, committed_seq):
+    global _committed_seq
+
+    conn = connect(db_path)
+    _committed_seq = committed_seq
+    batch = []
+    deadline = None
+    stopping = False
+    next_checkpoint = time.monotonic() + CHECKPOINT_INTERVAL
+    next_sync = time.monotonic() + spool.SYNC_INTERVAL
+    next_replay = 0.0
+
+    while True:
+        now = time.monotonic()
+
+        # Lote retido após falha: não puxa mais da fila (backpressure)
+        if len(batch) >= MAX_PENDING_ROWS:
+            time.sleep(max(0.0, deadline - now))
+            item = None
+        else:
+            timeout = FLUSH_INTERVAL if not batch else max(0.0, deadline - now)
+            try:
+                item = _queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+        if item is _STOP:
+            stopping = True
+        elif item is not None:
+            if not batch:
+                deadline = time.monotonic() + FLUSH_INTERVAL
+            batch.append(item)
+
+        if stopping:
+            # Drena o que sobrou na fila antes de sair
+            while True:
+                try:
+                    item = _queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _STOP:
+                    batch.append(item)
+            # O journal cobre tudo que tem seq; se ele falhar, o resto
+            # fica para o replay do próximo startup
+            if _replay(conn):
+                _try_flush(conn, batch)
+            else:
+                _try_flush(conn, [i for i in batch if i[0] is None])
+            break
+
+        # Há leituras só no journal: reaplica antes de gravar seqs maiores
+        blocked = False
+        if _replay_needed.is_set():
+            if time.monotonic() >= next_replay:
+                _replay_needed.clear()
+                if not _replay(conn):
+                    _replay_needed.set()
+                    next_replay = time.monotonic() + REPLAY_RETRY
+            blocked = _replay_needed.is_set()
+            if blocked and batch:
+                deadline = next_replay
+
+        if not blocked and batch and (len(batch) >= FLUSH_MAX_ROWS or time.monotonic() >= deadline):
+            if _try_flush(conn, batch):
+                batch = []
+            else:
+                deadline = time.monotonic() + FLUSH_INTERVAL
+                _replay_needed.set()
+                next_replay = deadline
+
+        if time.monotonic() >= next_sync:
+            spool.sync()
+            next_sync = time.monotonic() + spool.SYNC_INTERVAL
+
+        if time.monotonic() >= next_checkpoint:
+            checkpoint(conn)
+            next_checkpoint = time.monotonic() + CHECKPOINT_INTERVAL
+
+    checkpoint(conn, "TRUNCATE")
+    conn.close()
+
+def start_writer(db_path=DB_PATH, use_spool=True):
+    global _writer_thread
+
+    if _writer_thread and _writer_thread.is_alive():
+        return
+
+    conn = connect(db_path)
+    committed_seq = read_committed_seq(conn)
+    conn.close()
+
+    if use_spool:
+        spool.open_spool(spool.spool_path(db_path), committed_seq)
+        _replay_needed.set()    # reaplica o que sobrou da execução anterior
+
+    _writer_thread = threading.Thread(
+        target=_writer_loop,
+        args=(db_path, committed_seq),
+        name="sqlite-writer",
+        daemon=True
+    )
+    _writer_thread.start()
+
+def stop_writer(timeout=10):
+    global _writer_thread
+
+    if not _writer_thread:
+        return
+
+    _queue.put(_STOP)
+    _writer_thread.join(timeout)
+    _writer_thread = None
+
+    spool.truncate_if_drained(_committed_seq)
+    spool.close()
+
+    s = get_stats()
+    print(
+        f"💾 Writer encerrado: {s['written']} linhas em {s['flushes']} lotes, "
+        f"flush médio {s['avg_flush_ms']:.1f} ms, máx {s['max_flush_ms']:.1f} ms, "
+        f"descartadas {s['dropped']}, reaplicadas do journal {s['replayed']}"
+    )
+
+# ==================================================
+# MÉTRICAS
+# ==================================================
+
+def get_stats():
+    s = dict(stats)
+    s["queue_depth"] = _queue.qsize()
+    s["avg_flush_ms"] = (
+        stats["total_flush_ms"] / stats["flushes"] if stats["flushes"] else 0.0
+    )
+    return s
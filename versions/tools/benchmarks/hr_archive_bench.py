@@ -0,0 +1,123 @@
+"""
+hr_archive_bench.py
+
+Compara tamanho e velocidade de varredura:
+- tabela heart_rate (SQLite, schema atual)
+- arquivo frio HRA1 (hr_archive.py)
+
+Gera N dias sintéticos (~1 amostra/s, BPM variando devagar, com
+buracos de conexão) num diretório temporário. Não toca no health.db.
+
+Uso:
+    python versions/tools/benchmarks/hr_archive_bench.py --days 3
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import hr_archive
+import storage
+
+# ==================================================
+# DADOS SINTÉTICOS
+# ==================================================
+
+def synthetic_rows(days, seed=42):
+    rnd = random.Random(seed)
+    ts = int(datetime(2026, 1, 1).timestamp())
+    end = ts + days * 86400
+    bpm = 72
+
+    while ts < end:
+        # buraco ocasional (pulseira fora de alcance)
+        if rnd.random() < 0.0005:
+            ts += rnd.randint(60, 1800)
+            continue
+        if rnd.random() < 0.3:
+            bpm = max(40, min(160, bpm + rnd.choice((-1, 1))))
+        yield ts, bpm
+        ts += 1 if rnd.random() < 0.95 else 2
+
+# ==================================================
+# BENCH
+# ==================================================
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = list(synthetic_rows(args.days))
+    start, end = rows[0][0], rows[-1][0] + 1
+    tmp = Path(tempfile.mkdtemp(prefix="hr_bench_"))
+
+    # SQLite
+    db = tmp / "bench.db"
+    conn = storage.connect(db)
+    conn.execute("""
+        CREATE TABLE heart_rate (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts INTEGER NOT NULL,
+            bpm INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX idx_heart_rate_ts ON heart_rate (ts, bpm)")
+    with conn:
+        conn.executemany("INSERT INTO heart_rate (ts, bpm) VALUES (?, ?)", rows)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("VACUUM")
+    db_size = db.stat().st_size
+
+    def scan_sqlite():
+        total = 0
+        cur = conn.execute(
+            "SELECT ts, bpm FROM heart_rate WHERE ts >= ? AND ts < ? ORDER BY ts",
+            (start, end)
+        )
+        while True:
+            chunk = cur.fetchmany(1000)
+            if not chunk:
+                return total
+            total += len(chunk)
+
+    # HRA1
+    archive = tmp / "bench.hra"
+    _, t_write = timed(lambda: hr_archive.append_rows(archive, rows))
+    archive_size = archive.stat().st_size
+
+    def scan_archive():
+        return sum(1 for _ in hr_archive.read_range(archive, start, end))
+
+    n_sqlite, t_sqlite = timed(scan_sqlite)
+    n_archive, t_archive = timed(scan_archive)
+    assert n_sqlite == n_archive == len(rows)
+
+    # Um dia no meio do arquivo (pula blocos pelo cabeçalho)
+    mid = start + (args.days // 2) * 86400
+    n_day, t_day = timed(lambda: sum(1 for _ in hr_archive.read_range(archive, mid, mid + 86400)))
+
+    print(f"Amostras: {len(rows)} ({args.days} dias)")
+    print(f"SQLite heart_rate : {db_size:>10} bytes  ({db_size / len(rows):.1f} B/amostra)")
+    print(f"Arquivo HRA1      : {archive_size:>10} bytes  ({archive_size / len(rows):.2f} B/amostra)")
+    print(f"Compressão        : {db_size / archive_size:.1f}x")
+    print(f"Escrita HRA1      : {len(rows) / t_write:,.0f} amostras/s")
+    print(f"Varredura SQLite  : {n_sqlite / t_sqlite:,.0f} amostras/s")
+    print(f"Varredura HRA1    : {n_archive / t_archive:,.0f} amostras/s")
+    print(f"1 dia no HRA1     : {n_day} amostras em {t_day * 1000:.1f} ms")
+
+    conn.close()
+
+if __name__ == "__main__":
+    main()
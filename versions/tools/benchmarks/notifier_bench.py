@@ -0,0 +1,103 @@
+"""
+notifier_bench.py
+
+Compara o envio de alertas contra o servidor ntfy local (tools/ntfy_stub.py):
+- antigo   → requests.post por alerta, no chamador (conexão nova a cada vez)
+- notifier → notifier.Notifier (fila + thread + Session keep-alive + retry)
+
+Mede por estratégia:
+- tempo que o chamador fica bloqueado por alerta (o callback BLE / pipeline)
+- latência de entrega (chamada → resposta 2xx)
+- alertas perdidos e conexões TCP abertas no servidor
+
+Numa rajada (--interval 0) a latência de entrega inclui a espera na fila.
+
+Falhas simuladas com --fail (fração de 503) e --delay (atraso do servidor).
+
+Uso:
+    python versions/tools/benchmarks/notifier_bench.py --alerts 200 --fail 0.2
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import requests
+
+import notifier
+from ntfy_stub import NtfyStub
+from reconnect import percentile
+
+TOPIC = "bench"
+
+# ==================================================
+# ESTRATÉGIAS
+# ==================================================
+
+def old_strategy(url, alerts, interval):
+    blocked = []
+    lost = 0
+    for i in range(alerts):
+        started = time.perf_counter()
+        try:
+            response = requests.post(f"{url}/{TOPIC}", data=f"alerta {i}".encode(), timeout=5)
+            if response.status_code >= 300:
+                lost += 1
+        except Exception:
+            lost += 1
+        blocked.append(time.perf_counter() - started)
+        time.sleep(interval)
+    # Entrega = o próprio bloqueio
+    return blocked, blocked, lost
+
+def notifier_strategy(url, alerts, interval):
+    n = notifier.Notifier(url, TOPIC, maxsize=alerts, backoff_base=0.01, backoff_max=0.2)
+    n.start()
+    blocked = []
+    for i in range(alerts):
+        started = time.perf_counter()
+        n.send(f"alerta {i}")
+        blocked.append(time.perf_counter() - started)
+        time.sleep(interval)
+
+    deadline = time.monotonic() + 30
+    while n.stats["sent"] + n.stats["failed"] < alerts and time.monotonic() < deadline:
+        time.sleep(0.01)
+    n.stop()
+    return blocked, list(n.latencies), alerts - n.stats["sent"]
+
+# ==================================================
+# MAIN
+# ==================================================
+
+def ms(values, p):
+    return percentile(values, p) * 1000 if values else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do envio ntfy")
+    parser.add_argument("--alerts", type=int, default=200)
+    parser.add_argument("--fail", type=float, default=0.2)
+    parser.add_argument("--delay", type=float, default=0.005)
+    parser.add_argument("--interval", type=float, default=0.05, help="s entre alertas (0 = rajada)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.alerts} alertas, {args.fail:.0%} de 503, atraso do servidor {args.delay * 1000:.0f} ms\n")
+    print(f"{'estratégia':<10} {'bloqueio p50':>13} {'p99':>9} {'entrega p50':>12} {'p90':>9} {'perdidos':>9} {'conexões':>9}")
+
+    for name, strategy in (("antigo", old_strategy), ("notifier", notifier_strategy)):
+        stub = NtfyStub(port=0, fail_rate=args.fail, delay=args.delay, seed=args.seed).start()
+        blocked, delivered, lost = strategy(stub.url, args.alerts, args.interval)
+        stub.stop()
+        print(
+            f"{name:<10} {ms(blocked, 50):>10.2f} ms {ms(blocked, 99):>6.2f} ms "
+            f"{ms(delivered, 50):>9.1f} ms {ms(delivered, 90):>6.1f} ms "
+            f"{lost:>9} {stub.stats['connections']:>9}"
+        )
+
+if __name__ == "__main__":
+    main()
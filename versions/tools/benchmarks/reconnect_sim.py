@@ -0,0 +1,99 @@
+"""
+reconnect_sim.py
+
+Simula a latência de reconexão:
+- fixo    → BleakClient(MAC) às cegas a cada RECONNECT_DELAY (comportamento antigo)
+- anúncio → reconnect.Reconnector (escuta anúncios + backoff com jitter)
+
+Modelo:
+- A pulseira some por `ausência` segundos (0 = queda de link com a
+  pulseira ainda perto) e depois volta a anunciar a cada ~ADV_INTERVAL
+- Conectar com a pulseira presente leva CONNECT_OK segundos
+- Tentativa com a pulseira ausente só falha no timeout (adaptador ocupado)
+
+Não usa BLE de verdade (roda em qualquer máquina).
+
+Uso:
+    python versions/tools/benchmarks/reconnect_sim.py --trials 500
+"""
+
+import argparse
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from reconnect import (
+    BACKOFF_BASE, BACKOFF_MAX, BLIND_EVERY, CONNECT_TIMEOUT, backoff_delay, percentile
+)
+
+# ==================================================
+# MODELO
+# ==================================================
+
+RECONNECT_DELAY = 10.0        # intervalo fixo antigo
+OLD_CONNECT_TIMEOUT = 10.0    # timeout padrão do BleakClient
+ADV_INTERVAL = 1.0            # s entre anúncios da pulseira
+CONNECT_OK = 2.0              # s para conectar com a pulseira presente
+
+AWAY = (0, 30, 120, 600, 3600)
+
+def fixed_strategy(away, rnd):
+    """(latência, segundos com o adaptador ocupado em tentativas falhas)."""
+    t = RECONNECT_DELAY
+    busy = 0.0
+    while t < away:
+        t += OLD_CONNECT_TIMEOUT + RECONNECT_DELAY
+        busy += OLD_CONNECT_TIMEOUT
+    return t + CONNECT_OK, busy
+
+def advert_strategy(away, rnd):
+    t = 0.0
+    busy = 0.0
+    failures = 0
+    while True:
+        window = backoff_delay(failures, BACKOFF_BASE, BACKOFF_MAX, rnd)
+        # primeiro anúncio depois que a pulseira volta
+        seen = max(t, away) + rnd.uniform(0, ADV_INTERVAL)
+        if seen <= t + window:
+            return seen + CONNECT_OK, busy
+
+        t += window
+        failures += 1
+        if failures % BLIND_EVERY == 0:
+            if t >= away:
+                return t + CONNECT_OK, busy      # tentativa às cegas deu certo
+            t += CONNECT_TIMEOUT
+            busy += CONNECT_TIMEOUT
+
+# ==================================================
+# MAIN
+# ==================================================
+
+def describe(samples):
+    values = [lat for lat, _ in samples]
+    busy = sum(b for _, b in samples) / len(samples)
+    return (
+        f"p50 {percentile(values, 50):7.1f}s  p90 {percentile(values, 90):7.1f}s  "
+        f"máx {max(values):7.1f}s  ocupado {busy:6.0f}s"
+    )
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trials", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+
+    print(f"{'ausência':>9}  estratégia  latência de reconexão")
+    for away in AWAY:
+        fixed = [fixed_strategy(away, rnd) for _ in range(args.trials)]
+        advert = [advert_strategy(away, rnd) for _ in range(args.trials)]
+
+        print(f"{away:>8}s  fixo        {describe(fixed)}")
+        print(f"{'':>9}  anúncio     {describe(advert)}")
+
+if __name__ == "__main__":
+    main()
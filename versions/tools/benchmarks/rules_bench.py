@@ -0,0 +1,158 @@
+"""
+rules_bench.py
+
+Compara a avaliação das regras de alerta por amostra:
+- ingênuo   → cada regra relê a janela de amostras recentes a cada BPM
+  (o jeito direto de escrever sustentada / variação)
+- compilado → rules.Evaluator (estado incremental, O(1) por regra)
+
+Gera N horas sintéticas (~1 amostra/s, BPM variando devagar, com picos,
+quedas e buracos de conexão) e mede amostras/s com 1, 10 e 50 regras
+(misturando os tipos). Confere que os dois disparam as mesmas regras.
+
+Uso:
+    python versions/tools/benchmarks/rules_bench.py --hours 2
+"""
+
+import argparse
+import random
+import sys
+import time
+from collections import deque
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import rules
+
+# ==================================================
+# DADOS / REGRAS SINTÉTICOS
+# ==================================================
+
+def synthetic_samples(hours, seed=42):
+    rnd = random.Random(seed)
+    ts = 1_767_225_600.0
+    end = ts + hours * 3600
+    bpm = 72
+    samples = []
+
+    while ts < end:
+        if rnd.random() < 0.0005:
+            ts += rnd.randint(60, 900)          # fora de alcance
+        if rnd.random() < 0.002:
+            bpm += rnd.choice((-35, 35))        # queda / pico
+        bpm += rnd.randint(-2, 2)
+        bpm = max(35, min(170, bpm + (72 - bpm) // 30))
+        samples.append((ts, bpm))
+        ts += 1
+    return samples
+
+def synthetic_rules(n, seed=7):
+    rnd = random.Random(seed)
+    specs = []
+    for i in range(n):
+        kind = ("threshold", "sustained", "rate", "absence")[i % 4]
+        spec = {"name": f"r{i}", "kind": kind, "message": "{name} {bpm}"}
+        if kind == "threshold":
+            spec.update(below=rnd.randint(40, 55), above=rnd.randint(100, 130))
+        elif kind == "sustained":
+            spec.update(above=rnd.randint(85, 110), samples=rnd.randint(5, 30), max_gap=30)
+            spec["for"] = rnd.randint(60, 600)
+        elif kind == "rate":
+            spec.update(delta=rnd.randint(15, 35), within=rnd.randint(30, 300),
+                        direction=rnd.choice(("up", "down", "any")))
+        else:
+            spec.update(after=rnd.randint(120, 600))
+        specs.append(spec)
+    return rules.compile_rules(specs, "bench")
+
+# ==================================================
+# AVALIADOR INGÊNUO (relê a janela)
+# ==================================================
+
+class NaiveEvaluator:
+    def __init__(self, compiled):
+        self.rules = compiled
+        self.window = max(
+            [r.spec.get("within", 0) for r in compiled] + [r.spec.get("for", 0) + 60 for r in compiled]
+        ) or 1
+        self.history = deque()
+
+    def _outside(self, spec, bpm):
+        below, above = spec.get("below"), spec.get("above")
+        return (below is not None and bpm <= below) or (above is not None and bpm >= above)
+
+    def sample(self, ts, bpm):
+        history = self.history
+        while history and history[0][0] < ts - self.window:
+            history.popleft()
+
+        fired = []
+        for rule in self.rules:
+            spec = rule.spec
+            if rule.kind == "threshold":
+                if self._outside(spec, bpm):
+                    fired.append(rule.name)
+
+            elif rule.kind == "sustained":
+                if not self._outside(spec, bpm):
+                    continue
+                since, count, later = ts, 1, ts
+                for t, b in reversed(history):
+                    if not self._outside(spec, b) or later - t > spec.get("max_gap", rules.DEFAULT_MAX_GAP):
+                        break
+                    since, count, later = t, count + 1, t
+                if count >= spec.get("samples", 1) and ts - since >= spec.get("for", 0):
+                    fired.append(rule.name)
+
+            elif rule.kind == "rate":
+                values = [b for t, b in history if t >= ts - spec["within"]]
+                if not values:
+                    continue
+                direction = spec.get("direction", "any")
+                if direction in ("up", "any") and bpm - min(values) >= spec["delta"]:
+                    fired.append(rule.name)
+                elif direction in ("down", "any") and max(values) - bpm >= spec["delta"]:
+                    fired.append(rule.name)
+
+        history.append((ts, bpm))
+        return fired
+
+# ==================================================
+# MAIN
+# ==================================================
+
+def run(evaluate, samples):
+    fired = 0
+    started = time.perf_counter()
+    for ts, bpm in samples:
+        fired += len(evaluate(ts, bpm))
+    return time.perf_counter() - started, fired
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das regras de alerta")
+    parser.add_argument("--hours", type=float, default=2)
+    parser.add_argument("--rules", default="1,10,50", help="quantidades de regras")
+    args = parser.parse_args()
+
+    samples = synthetic_samples(args.hours)
+    print(f"{len(samples)} amostras ({args.hours:g} h a ~1 Hz)\n")
+    print(f"{'regras':>6} {'ingênuo':>14} {'compilado':>14} {'ganho':>7} {'disparos':>9}")
+
+    for n in (int(x) for x in args.rules.split(",")):
+        compiled = synthetic_rules(n)
+
+        naive = NaiveEvaluator(compiled)
+        naive_s, naive_fired = run(naive.sample, samples)
+
+        evaluator = rules.Evaluator(compiled)
+        fast_s, fast_fired = run(lambda ts, bpm: evaluator.sample(ts, bpm), samples)
+
+        check = "" if naive_fired == fast_fired else f"  ⚠️ diferença: {naive_fired} x {fast_fired}"
+        print(
+            f"{n:>6} {len(samples) / naive_s:>10.0f} a/s {len(samples) / fast_s:>10.0f} a/s "
+            f"{naive_s / fast_s:>6.1f}x {fast_fired:>9}{check}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -8,11 +8,17 @@ Descobre e testa tudo que for possível via BLE
 """
 
 import asyncio
+import sys
 from datetime import datetime
+from pathlib import Path
 
 from bleak import BleakClient
 from Crypto.Cipher import AES
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import hr_decoder
+
 # ==================================================
 # CONFIG
 # ==================================================
@@ -57,6 +63,10 @@ def generic_notify(uuid):
         log(f"🔔 Notify {uuid}: {data.hex()}")
     return handler
 
+def hr_notify(_, data):
+    log(f"🔔 Notify HR: {data.hex()}")
+    log(f"   ↳ {hr_decoder.describe(data)}")
+
 # ==================================================
 # TEST SUITE
 # ==================================================
@@ -129,7 +139,7 @@ async def run_tests():
         # -------------------------------
         log("❤️ Testando batimento cardíaco...")
         try:
-            await client.start_notify(UUID_HR_MEAS, generic_notify("HR"))
+            await client.start_notify(UUID_HR_MEAS, hr_notify)
             await client.write_gatt_char(UUID_HR_CTRL, b"\x15\x01\x01", response=True)
             log("❤️ HR iniciado")
         except Exception as e:
@@ -0,0 +1,163 @@
+"""
+ntfy_stub.py
+
+Servidor ntfy local (só o POST /<tópico>) para testar o envio de alertas
+sem depender do ntfy.sh nem da internet.
+
+- HTTP/1.1 com keep-alive: dá para ver se o cliente reaproveita conexões
+- Falhas simuladas: fração de respostas 503 (--fail) e atraso (--delay)
+- Cada mensagem recebida vai para o log com tópico, título e prioridade
+- X-Idempotency-Key (outbox.py): chave repetida responde 200 sem
+  publicar de novo (conta em "duplicates")
+- Contadores: conexões abertas, requisições, mensagens aceitas
+
+Uso (em outro terminal, apontando NTFY_SERVER para http://127.0.0.1:8099):
+    python versions/tools/ntfy_stub.py --port 8099 --fail 0.3 --delay 0.05
+
+Ou embutido num teste / benchmark:
+    stub = NtfyStub(port=0, fail_rate=0.2)
+    stub.start()
+    ... Notifier(stub.url, "teste") ...
+    stub.stop()
+"""
+
+import argparse
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ==================================================
+# SERVIDOR
+# ==================================================
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"     # keep-alive
+
+    def setup(self):
+        super().setup()
+        # Cabeçalhos e corpo saem em writes separados: sem isso o Nagle
+        # segura a resposta até o ACK atrasado do cliente (~40 ms)
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.stub.count("connections")
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _reply(self, status, body=b""):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        stub = self.server.stub
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        stub.count("requests")
+
+        if stub.delay:
+            time.sleep(stub.delay)
+        if stub.rnd.random() < stub.fail_rate:
+            stub.count("failures")
+            self._reply(503, b'{"error":"stub: falha simulada"}')
+            return
+
+        topic = self.path.strip("/")
+        if not stub.first_delivery(self.headers.get("X-Idempotency-Key")):
+            self._reply(200, b'{"event":"message"}')
+            return
+        stub.received(topic, self.headers, body)
+        self._reply(200, b'{"event":"message"}')
+
+class NtfyStub:
+    def __init__(self, host="127.0.0.1", port=8099, fail_rate=0.0, delay=0.0, seed=None, verbose=False):
+        self.fail_rate = fail_rate
+        self.delay = delay
+        self.verbose = verbose
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.thread = None
+
+        self.messages = []
+        self.keys = set()
+        self.stats = {"connections": 0, "requests": 0, "failures": 0, "messages": 0, "duplicates": 0}
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def first_delivery(self, key):
+        if key is None:
+            return True
+        with self.lock:
+            if key in self.keys:
+                self.stats["duplicates"] += 1
+                return False
+            self.keys.add(key)
+            return True
+
+    def received(self, topic, headers, body):
+        message = {
+            "topic": topic,
+            "title": headers.get("Title"),
+            "priority": headers.get("Priority"),
+            "tags": headers.get("Tags"),
+            "message": body.decode("utf-8", errors="replace"),
+            "time": time.time(),
+        }
+        with self.lock:
+            self.messages.append(message)
+            self.stats["messages"] += 1
+        if self.verbose:
+            print(f"📨 [{topic}] {message['title'] or ''} ({message['priority'] or 'default'}): {message['message']}")
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="ntfy-stub", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+# ==================================================
+# MAIN
+# ==================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor ntfy local para testes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--fail", type=float, default=0.0, help="fração de respostas 503")
+    parser.add_argument("--delay", type=float, default=0.0, help="atraso por requisição (s)")
+    args = parser.parse_args()
+
+    stub = NtfyStub(args.host, args.port, args.fail, args.delay, verbose=True)
+    print(f"📡 ntfy local em {stub.url} (falhas {args.fail:.0%}, atraso {args.delay * 1000:.0f} ms)")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub.server.server_close()
+        s = stub.stats
+        print(f"\n{s['messages']} mensagens, {s['requests']} requisições, "
+              f"{s['failures']} falhas simuladas, {s['connections']} conexões")
+
+if __name__ == "__main__":
+    main()
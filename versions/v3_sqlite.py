@@ -1,11 +1,15 @@
 import asyncio
-import sqlite3
+import time
 from pathlib import Path
 from datetime import datetime
 
 from bleak import BleakClient
 from Crypto.Cipher import AES
 
+import hr_decoder
+import hrv
+from storage import init_db, save_bpm, start_writer, stop_writer
+
 # =========================
 # CONFIGURAÇÃO
 # =========================
@@ -32,28 +36,8 @@ def encrypt(key, msg):
 # BANCO DE DADOS
 # =========================
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS heart_rate (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            bpm INTEGER NOT NULL
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-def save_bpm(timestamp, bpm):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO heart_rate (timestamp, bpm) VALUES (?, ?)",
-        (timestamp, bpm)
-    )
-    conn.commit()
-    conn.close()
+# Gravação em lote (write-behind) fica em storage.py:
+# save_bpm apenas enfileira, uma thread grava em transações agrupadas.
 
 # =========================
 # BLE CALLBACKS
@@ -65,11 +49,12 @@ def auth_notification(_, data):
         challenge = data[3:]
 
 def hr_notification(_, data):
-    if len(data) >= 2:
-        bpm = data[1]
+    bpm = hr_decoder.push(data, time.time())
+    if bpm is not None:
         ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         print(f"[{ts}] ❤️ BPM: {bpm}")
         save_bpm(ts, bpm)
+        hrv.record()
 
 # =========================
 # LOOP PRINCIPAL (ROBUSTO)
@@ -77,7 +62,8 @@ def hr_notification(_, data):
 
 async def monitor_loop():
     global challenge
-    init_db()
+    init_db(DB_PATH)
+    start_writer(DB_PATH)
 
     while True:
         try:
@@ -130,4 +116,7 @@ async def monitor_loop():
 # ENTRY POINT
 # =========================
 
-asyncio.run(monitor_loop())
+try:
+    asyncio.run(monitor_loop())
+finally:
+    stop_writer()
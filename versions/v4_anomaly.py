@@ -1,11 +1,17 @@
 import asyncio
-import sqlite3
+import time
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import datetime
 
 from bleak import BleakClient
 from Crypto.Cipher import AES
 
+import alert_index
+import hr_decoder
+import hrv
+import rules
+from storage import init_db, save_bpm, start_writer, stop_writer
+
 # =========================
 # CONFIGURAÇÃO
 # =========================
@@ -19,15 +25,25 @@ UUID_HR_MEAS = "00002a37-0000-1000-8000-00805f9b34fb"
 
 DB_PATH = Path("health.db")
 
-# Limites clínicos iniciais (idoso)
-BRADY_LIMIT = 45
-TACHY_LIMIT = 120
-NO_DATA_TIMEOUT = timedelta(minutes=5)
+# Limites em alert_rules.json (rules.py); sem o arquivo valem os V4_RULES
+RULES_PATH = Path("alert_rules.json")
+
+# Os limites originais da v4: fora de 45/120 em 2 amostras seguidas
+# (BPM inteiro: < 45 → <= 44, > 120 → >= 121), sem dados por 5 minutos
+V4_RULES = [
+    {"name": "bradicardia", "kind": "sustained", "below": 44, "samples": 2, "max_gap": 300,
+     "severity": "urgent", "message": "Bradicardia detectada (BPM={bpm})"},
+    {"name": "taquicardia", "kind": "sustained", "above": 121, "samples": 2, "max_gap": 300,
+     "severity": "urgent", "message": "Taquicardia detectada (BPM={bpm})"},
+    {"name": "sem_dados", "kind": "absence", "after": 300, "severity": "high",
+     "message": "Sem dados de batimento por mais de {minutes} minutos"},
+]
 
 challenge = None
-last_bpm_time = None
-last_alert_time = None
-recent_bpms = []
+
+rule_file = rules.RuleFile(RULES_PATH, V4_RULES)
+evaluator = rules.Evaluator(rule_file.rules)
+alerts = alert_index.AlertIndex()
 
 # =========================
 # CRIPTOGRAFIA
@@ -40,28 +56,8 @@ def encrypt(key, msg):
 # BANCO DE DADOS
 # =========================
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS heart_rate (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            bpm INTEGER NOT NULL
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-def save_bpm(timestamp, bpm):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO heart_rate (timestamp, bpm) VALUES (?, ?)",
-        (timestamp, bpm)
-    )
-    conn.commit()
-    conn.close()
+# Gravação em lote (write-behind) fica em storage.py:
+# save_* apenas enfileiram, uma thread grava em transações agrupadas.
 
 # =========================
 # ALERTAS (POR ENQUANTO LOG)
@@ -71,6 +67,12 @@ def log_alert(message):
     ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"🚨 [{ts}] ALERTA: {message}")
 
+def log_alerts(fired, ts):
+    """[(regra, mensagem)] do evaluator → log, com o cooldown de cada regra."""
+    for rule, message in fired:
+        if alerts.fire(0, rule, message, ts):
+            log_alert(message)
+
 # =========================
 # BLE CALLBACKS
 # =========================
@@ -81,40 +83,32 @@ def auth_notification(_, data):
         challenge = data[3:]
 
 def hr_notification(_, data):
-    global last_bpm_time, recent_bpms
-
-    if len(data) >= 2:
-        bpm = data[1]
+    bpm = hr_decoder.push(data, time.time())
+    if bpm is not None:
         now = datetime.now()
-        last_bpm_time = now
-
-        recent_bpms.append(bpm)
-        if len(recent_bpms) > 2:
-            recent_bpms.pop(0)
 
         ts = now.strftime("%Y-%m-%d %H:%M:%S")
         print(f"[{ts}] ❤️ BPM: {bpm}")
         save_bpm(ts, bpm)
+        hrv.record()
 
-        # --- Detecção imediata ---
-        if len(recent_bpms) == 2:
-            if all(b < BRADY_LIMIT for b in recent_bpms):
-                log_alert(f"Bradicardia detectada (BPM={recent_bpms})")
-            if all(b > TACHY_LIMIT for b in recent_bpms):
-                log_alert(f"Taquicardia detectada (BPM={recent_bpms})")
+        # --- Detecção imediata (regras por amostra) ---
+        log_alerts(evaluator.sample(now.timestamp(), bpm), now.timestamp())
 
 # =========================
-# MONITORAMENTO DE AUSÊNCIA
+# REGRAS: RECARGA + AUSÊNCIA
 # =========================
 
-async def absence_monitor():
-    global last_bpm_time
+async def watch_rules():
     while True:
-        await asyncio.sleep(30)
-        if last_bpm_time:
-            if datetime.now() - last_bpm_time > NO_DATA_TIMEOUT:
-                log_alert("Sem dados de batimento por mais de 5 minutos")
-                last_bpm_time = datetime.now()  # evita spam
+        await asyncio.sleep(rules.RELOAD_INTERVAL)
+        if rule_file.reload():
+            evaluator.load(rule_file.rules)
+
+        now = time.time()
+        log_alerts(evaluator.tick(now), now)
+        for _, (message, _, _) in alerts.sweep(now):
+            print(f"✅ {message}")
 
 # =========================
 # LOOP PRINCIPAL
@@ -122,9 +116,10 @@ async def absence_monitor():
 
 async def monitor_loop():
     global challenge
-    init_db()
+    init_db(DB_PATH)
+    start_writer(DB_PATH)
 
-    asyncio.create_task(absence_monitor())
+    asyncio.create_task(watch_rules())
 
     while True:
         try:
@@ -175,4 +170,7 @@ async def monitor_loop():
 # ENTRY POINT
 # =========================
 
-asyncio.run(monitor_loop())
+try:
+    asyncio.run(monitor_loop())
+finally:
+    stop_writer()
@@ -1,12 +1,16 @@
 import asyncio
-import sqlite3
+import time
 from pathlib import Path
 from datetime import datetime, timedelta
 
-import requests
 from bleak import BleakClient
 from Crypto.Cipher import AES
 
+import hr_decoder
+import hrv
+from outbox import Outbox
+from storage import init_db, save_bpm, start_writer, stop_writer
+
 # ==================================================
 # CONFIGURAÇÃO GERAL
 # ==================================================
@@ -57,33 +61,16 @@ def encrypt(key, msg):
 # SQLITE
 # ==================================================
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS heart_rate (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            bpm INTEGER NOT NULL
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-def save_bpm(timestamp, bpm):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO heart_rate (timestamp, bpm) VALUES (?, ?)",
-        (timestamp, bpm)
-    )
-    conn.commit()
-    conn.close()
+# Gravação em lote (write-behind) fica em storage.py:
+# save_bpm apenas enfileira, uma thread grava em transações agrupadas.
 
 # ==================================================
 # ALERTAS VIA NTFY
 # ==================================================
 
+# Gravado na alert_outbox e entregue em background, com retry (outbox.py)
+ntfy = Outbox(NTFY_SERVER, NTFY_TOPIC)
+
 def send_ntfy_alert(message):
     global last_alert_time
 
@@ -95,19 +82,8 @@ def send_ntfy_alert(message):
 
     body = f"{message}\n{now.strftime('%Y-%m-%d %H:%M:%S')}"
 
-    try:
-        requests.post(
-            f"{NTFY_SERVER}/{NTFY_TOPIC}",
-            data=body.encode("utf-8", errors="ignore"),
-            headers={
-                "Title": "ALERTA DE SAUDE",   # ASCII PURO
-                "Priority": "urgent",
-                "Tags": "rotating_light,heart"
-            },
-            timeout=5
-        )
-    except Exception as e:
-        print(f"Erro ao enviar alerta ntfy: {e}")
+    # Chamado no loop (callback BLE / corrotina): a gravação roda numa thread
+    ntfy.send_soon(body, title="ALERTA DE SAUDE", priority="urgent", tags="rotating_light,heart")
 
     print(f"🚨 ALERTA ENVIADO: {message}")
 
@@ -123,8 +99,8 @@ def auth_notification(_, data):
 def hr_notification(_, data):
     global last_bpm_time, recent_bpms
 
-    if len(data) >= 2:
-        bpm = data[1]
+    bpm = hr_decoder.push(data, time.time())
+    if bpm is not None:
         #bpm = 130  # SIMULACAO DE TAQUICARDIA PARA PRINT
         now = datetime.now()
         last_bpm_time = now
@@ -136,6 +112,7 @@ def hr_notification(_, data):
         ts = now.strftime("%Y-%m-%d %H:%M:%S")
         print(f"[{ts}] ❤️ BPM: {bpm}")
         save_bpm(ts, bpm)
+        hrv.record()
 
         # --------- ANOMALIAS IMEDIATAS ----------
         if len(recent_bpms) == 2:
@@ -165,7 +142,9 @@ async def absence_monitor():
 async def monitor_loop():
     global challenge
 
-    init_db()
+    init_db(DB_PATH)
+    start_writer(DB_PATH)
+    ntfy.start(DB_PATH)
     asyncio.create_task(absence_monitor())
 
     while True:
@@ -219,4 +198,8 @@ async def monitor_loop():
 # ENTRY POINT
 # ==================================================
 
-asyncio.run(monitor_loop())
+try:
+    asyncio.run(monitor_loop())
+finally:
+    stop_writer()
+    ntfy.stop()
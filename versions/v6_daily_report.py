@@ -1,7 +1,9 @@
-import sqlite3
 from pathlib import Path
 from datetime import datetime, date
-import requests
+
+import rollups
+from outbox import Outbox
+from storage import day_bounds, get_connection, init_db
 
 # =========================
 # CONFIGURAÇÃO
@@ -11,58 +13,33 @@ DB_PATH = Path("health.db")
 
 NTFY_SERVER = "https://ntfy.sh"
 NTFY_TOPIC = "vo-saude-bruno"
+DELIVERY_TIMEOUT = 120        # s esperando a entrega do relatório (com retry)
 
 # =========================
 # RELATÓRIO
 # =========================
 
 def get_daily_stats(target_date: date):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT
-            COUNT(*) as total,
-            AVG(bpm) as avg_bpm,
-            MIN(bpm) as min_bpm,
-            MAX(bpm) as max_bpm
-        FROM heart_rate
-        WHERE date(timestamp) = ?
-    """, (target_date.isoformat(),))
-
-    row = cur.fetchone()
-    conn.close()
+    # Conexão persistente em WAL: lê sem bloquear o coletor BLE
+    conn = get_connection(DB_PATH)
 
-    if not row or row[0] == 0:
-        return None
+    # Lê o agregado diário (heart_rate_1d) em vez das amostras brutas
+    start, end = day_bounds(target_date)
+    return rollups.range_stats(conn, start, end)
 
-    return {
-        "total": int(row[0]),
-        "avg": round(row[1], 1),
-        "min": int(row[2]),
-        "max": int(row[3])
-    }
+# Gravado na alert_outbox e entregue em background, com retry (outbox.py)
+ntfy = Outbox(NTFY_SERVER, NTFY_TOPIC)
 
 def send_ntfy_report(message):
-    try:
-        requests.post(
-            f"{NTFY_SERVER}/{NTFY_TOPIC}",
-            data=message.encode("utf-8", errors="ignore"),
-            headers={
-                "Title": "RELATORIO DIARIO SAUDE",
-                "Priority": "default",
-                "Tags": "bar_chart,heart"
-            },
-            timeout=5
-        )
-    except Exception as e:
-        print(f"Erro ao enviar relatório ntfy: {e}")
+    ntfy.send(message, title="RELATORIO DIARIO SAUDE", priority="default", tags="bar_chart,heart")
 
 # =========================
 # MAIN
 # =========================
 
 def main():
+    # Migrações antes da consulta: range_stats lê heart_rate_1d
+    init_db(DB_PATH)
     today = date.today()
     stats = get_daily_stats(today)
 
@@ -80,7 +57,13 @@ def main():
     )
 
     print(report)
+    ntfy.start(DB_PATH)
     send_ntfy_report(report)
+    # Espera a entrega com o backoff normal; o que não sair até o prazo
+    # fica pendente na alert_outbox e o monitor envia depois
+    if not ntfy.flush(DELIVERY_TIMEOUT):
+        print(f"⚠️ Relatório não entregue em {DELIVERY_TIMEOUT}s, fica pendente na outbox")
+    ntfy.stop()
 
 if __name__ == "__main__":
     main()
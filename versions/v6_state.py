@@ -12,14 +12,18 @@ Estados:
 """
 
 import asyncio
-import sqlite3
+import time
 from pathlib import Path
 from datetime import datetime, timedelta
 
-import requests
 from bleak import BleakClient
 from Crypto.Cipher import AES
 
+import hr_decoder
+import hrv
+from outbox import Outbox
+from storage import init_db, save_bpm, start_writer, stop_writer
+
 # ==================================================
 # CONFIGURAÇÃO
 # ==================================================
@@ -66,33 +70,16 @@ battery_rising_since = None
 # BANCO DE DADOS
 # ==================================================
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS heart_rate (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            bpm INTEGER NOT NULL
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-def save_bpm(ts, bpm):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO heart_rate (timestamp, bpm) VALUES (?, ?)",
-        (ts, bpm)
-    )
-    conn.commit()
-    conn.close()
+# Gravação em lote (write-behind) fica em storage.py:
+# save_* apenas enfileiram, uma thread grava em transações agrupadas.
 
 # ==================================================
 # NTFY
 # ==================================================
 
+# Gravado na alert_outbox e entregue em background, com retry (outbox.py)
+ntfy = Outbox(NTFY_SERVER, NTFY_TOPIC)
+
 def send_ntfy_alert(message):
     global last_alert_time
 
@@ -104,19 +91,8 @@ def send_ntfy_alert(message):
 
     body = f"{message}\n{now.strftime('%Y-%m-%d %H:%M:%S')}"
 
-    try:
-        requests.post(
-            f"{NTFY_SERVER}/{NTFY_TOPIC}",
-            data=body.encode("utf-8", errors="ignore"),
-            headers={
-                "Title": "ALERTA DE SAUDE",
-                "Priority": "urgent",
-                "Tags": "rotating_light,heart"
-            },
-            timeout=5
-        )
-    except Exception as e:
-        print(f"Erro ntfy: {e}")
+    # Chamado no loop (callback BLE / corrotina): a gravação roda numa thread
+    ntfy.send_soon(body, title="ALERTA DE SAUDE", priority="urgent", tags="rotating_light,heart")
 
     print(f"🚨 ALERTA ENVIADO: {message}")
 
@@ -175,13 +151,14 @@ def update_wearable_state(battery, hr_recent):
 def hr_notification(_, data):
     global last_hr_time
 
-    if len(data) >= 2:
-        bpm = data[1]
+    bpm = hr_decoder.push(data, time.time())
+    if bpm is not None:
         now = datetime.now()
         last_hr_time = now
 
         print(f"[{now}] ❤️ BPM: {bpm}")
         save_bpm(now.strftime("%Y-%m-%d %H:%M:%S"), bpm)
+        hrv.record()
 
         if wearable_state == "IN_USE":
             check_alerts(bpm)
@@ -231,7 +208,9 @@ async def battery_monitor(client):
 # ==================================================
 
 async def main():
-    init_db()
+    init_db(DB_PATH)
+    start_writer(DB_PATH)
+    ntfy.start(DB_PATH)
 
     print("🔄 Conectando à Mi Band...")
     async with BleakClient(MAC) as client:
@@ -262,4 +241,8 @@ async def main():
             await asyncio.sleep(30)
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        asyncio.run(main())
+    finally:
+        stop_writer()
+        ntfy.stop()
@@ -9,17 +9,28 @@ Estados:
 - IN_USE
 - CHARGING
 - REMOVED
+
+Pipeline (pipeline.py):
+- hr_notification só enfileira o payload recebido
+- decode → persist → evaluate → notify em estágios com filas limitadas
+- ntfy gravado na alert_outbox e entregue em background (outbox.py)
 """
 
 import asyncio
-import sqlite3
+import time
 from pathlib import Path
 from datetime import datetime, timedelta
 
-import requests
 from bleak import BleakClient
 from Crypto.Cipher import AES
 
+import hr_decoder
+import hrv
+import storage
+from outbox import Outbox
+from pipeline import DROP_NEWEST, DROP_OLDEST, Pipeline, Stage
+from storage import init_db, save_bpm, start_writer, stop_writer
+
 # ==================================================
 # CONFIGURAÇÃO
 # ==================================================
@@ -69,77 +80,36 @@ startup_battery_samples = []
 # BANCO DE DADOS
 # ==================================================
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS heart_rate (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            bpm INTEGER NOT NULL
-        )
-    """)
-
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS wearable_events (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            event TEXT NOT NULL
-        )
-    """)
-
-    conn.commit()
-    conn.close()
-
-def save_bpm(ts, bpm):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO heart_rate (timestamp, bpm) VALUES (?, ?)",
-        (ts, bpm)
-    )
-    conn.commit()
-    conn.close()
+# Gravação em lote (write-behind) fica em storage.py:
+# save_* apenas enfileiram, uma thread grava em transações agrupadas.
 
 def save_event(event):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO wearable_events (timestamp, event) VALUES (?, ?)",
-        (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), event)
-    )
-    conn.commit()
-    conn.close()
+    storage.save_event(datetime.now().strftime("%Y-%m-%d %H:%M:%S"), event)
 
 # ==================================================
 # NTFY
 # ==================================================
 
-def send_ntfy_alert(message):
+def alert_allowed():
+    """Cooldown entre alertas (checado antes de enfileirar para o notify)."""
     global last_alert_time
 
     now = datetime.now()
     if last_alert_time and now - last_alert_time < ALERT_COOLDOWN:
-        return
+        return False
 
     last_alert_time = now
+    return True
+
+# Gravado na alert_outbox e entregue em background, com retry (outbox.py)
+ntfy = Outbox(NTFY_SERVER, NTFY_TOPIC)
 
+def send_ntfy_alert(message):
+    # Grava na alert_outbox (transação curta); a entrega roda na thread da outbox
+    now = datetime.now()
     body = f"{message}\n{now.strftime('%Y-%m-%d %H:%M:%S')}"
 
-    try:
-        requests.post(
-            f"{NTFY_SERVER}/{NTFY_TOPIC}",
-            data=body.encode("utf-8", errors="ignore"),
-            headers={
-                "Title": "ALERTA DE SAUDE",
-                "Priority": "urgent",
-                "Tags": "rotating_light,heart"
-            },
-            timeout=5
-        )
-    except Exception as e:
-        print(f"Erro ntfy: {e}")
+    ntfy.send(body, title="ALERTA DE SAUDE", priority="urgent", tags="rotating_light,heart")
 
     print(f"🚨 ALERTA ENVIADO: {message}")
 
@@ -210,18 +180,48 @@ def update_wearable_state(battery, hr_recent):
 # ==================================================
 
 def hr_notification(_, data):
+    # Callback do bleak: só enfileira, o resto roda nos estágios
+    ingest.submit((time.time(), bytes(data)))
+
+# ==================================================
+# PIPELINE (decode → persist → evaluate → notify)
+# ==================================================
+
+def decode_stage(item):
     global last_hr_time
 
-    if len(data) >= 2:
-        bpm = data[1]
-        now = datetime.now()
-        last_hr_time = now
+    ts, data = item
+    bpm = hr_decoder.push(data, ts)
+    if bpm is None:
+        return None
 
-        print(f"[{now}] ❤️ BPM: {bpm}")
-        save_bpm(now.strftime("%Y-%m-%d %H:%M:%S"), bpm)
+    now = datetime.fromtimestamp(ts)
+    last_hr_time = now
+    return now, bpm
 
-        if wearable_state == "IN_USE":
-            check_alerts(bpm)
+def persist_stage(sample):
+    now, bpm = sample
+    print(f"[{now}] ❤️ BPM: {bpm}")
+    save_bpm(now.strftime("%Y-%m-%d %H:%M:%S"), bpm)
+    hrv.record()
+    return sample
+
+def evaluate_stage(sample):
+    _, bpm = sample
+    if wearable_state != "IN_USE":
+        return None
+
+    message = check_alerts(bpm)
+    if message and alert_allowed():
+        return message
+    return None
+
+ingest = Pipeline([
+    Stage("decode", decode_stage, maxsize=256, policy=DROP_OLDEST),
+    Stage("persist", persist_stage, maxsize=256),
+    Stage("evaluate", evaluate_stage, maxsize=64),
+    Stage("notify", send_ntfy_alert, maxsize=16, policy=DROP_NEWEST, blocking=True),
+])
 
 # ==================================================
 # ALERTAS
@@ -229,16 +229,18 @@ def hr_notification(_, data):
 
 def check_alerts(bpm):
     if bpm <= BRADY_LIMIT:
-        send_ntfy_alert(f"Bradicardia detectada (BPM={bpm})")
-    elif bpm >= TACHY_LIMIT:
-        send_ntfy_alert(f"Taquicardia detectada (BPM={bpm})")
+        return f"Bradicardia detectada (BPM={bpm})"
+    if bpm >= TACHY_LIMIT:
+        return f"Taquicardia detectada (BPM={bpm})"
+    return None
 
 def check_no_data():
     if wearable_state != "IN_USE":
         return
 
     if last_hr_time and datetime.now() - last_hr_time > NO_DATA_LIMIT:
-        send_ntfy_alert("Sem dados de batimento por mais de 5 minutos")
+        if alert_allowed():
+            ingest.submit("Sem dados de batimento por mais de 5 minutos", "notify")
 
 # ==================================================
 # BATERIA
@@ -268,35 +270,45 @@ async def battery_monitor(client):
 # ==================================================
 
 async def main():
-    init_db()
+    init_db(DB_PATH)
+    start_writer(DB_PATH)
+    ntfy.start(DB_PATH)
+    ingest.start()
 
-    print("🔄 Conectando à Mi Band...")
-    async with BleakClient(MAC) as client:
-        print("✅ Conectado")
+    try:
+        print("🔄 Conectando à Mi Band...")
+        async with BleakClient(MAC) as client:
+            print("✅ Conectado")
 
-        await client.start_notify(UUID_AUTH, auth_notification)
-        await client.write_gatt_char(UUID_AUTH, b"\x02\x00", response=False)
+            await client.start_notify(UUID_AUTH, auth_notification)
+            await client.write_gatt_char(UUID_AUTH, b"\x02\x00", response=False)
 
-        for _ in range(20):
-            if challenge:
-                break
-            await asyncio.sleep(0.2)
+            for _ in range(20):
+                if challenge:
+                    break
+                await asyncio.sleep(0.2)
 
-        resp = encrypt(AUTH_KEY, challenge)
-        await client.write_gatt_char(UUID_AUTH, b"\x03\x00" + resp, response=False)
+            resp = encrypt(AUTH_KEY, challenge)
+            await client.write_gatt_char(UUID_AUTH, b"\x03\x00" + resp, response=False)
 
-        print("🔓 Autenticado")
+            print("🔓 Autenticado")
 
-        await client.start_notify(UUID_HR_MEAS, hr_notification)
-        await client.write_gatt_char(UUID_HR_CTRL, b"\x15\x01\x01", response=True)
+            await client.start_notify(UUID_HR_MEAS, hr_notification)
+            await client.write_gatt_char(UUID_HR_CTRL, b"\x15\x01\x01", response=True)
 
-        asyncio.create_task(battery_monitor(client))
+            asyncio.create_task(battery_monitor(client))
 
-        print("❤️ Monitoramento iniciado")
+            print("❤️ Monitoramento iniciado")
 
-        while True:
-            check_no_data()
-            await asyncio.sleep(30)
+            while True:
+                check_no_data()
+                await asyncio.sleep(30)
+    finally:
+        await ingest.stop()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        asyncio.run(main())
+    finally:
+        stop_writer()
+        ntfy.stop()
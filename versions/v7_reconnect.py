@@ -14,14 +14,20 @@ v7_reconnect.py
 """
 
 import asyncio
-import sqlite3
+import time
 from pathlib import Path
 from datetime import datetime, timedelta
 
-import requests
 from bleak import BleakClient
 from Crypto.Cipher import AES
 
+import hr_decoder
+import hrv
+import storage
+from keepalive import KeepAlive
+from outbox import Outbox
+from storage import init_db, save_bpm, start_writer, stop_writer
+
 # ==================================================
 # CONFIGURAÇÃO
 # ==================================================
@@ -60,6 +66,7 @@ UUID_BATTERY_LEVEL = "00002a19-0000-1000-8000-00805f9b34fb"
 
 challenge = None
 last_hr_time = None
+keeper = None             # KeepAlive da conexão atual
 last_alert_time = None
 
 wearable_state = "IN_USE"
@@ -71,47 +78,19 @@ startup_battery_samples = []
 # BANCO DE DADOS
 # ==================================================
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS heart_rate (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            bpm INTEGER NOT NULL
-        )
-    """)
-
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS wearable_events (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            event TEXT NOT NULL
-        )
-    """)
-
-    conn.commit()
-    conn.close()
-
-def save_bpm(ts, bpm):
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            "INSERT INTO heart_rate (timestamp, bpm) VALUES (?, ?)",
-            (ts, bpm)
-        )
+# Gravação em lote (write-behind) fica em storage.py:
+# save_* apenas enfileiram, uma thread grava em transações agrupadas.
 
 def save_event(event):
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            "INSERT INTO wearable_events (timestamp, event) VALUES (?, ?)",
-            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), event)
-        )
+    storage.save_event(datetime.now().strftime("%Y-%m-%d %H:%M:%S"), event)
 
 # ==================================================
 # NTFY
 # ==================================================
 
+# Gravado na alert_outbox e entregue em background, com retry (outbox.py)
+ntfy = Outbox(NTFY_SERVER, NTFY_TOPIC)
+
 def send_ntfy_alert(message):
     global last_alert_time
 
@@ -121,15 +100,8 @@ def send_ntfy_alert(message):
 
     last_alert_time = now
 
-    try:
-        requests.post(
-            f"{NTFY_SERVER}/{NTFY_TOPIC}",
-            data=message.encode("utf-8", errors="ignore"),
-            headers={"Title": "ALERTA DE SAUDE", "Priority": "urgent"},
-            timeout=5
-        )
-    except Exception as e:
-        print(f"Erro ntfy: {e}")
+    # Chamado no loop (callback BLE / corrotina): a gravação roda numa thread
+    ntfy.send_soon(message, title="ALERTA DE SAUDE", priority="urgent")
 
     print(f"🚨 ALERTA: {message}")
 
@@ -190,7 +162,13 @@ def update_wearable_state(battery, hr_recent):
 def hr_notification(_, data):
     global last_hr_time
 
-    bpm = data[1]
+    bpm = hr_decoder.push(data, time.time())
+    if bpm is None:
+        return
+
+    if keeper is not None:
+        keeper.on_sample()
+
     now = datetime.now()
     last_hr_time = now
 
@@ -200,6 +178,7 @@ def hr_notification(_, data):
 
     print(f"[{now}] ❤️ BPM: {bpm}")
     save_bpm(now.strftime("%Y-%m-%d %H:%M:%S"), bpm)
+    hrv.record()
 
     if wearable_state == "IN_USE":
         if bpm <= BRADY_LIMIT:
@@ -223,7 +202,7 @@ async def battery_monitor(client):
 # ==================================================
 
 async def monitor(client):
-    global challenge
+    global challenge, keeper
 
     await client.start_notify(UUID_AUTH, auth_notification)
     await client.write_gatt_char(UUID_AUTH, b"\x02\x00", response=False)
@@ -239,21 +218,30 @@ async def monitor(client):
     await client.start_notify(UUID_HR_MEAS, hr_notification)
     await client.write_gatt_char(UUID_HR_CTRL, b"\x15\x01\x01", response=True)
 
+    # Ping periódico no HR control point (mantém a medição contínua)
+    keeper = KeepAlive(client, UUID_HR_CTRL)
+    keeper.start()
+
     asyncio.create_task(battery_monitor(client))
 
     print("❤️ Monitoramento ativo")
 
-    while True:
-        if last_hr_time and datetime.now() - last_hr_time > WATCHDOG_TIMEOUT:
-            raise Exception("Watchdog: conexão inativa")
-        await asyncio.sleep(10)
+    try:
+        while True:
+            if last_hr_time and datetime.now() - last_hr_time > WATCHDOG_TIMEOUT:
+                raise Exception("Watchdog: conexão inativa")
+            await asyncio.sleep(10)
+    finally:
+        await keeper.stop()
 
 # ==================================================
 # SUPERVISOR
 # ==================================================
 
 async def supervisor():
-    init_db()
+    init_db(DB_PATH)
+    start_writer(DB_PATH)
+    ntfy.start(DB_PATH)
 
     while True:
         try:
@@ -272,4 +260,8 @@ async def supervisor():
 # ==================================================
 
 if __name__ == "__main__":
-    asyncio.run(supervisor())
+    try:
+        asyncio.run(supervisor())
+    finally:
+        stop_writer()
+        ntfy.stop()
@@ -5,18 +5,67 @@ Correções críticas:
 - Reset completo de estado a cada reconexão
 - Cancelamento correto de tasks assíncronas
 - Watchdog estável (sem loop infinito)
-- Leitura segura da bateria (Mi Band 4)
+- Bateria por notificação na 0x0006 (battery.py): nível e carregando
+  na hora, leitura só como fallback lento
 - Reconexão BLE robusta para uso 24/7
+
+Pipeline (pipeline.py):
+- hr_notification só enfileira o payload recebido
+- decode → persist → evaluate → notify em estágios com filas limitadas
+- ntfy gravado na alert_outbox (numa thread do estágio notify) e
+  entregue em background (outbox.py)
+
+Reconexão (reconnect.py):
+- Conecta quando a pulseira anuncia com RSSI utilizável
+- Sem anúncios: backoff exponencial com jitter
+
+Handshake (handshake.py):
+- Desafio/confirmação por futures, sem polling
+- Tempos de connect, challenge, auth e primeiro BPM por conexão
+
+Keep-alive (keepalive.py):
+- Ping 0x16 periódico no HR control point: o HR contínuo não para
+  e o watchdog não precisa reconectar
+- Lapsos do stream (e reinício da medição) contados no log
+
+Passos (activity.py):
+- Notificações da 0x0007 agregadas por minuto na tabela activity_1m,
+  pelo mesmo writer em lote do HR
+
+Histórico (history.py):
+- Depois de cada reconexão, o que a pulseira gravou fora de alcance
+  (HR e passos por minuto) é buscado em background pela 0x0004/0x0005
+
+Regras de alerta (rules.py):
+- Limites em alert_rules.json (sem o arquivo: bradicardia ≤ 50,
+  taquicardia ≥ 110, sem dados há 5 min), avaliados por amostra no
+  estágio evaluate; severidade da regra = prioridade do ntfy
+- Arquivo relido quando muda, sem reconectar à pulseira
+- Cooldown, escalonamento e aviso de resolvida por regra e severidade
+  (alert_index.py), no lugar do last_alert_time único
 """
 
 import asyncio
-import sqlite3
+import time
 from pathlib import Path
 from datetime import datetime, timedelta
 
-import requests
 from bleak import BleakClient
-from Crypto.Cipher import AES
+
+import activity
+import alert_index
+import battery
+import hr_decoder
+import history
+import hrv
+import rules
+import storage
+from handshake import Handshake
+from keepalive import KeepAlive
+from outbox import Outbox
+from pipeline import DROP_NEWEST, DROP_OLDEST, Pipeline, Stage
+from reconnect import CONNECT_TIMEOUT, Reconnector
+from storage import init_db, save_bpm, start_writer, stop_writer
 
 # ==================================================
 # CONFIGURAÇÃO
@@ -30,14 +79,8 @@ DB_PATH = Path("health.db")
 NTFY_SERVER = "https://ntfy.sh"
 NTFY_TOPIC = "vo-saude-bruno"
 
-BRADY_LIMIT = 50
-TACHY_LIMIT = 110
-ALERT_COOLDOWN = timedelta(minutes=10)
-
+RULES_PATH = Path("alert_rules.json")
 WATCHDOG_TIMEOUT = timedelta(minutes=2)
-RECONNECT_DELAY = 10
-
-BATTERY_RISE_TIME = timedelta(minutes=3)
 
 # ==================================================
 # UUIDs BLE (Mi Band 4)
@@ -45,6 +88,9 @@ BATTERY_RISE_TIME = timedelta(minutes=3)
 
 UUID_AUTH = "00000009-0000-3512-2118-0009af100700"
 UUID_BATTERY = "00000006-0000-3512-2118-0009af100700"
+UUID_STEPS = "00000007-0000-3512-2118-0009af100700"
+UUID_FETCH = "00000004-0000-3512-2118-0009af100700"
+UUID_ACTIVITY_DATA = "00000005-0000-3512-2118-0009af100700"
 UUID_HR_CTRL = "00002a39-0000-1000-8000-00805f9b34fb"
 UUID_HR_MEAS = "00002a37-0000-1000-8000-00805f9b34fb"
 
@@ -52,115 +98,83 @@ UUID_HR_MEAS = "00002a37-0000-1000-8000-00805f9b34fb"
 # VARIÁVEIS GLOBAIS (resetadas a cada conexão)
 # ==================================================
 
-challenge = None
+session = None             # Handshake da conexão atual
+keeper = None              # KeepAlive da conexão atual
 last_hr_time = None
-last_alert_time = None
 
 wearable_state = "IN_USE"
 last_battery = None
-battery_rising_since = None
+
+# Passos por minuto (a base dos totais sobrevive às reconexões)
+steps = activity.StepsAggregator()
+
+# Backfill do histórico da pulseira (cursor no banco)
+backfill = history.HistorySync(db_path=DB_PATH)
+
+# Regras de alerta (o estado das regras sobrevive às reconexões:
+# a de ausência de dados cobre justamente a pulseira fora de alcance)
+rule_file = rules.RuleFile(RULES_PATH)
+evaluator = rules.Evaluator(rule_file.rules)
+
+# Cooldown / escalonamento / resolvida por (pulseira, regra, severidade)
+alerts = alert_index.AlertIndex()
 
 # ==================================================
 # RESET DE ESTADO (CRÍTICO)
 # ==================================================
 
 def reset_runtime_state():
-    global challenge, last_hr_time, last_alert_time
-    global wearable_state, last_battery, battery_rising_since
+    global session, keeper, last_hr_time
+    global wearable_state, last_battery
 
-    challenge = None
+    session = None
+    keeper = None
     last_hr_time = None
-    last_alert_time = None
 
     wearable_state = "IN_USE"
     last_battery = None
-    battery_rising_since = None
 
 # ==================================================
 # BANCO DE DADOS
 # ==================================================
 
-def init_db():
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS heart_rate (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT,
-                bpm INTEGER
-            )
-        """)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS wearable_events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT,
-                event TEXT
-            )
-        """)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS battery_level (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT,
-                level INTEGER
-            )
-        """)
-
-def save_bpm(ts, bpm):
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            "INSERT INTO heart_rate VALUES (NULL, ?, ?)",
-            (ts, bpm)
-        )
+# Gravação em lote (write-behind) fica em storage.py:
+# save_* apenas enfileiram, uma thread grava em transações agrupadas.
 
 def save_event(event):
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            "INSERT INTO wearable_events VALUES (NULL, ?, ?)",
-            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), event)
-        )
+    storage.save_event(datetime.now().strftime("%Y-%m-%d %H:%M:%S"), event)
 
 def save_battery(level):
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            "INSERT INTO battery_level VALUES (NULL, ?, ?)",
-            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), level)
-        )
+    storage.save_battery(datetime.now().strftime("%Y-%m-%d %H:%M:%S"), level)
 
 # ==================================================
 # NTFY
 # ==================================================
 
-def send_ntfy_alert(message):
-    global last_alert_time
-    now = datetime.now()
+# Gravado na alert_outbox e entregue em background, com retry (outbox.py)
+ntfy = Outbox(NTFY_SERVER, NTFY_TOPIC)
 
-    if last_alert_time and now - last_alert_time < ALERT_COOLDOWN:
-        return
+def send_ntfy_alert(message, priority="urgent", title=alert_index.ALERT_TITLE):
+    # Grava na alert_outbox (transação curta, fora do loop); a entrega roda na thread da outbox
+    ntfy.send(message, title=title, priority=priority)
 
-    last_alert_time = now
+    if title == alert_index.RESOLVED_TITLE:
+        print(f"✅ RESOLVIDO: {message}")
+    else:
+        print(f"🚨 ALERTA: {message}")
 
-    try:
-        requests.post(
-            f"{NTFY_SERVER}/{NTFY_TOPIC}",
-            data=message.encode("utf-8", errors="ignore"),
-            headers={"Title": "ALERTA DE SAÚDE", "Priority": "urgent"},
-            timeout=5
-        )
-    except Exception as e:
-        print(f"Erro ntfy: {e}")
+def notify_stage(items):
+    for message, priority, title in items:
+        send_ntfy_alert(message, priority, title)
 
-    print(f"🚨 ALERTA: {message}")
-
-# ==================================================
-# AUTENTICAÇÃO
-# ==================================================
-
-def encrypt(key, msg):
-    return AES.new(key, AES.MODE_ECB).encrypt(msg)
-
-def auth_notification(_, data):
-    global challenge
-    if data[:3] == b'\x10\x02\x01':
-        challenge = data[3:]
+def to_notify(fired, ts):
+    """[(regra, mensagem)] do evaluator → avisos que passam pelo índice."""
+    items = []
+    for rule, message in fired:
+        alert = alerts.fire(0, rule, message, ts)
+        if alert is not None:
+            items.append(alert)
+    return items or None
 
 # ==================================================
 # ESTADO / HR
@@ -174,106 +188,170 @@ def set_state(new_state, message):
         save_event(message)
 
 def hr_notification(_, data):
+    # Callback do bleak: só enfileira, o resto roda nos estágios
+    if keeper is not None:
+        keeper.on_sample()
+    ingest.submit((time.time(), bytes(data)))
+
+# ==================================================
+# PIPELINE (decode → persist → evaluate → notify)
+# ==================================================
+
+def decode_stage(item):
     global last_hr_time
 
-    bpm = data[1]
-    now = datetime.now()
+    ts, data = item
+    bpm = hr_decoder.push(data, ts)
+    if bpm is None:
+        return None
+
+    # Tempo até o primeiro BPM decodificado (log + connection_setup.jsonl, uma vez por conexão)
+    if session is not None:
+        session.on_sample()
+
+    now = datetime.fromtimestamp(ts)
     last_hr_time = now
 
     if bpm == 0:
         set_state("CHARGING", f"[{now}] 🔌 Pulseira provavelmente no carregador (BPM=0)")
-        return
+        return None
+
+    return now, bpm
 
+def persist_stage(sample):
+    now, bpm = sample
     print(f"[{now}] ❤️ BPM: {bpm}")
     save_bpm(now.strftime("%Y-%m-%d %H:%M:%S"), bpm)
-
-    if wearable_state == "IN_USE":
-        if bpm <= BRADY_LIMIT:
-            send_ntfy_alert(f"Bradicardia (BPM={bpm})")
-        elif bpm >= TACHY_LIMIT:
-            send_ntfy_alert(f"Taquicardia (BPM={bpm})")
+    hrv.record()
+    return sample
+
+def evaluate_stage(sample):
+    now, bpm = sample
+    # Regras fora do estado atual (ex.: CHARGING) são puladas pelo evaluator
+    ts = now.timestamp()
+    return to_notify(evaluator.sample(ts, bpm, wearable_state), ts)
+
+ingest = Pipeline([
+    Stage("decode", decode_stage, maxsize=256, policy=DROP_OLDEST),
+    Stage("persist", persist_stage, maxsize=256),
+    Stage("evaluate", evaluate_stage, maxsize=64),
+    Stage("notify", notify_stage, maxsize=16, policy=DROP_NEWEST, blocking=True),
+])
 
 # ==================================================
-# BATERIA (SEGURA)
+# REGRAS (recarga + ausência de dados + resolvidas)
 # ==================================================
 
-async def read_battery_safe(client):
-    try:
-        data = await client.read_gatt_char(UUID_BATTERY)
-        if data and len(data) >= 2:
-            return int(data[1])
-    except Exception:
-        pass
-    return None
-
-async def battery_monitor(client):
-    try:
-        while True:
-            battery = await read_battery_safe(client)
-            if battery is not None:
-                print(f"[{datetime.now()}] 🔋 Bateria: {battery}%")
-                save_battery(battery)
-            await asyncio.sleep(60)
-    except asyncio.CancelledError:
-        return
+async def watch_rules():
+    """Recarga do arquivo de regras e regras de relógio (ausência de dados)."""
+    while True:
+        await asyncio.sleep(rules.RELOAD_INTERVAL)
+        if rule_file.reload():
+            evaluator.load(rule_file.rules)
+
+        now = time.time()
+        items = to_notify(evaluator.tick(now, wearable_state), now) or []
+        items += [alert for _, alert in alerts.sweep(now)]
+        if items:
+            await asyncio.to_thread(notify_stage, items)
 
 # ==================================================
-# MONITORAMENTO (COM WATCHDOG)
+# BATERIA (notificações da 0x0006)
 # ==================================================
 
-async def monitor(client):
-    global challenge
+def on_battery(info):
+    # Só chega quando nível ou carregamento mudam
+    global last_battery
+
+    now = datetime.now()
+    last_battery = info["level"]
+    print(f"[{now}] 🔋 Bateria: {battery.describe(info)}")
+    save_battery(info["level"])
 
-    await client.start_notify(UUID_AUTH, auth_notification)
-    await client.write_gatt_char(UUID_AUTH, b"\x02\x00", response=False)
+    if info["charging"]:
+        set_state("CHARGING", f"[{now}] 🔌 Pulseira no carregador ({info['level']}%)")
+    elif info["charging"] is False and wearable_state == "CHARGING":
+        set_state("IN_USE", f"[{now}] ⌚ Pulseira retirada do carregador")
 
-    for _ in range(20):
-        if challenge:
-            break
-        await asyncio.sleep(0.2)
+# ==================================================
+# MONITORAMENTO (COM WATCHDOG)
+# ==================================================
 
-    resp = encrypt(AUTH_KEY, challenge)
-    await client.write_gatt_char(UUID_AUTH, b"\x03\x00" + resp, response=False)
+async def monitor(client, hs):
+    global session, keeper
 
-    await client.start_notify(UUID_HR_MEAS, hr_notification)
+    session = hs
+    await hs.authenticate(client, UUID_AUTH, AUTH_KEY, UUID_HR_MEAS, hr_notification)
     await client.write_gatt_char(UUID_HR_CTRL, b"\x15\x01\x01", response=True)
 
-    battery_task = asyncio.create_task(battery_monitor(client))
+    # Ping periódico no HR control point (mantém a medição contínua)
+    keeper = KeepAlive(client, UUID_HR_CTRL)
+    keeper.start()
 
-    print("❤️ Monitoramento ativo")
+    watcher = battery.BatteryWatcher(client, UUID_BATTERY, on_battery)
 
+    # Dentro do try: se um start falhar, o finally desfaz os anteriores (e o keep-alive)
     try:
+        await watcher.start()
+        await activity.start(client, UUID_STEPS, steps)
+
+        # Buracos desde a última conexão, sem atrasar o HR em tempo real
+        backfill.start(client, UUID_FETCH, UUID_ACTIVITY_DATA)
+
+        print("❤️ Monitoramento ativo")
+
         while True:
             if last_hr_time and datetime.now() - last_hr_time > WATCHDOG_TIMEOUT:
                 raise Exception("Watchdog: conexão inativa")
             await asyncio.sleep(10)
     finally:
-        battery_task.cancel()
+        await backfill.stop()
+        await activity.stop(client, UUID_STEPS, steps)
+        await watcher.stop()
+        await keeper.stop()
 
 # ==================================================
 # SUPERVISOR
 # ==================================================
 
 async def supervisor():
-    init_db()
-
-    while True:
-        try:
-            reset_runtime_state()
-            print("🔄 Conectando à Mi Band...")
-
-            async with BleakClient(MAC) as client:
-                print("✅ Conectado")
-                await monitor(client)
+    init_db(DB_PATH)
+    start_writer(DB_PATH)
+    ntfy.start(DB_PATH)
+    ingest.start()
+    rules_task = asyncio.create_task(watch_rules())
+    reconnector = Reconnector(MAC)
 
-        except Exception as e:
-            print(f"⚠️ {e}")
-            print("🔁 Reconectando em alguns segundos...")
-            await asyncio.sleep(RECONNECT_DELAY)
+    try:
+        while True:
+            try:
+                reset_runtime_state()
+                target = await reconnector.wait()
+                print("🔄 Conectando à Mi Band...")
+                hs = Handshake(MAC)
+
+                async with BleakClient(target, timeout=CONNECT_TIMEOUT) as client:
+                    hs.mark("connect")
+                    print("✅ Conectado")
+                    reconnector.connected()
+                    await monitor(client, hs)
+
+            except Exception as e:
+                print(f"⚠️ {e}")
+
+            reconnector.disconnected()
+    finally:
+        rules_task.cancel()
+        await ingest.stop()
 
 # ==================================================
 # MAIN
 # ==================================================
 
 if __name__ == "__main__":
-    asyncio.run(supervisor())
+    try:
+        asyncio.run(supervisor())
+    finally:
+        stop_writer()
+        print(f"🔔 Alertas: {alerts.describe()}")
+        ntfy.stop()
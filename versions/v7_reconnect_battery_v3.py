@@ -20,11 +20,15 @@ Base sólida para evolução futura.
 """
 
 import asyncio
+import time
 from datetime import datetime, timedelta
 
 from bleak import BleakClient
 from Crypto.Cipher import AES
 
+import hr_decoder
+from keepalive import KeepAlive
+
 # ==================================================
 # CONFIG
 # ==================================================
@@ -50,6 +54,7 @@ UUID_HR_MEAS = "00002a37-0000-1000-8000-00805f9b34fb"
 
 challenge = None
 last_hr_time = None
+keeper = None             # KeepAlive da conexão atual
 
 # ==================================================
 # AUTH
@@ -70,10 +75,13 @@ def auth_notification(_, data):
 def hr_notification(_, data):
     global last_hr_time
 
-    if len(data) < 2:
+    bpm = hr_decoder.push(data, time.time())
+    if bpm is None:
         return
 
-    bpm = data[1]
+    if keeper is not None:
+        keeper.on_sample()
+
     now = datetime.now()
     last_hr_time = now
 
@@ -84,7 +92,7 @@ def hr_notification(_, data):
 # ==================================================
 
 async def monitor(client):
-    global challenge, last_hr_time
+    global challenge, last_hr_time, keeper
 
     challenge = None
     last_hr_time = None
@@ -109,22 +117,29 @@ async def monitor(client):
     await client.start_notify(UUID_HR_MEAS, hr_notification)
     await client.write_gatt_char(UUID_HR_CTRL, b"\x15\x01\x01", response=True)
 
+    # Ping periódico no HR control point (mantém a medição contínua)
+    keeper = KeepAlive(client, UUID_HR_CTRL)
+    keeper.start()
+
     print("❤️ Monitoramento ativo")
 
-    # Loop principal
-    while True:
-        now = datetime.now()
+    try:
+        # Loop principal
+        while True:
+            now = datetime.now()
 
-        # Grace period
-        if now - connected_at < CONNECTION_GRACE_PERIOD:
-            await asyncio.sleep(5)
-            continue
+            # Grace period
+            if now - connected_at < CONNECTION_GRACE_PERIOD:
+                await asyncio.sleep(5)
+                continue
 
-        # Watchdog real
-        if last_hr_time and now - last_hr_time > WATCHDOG_TIMEOUT:
-            raise Exception("Watchdog: sem HR por muito tempo")
+            # Watchdog real
+            if last_hr_time and now - last_hr_time > WATCHDOG_TIMEOUT:
+                raise Exception("Watchdog: sem HR por muito tempo")
 
-        await asyncio.sleep(10)
+            await asyncio.sleep(10)
+    finally:
+        await keeper.stop()
 
 # ==================================================
 # SUPERVISOR
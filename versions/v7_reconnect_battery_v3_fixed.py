@@ -17,16 +17,29 @@ Sem:
 - ntfy
 
 Correções desta versão:
-- Descoberta explícita de serviços após reconexão
+- Perfil GATT em cache (gatt_cache.py): reconexão só descobre os
+  serviços usados e resolve as características pelo handle salvo
 - Limpeza explícita de notificações BLE
 - Evita loop de reconexão instável
+- Autenticação por futures (handshake.py) e tempo de cada fase
+  (connect, discovery, challenge, auth, first_bpm) a cada conexão
+- Reconexão guiada por anúncios BLE com backoff (reconnect.py),
+  no lugar de tentar às cegas a cada RECONNECT_DELAY
+- Keep-alive do HR (keepalive.py): ping periódico no control point,
+  lapsos do stream contados em vez de reconexão pelo watchdog
 """
 
 import asyncio
+import time
 from datetime import datetime, timedelta
 
 from bleak import BleakClient
-from Crypto.Cipher import AES
+
+import gatt_cache
+import hr_decoder
+from handshake import Handshake
+from keepalive import KeepAlive
+from reconnect import CONNECT_TIMEOUT, Reconnector
 
 # ==================================================
 # CONFIG
@@ -35,7 +48,6 @@ from Crypto.Cipher import AES
 MAC = "E1:2C:9F:0B:F1:44"
 AUTH_KEY = bytes.fromhex("9ef7899bbef1b557158e7c8c27e1b062")
 
-RECONNECT_DELAY = 10
 WATCHDOG_TIMEOUT = timedelta(minutes=2)
 CONNECTION_GRACE_PERIOD = timedelta(seconds=40)
 
@@ -51,20 +63,9 @@ UUID_HR_MEAS = "00002a37-0000-1000-8000-00805f9b34fb"
 # ESTADO RUNTIME
 # ==================================================
 
-challenge = None
 last_hr_time = None
-
-# ==================================================
-# AUTH
-# ==================================================
-
-def encrypt(key, msg):
-    return AES.new(key, AES.MODE_ECB).encrypt(msg)
-
-def auth_notification(_, data):
-    global challenge
-    if data[:3] == b'\x10\x02\x01':
-        challenge = data[3:]
+session = None             # Handshake da conexão atual
+keeper = None              # KeepAlive da conexão atual
 
 # ==================================================
 # HR
@@ -73,10 +74,16 @@ def auth_notification(_, data):
 def hr_notification(_, data):
     global last_hr_time
 
-    if len(data) < 2:
+    bpm = hr_decoder.push(data, time.time())
+    if bpm is None:
         return
 
-    bpm = data[1]
+    if keeper is not None:
+        keeper.on_sample()
+
+    if session is not None:
+        session.on_sample()
+
     now = datetime.now()
     last_hr_time = now
 
@@ -86,14 +93,14 @@ def hr_notification(_, data):
 # CLEANUP
 # ==================================================
 
-async def cleanup_client(client):
+async def cleanup_client(client, chars):
     try:
-        await client.stop_notify(UUID_AUTH)
+        await client.stop_notify(gatt_cache.char(chars, UUID_AUTH))
     except Exception:
         pass
 
     try:
-        await client.stop_notify(UUID_HR_MEAS)
+        await client.stop_notify(gatt_cache.char(chars, UUID_HR_MEAS))
     except Exception:
         pass
 
@@ -101,45 +108,36 @@ async def cleanup_client(client):
 # MONITOR
 # ==================================================
 
-async def monitor(client):
-    global challenge, last_hr_time
+async def monitor(client, chars, hs):
+    global last_hr_time, session, keeper
 
-    challenge = None
+    session = hs
     last_hr_time = None
     connected_at = datetime.now()
 
+    auth = gatt_cache.char(chars, UUID_AUTH)
+    hr_meas = gatt_cache.char(chars, UUID_HR_MEAS)
+    hr_ctrl = gatt_cache.char(chars, UUID_HR_CTRL)
+
     try:
         # ------------------------------
-        # AUTH
+        # AUTH (+ assinatura do HR em paralelo)
         # ------------------------------
-        await client.start_notify(UUID_AUTH, auth_notification)
-        await client.write_gatt_char(UUID_AUTH, b"\x02\x00", response=False)
-
-        for _ in range(20):
-            if challenge:
-                break
-            await asyncio.sleep(0.2)
-
-        if not challenge:
-            raise Exception("Auth challenge não recebido")
-
-        resp = encrypt(AUTH_KEY, challenge)
-        await client.write_gatt_char(
-            UUID_AUTH,
-            b"\x03\x00" + resp,
-            response=False
-        )
+        await hs.authenticate(client, auth, AUTH_KEY, hr_meas, hr_notification)
 
         # ------------------------------
-        # HR
+        # HR (o control point exige autenticação)
         # ------------------------------
-        await client.start_notify(UUID_HR_MEAS, hr_notification)
         await client.write_gatt_char(
-            UUID_HR_CTRL,
+            hr_ctrl,
             b"\x15\x01\x01",
             response=True
         )
 
+        # Ping periódico no HR control point (mantém a medição contínua)
+        keeper = KeepAlive(client, hr_ctrl)
+        keeper.start()
+
         print("❤️ Monitoramento ativo")
 
         # ------------------------------
@@ -160,29 +158,41 @@ async def monitor(client):
             await asyncio.sleep(10)
 
     finally:
-        await cleanup_client(client)
+        if keeper is not None:
+            await keeper.stop()
+            keeper = None
+        await cleanup_client(client, chars)
 
 # ==================================================
 # SUPERVISOR
 # ==================================================
 
 async def supervisor():
+    reconnector = Reconnector(MAC)
+
     while True:
         try:
+            print("📡 Aguardando anúncio da Mi Band...")
+            target = await reconnector.wait()
+
             print("🔄 Conectando à Mi Band...")
-            async with BleakClient(MAC) as client:
-                print("✅ Conectado")
+            hs = Handshake(MAC)
 
-                # 🔑 GARANTIR SERVIÇOS GATT
-                await client.get_services()
-                await asyncio.sleep(2)
+            # Com perfil salvo, só os serviços usados são descobertos
+            services = gatt_cache.service_filter(MAC)
+            async with BleakClient(target, services=services, timeout=CONNECT_TIMEOUT) as client:
+                hs.mark("connect")
+                print("✅ Conectado")
+                reconnector.connected()
 
-                await monitor(client)
+                chars = await gatt_cache.resolve(client, MAC)
+                hs.mark("discovery")
+                await monitor(client, chars, hs)
 
         except Exception as e:
             print(f"⚠️ {repr(e)}")
-            print("🔁 Reconectando em alguns segundos...")
-            await asyncio.sleep(RECONNECT_DELAY)
+
+        reconnector.disconnected()
 
 # ==================================================
 # MAIN
@@ -18,11 +18,15 @@ Sem:
 """
 
 import asyncio
+import time
 from datetime import datetime, timedelta
 
 from bleak import BleakClient
 from Crypto.Cipher import AES
 
+import hr_decoder
+from keepalive import KeepAlive
+
 # ==================================================
 # CONFIG
 # ==================================================
@@ -48,6 +52,7 @@ UUID_HR_MEAS = "00002a37-0000-1000-8000-00805f9b34fb"
 
 challenge = None
 last_hr_time = None
+keeper = None             # KeepAlive da conexão atual
 
 # ==================================================
 # AUTH
@@ -68,10 +73,13 @@ def auth_notification(_, data):
 def hr_notification(_, data):
     global last_hr_time
 
-    if len(data) < 2:
+    bpm = hr_decoder.push(data, time.time())
+    if bpm is None:
         return
 
-    bpm = data[1]
+    if keeper is not None:
+        keeper.on_sample()
+
     now = datetime.now()
     last_hr_time = now
 
@@ -93,7 +101,7 @@ async def cleanup(client):
 # ==================================================
 
 async def monitor(client):
-    global challenge, last_hr_time
+    global challenge, last_hr_time, keeper
 
     challenge = None
     last_hr_time = None
@@ -134,6 +142,10 @@ async def monitor(client):
             response=True
         )
 
+        # Ping periódico no HR control point (mantém a medição contínua)
+        keeper = KeepAlive(client, UUID_HR_CTRL)
+        keeper.start()
+
         print("❤️ Monitoramento ativo")
 
         # ------------------------------
@@ -154,6 +166,9 @@ async def monitor(client):
             await asyncio.sleep(10)
 
     finally:
+        if keeper is not None:
+            await keeper.stop()
+            keeper = None
         await cleanup(client)
 
 # ==================================================
@@ -9,6 +9,9 @@ Adiciona:
 - Detecção de ausência REAL de dados
 - Cooldown de alertas
 
+Limites em alert_rules.json (rules.py; sem o arquivo valem os
+DEFAULT_RULES), cooldown por regra (alert_index.py).
+
 Sem:
 - banco
 - ntfy
@@ -19,11 +22,18 @@ Alertas confiáveis sem falso positivo.
 """
 
 import asyncio
+import time
 from datetime import datetime, timedelta
+from pathlib import Path
 
 from bleak import BleakClient
 from Crypto.Cipher import AES
 
+import alert_index
+import hr_decoder
+import rules
+from keepalive import KeepAlive
+
 # ==================================================
 # CONFIG
 # ==================================================
@@ -36,10 +46,8 @@ WATCHDOG_TIMEOUT = timedelta(minutes=2)
 CONNECTION_GRACE_PERIOD = timedelta(seconds=40)
 
 # Alertas
-BRADY_LIMIT = 50
-TACHY_LIMIT = 110
-NO_DATA_TIMEOUT = timedelta(minutes=5)
-ALERT_COOLDOWN = timedelta(minutes=10)
+RULES_PATH = Path("alert_rules.json")
+NO_DATA_TIMEOUT = timedelta(minutes=5)   # sem BPM por isso → reconecta
 
 # ==================================================
 # UUIDs Mi Band 4
@@ -55,7 +63,11 @@ UUID_HR_MEAS = "00002a37-0000-1000-8000-00805f9b34fb"
 
 challenge = None
 last_hr_time = None
-last_alert_time = None
+keeper = None             # KeepAlive da conexão atual
+
+rule_file = rules.RuleFile(RULES_PATH)
+evaluator = rules.Evaluator(rule_file.rules)
+alerts = alert_index.AlertIndex()
 
 # ==================================================
 # AUTH
@@ -73,15 +85,23 @@ def auth_notification(_, data):
 # ALERTAS
 # ==================================================
 
-def send_alert(message):
-    global last_alert_time
-    now = datetime.now()
+def send_alerts(fired, ts):
+    """[(regra, mensagem)] do evaluator → aviso, respeitando o cooldown da regra."""
+    for rule, message in fired:
+        if alerts.fire(0, rule, message, ts):
+            print(f"🚨 ALERTA: {message}")
 
-    if last_alert_time and now - last_alert_time < ALERT_COOLDOWN:
-        return
+async def watch_rules():
+    """Recarga do arquivo de regras, ausência de dados e alertas resolvidos."""
+    while True:
+        await asyncio.sleep(rules.RELOAD_INTERVAL)
+        if rule_file.reload():
+            evaluator.load(rule_file.rules)
 
-    last_alert_time = now
-    print(f"🚨 ALERTA: {message}")
+        now = time.time()
+        send_alerts(evaluator.tick(now), now)
+        for _, (message, _, _) in alerts.sweep(now):
+            print(f"✅ RESOLVIDO: {message}")
 
 # ==================================================
 # HR
@@ -90,27 +110,27 @@ def send_alert(message):
 def hr_notification(_, data):
     global last_hr_time
 
-    if len(data) < 2:
+    bpm = hr_decoder.push(data, time.time())
+    if bpm is None:
         return
 
-    bpm = data[1]
+    if keeper is not None:
+        keeper.on_sample()
+
     now = datetime.now()
     last_hr_time = now
 
     print(f"[{now.strftime('%Y-%m-%d %H:%M:%S')}] ❤️ BPM: {bpm}")
 
     # Alertas de BPM
-    if bpm <= BRADY_LIMIT:
-        send_alert(f"Bradicardia detectada (BPM={bpm})")
-    elif bpm >= TACHY_LIMIT:
-        send_alert(f"Taquicardia detectada (BPM={bpm})")
+    send_alerts(evaluator.sample(now.timestamp(), bpm), now.timestamp())
 
 # ==================================================
 # MONITOR
 # ==================================================
 
 async def monitor(client):
-    global challenge, last_hr_time
+    global challenge, last_hr_time, keeper
 
     challenge = None
     last_hr_time = None
@@ -135,28 +155,37 @@ async def monitor(client):
     await client.start_notify(UUID_HR_MEAS, hr_notification)
     await client.write_gatt_char(UUID_HR_CTRL, b"\x15\x01\x01", response=True)
 
+    # Ping periódico no HR control point (mantém a medição contínua)
+    keeper = KeepAlive(client, UUID_HR_CTRL)
+    keeper.start()
+
     print("❤️ Monitoramento ativo")
 
-    # Loop principal
-    while True:
-        now = datetime.now()
+    try:
+        # Loop principal
+        while True:
+            now = datetime.now()
 
-        # Grace period após conexão
-        if now - connected_at < CONNECTION_GRACE_PERIOD:
-            await asyncio.sleep(5)
-            continue
+            # Grace period após conexão
+            if now - connected_at < CONNECTION_GRACE_PERIOD:
+                await asyncio.sleep(5)
+                continue
 
-        # Watchdog de ausência REAL de dados
-        if last_hr_time and now - last_hr_time > NO_DATA_TIMEOUT:
-            raise Exception("No HR data timeout")
+            # Watchdog de ausência REAL de dados (o alerta é a regra de ausência)
+            if last_hr_time and now - last_hr_time > NO_DATA_TIMEOUT:
+                raise Exception("No HR data timeout")
 
-        await asyncio.sleep(10)
+            await asyncio.sleep(10)
+    finally:
+        await keeper.stop()
 
 # ==================================================
 # SUPERVISOR
 # ==================================================
 
 async def supervisor():
+    asyncio.create_task(watch_rules())
+
     while True:
         try:
             print("🔄 Conectando à Mi Band...")
@@ -0,0 +1,477 @@
+"""
+v9_multi_band.py
+
+Várias Mi Bands num único processo (ex.: uma casa de repouso, um Pi).
+
+Antes:
+- Cada script tinha um MAC / AUTH_KEY fixo e o estado da pulseira em
+  globais do módulo (session, last_hr_time, wearable_state...)
+- N pulseiras = N processos, cada um com seu writer SQLite, seu
+  journal e seu loop de reconexão disputando o adaptador
+
+Agora:
+- Lista de pulseiras num arquivo JSON (ver devices.example.json):
+    [{"name": "Quarto 1", "mac": "...", "auth_key": "..."}]
+- Uma task por pulseira (Band.run) com o estado isolado na instância:
+  ring de HR, handshake, reconector, watchdog, estado de uso, regras
+- Compartilhado por todas:
+    - um writer SQLite (storage.py); leituras gravadas com o device_id
+      da pulseira (tabela devices, migração 5)
+    - um pipeline decode → persist → evaluate → notify (pipeline.py),
+      cada item leva a pulseira de origem
+    - a outbox de alertas (outbox.py): gravados no banco antes do
+      envio, uma thread entrega com conexão keep-alive e retry
+- Vários adaptadores BLE (adapters.py): cada pulseira vai para o
+  hciN menos carregado e migra de adaptador depois de falhas seguidas
+- Conexão + autenticação uma por vez em cada adaptador: o BlueZ lida
+  mal com várias conexões/descobertas simultâneas no mesmo controlador.
+  A escuta de anúncios (reconnect.py) continua em paralelo
+- Perfil GATT em cache por MAC (gatt_cache.py): reconexão curta, slot
+  liberado mais cedo
+- Keep-alive do HR por pulseira (keepalive.py), lapsos contados por pulseira
+- Passos por minuto por pulseira (activity.py, tabela activity_1m)
+- Histórico gravado na pulseira fora de alcance buscado em background
+  depois de cada reconexão (history.py, cursor por pulseira)
+- Regras de alerta de um arquivo (rules.py, --rules): um Evaluator por
+  pulseira com o estado das regras; o arquivo é relido quando muda e
+  vale para todas, sem reconectar
+- Cooldown, escalonamento e aviso de resolvida num índice único por
+  (pulseira, regra, severidade) (alert_index.py): um alerta não cala
+  outro, nem de outra pulseira
+
+Custo por pulseira (limitado):
+- Memória: ring de HR pequeno (BAND_RING_SIZE, ~10 min) e filas do
+  pipeline dimensionadas pelo número de pulseiras
+- CPU: o callback BLE só enfileira; bateria por notificação
+  (battery.py), watchdog é um timer de 10 s
+
+A pulseira marcada com "primary": true (obrigatória, só uma) grava como
+device_id 0 e mantém o que só a principal tem (agregados, HRV). Shards,
+retenção, arquivo frio e export cobrem todas as pulseiras.
+
+Uso:
+    python versions/v9_multi_band.py --devices devices.json
+    python versions/v9_multi_band.py --devices devices.json --adapters hci0,hci1
+    python versions/v9_multi_band.py --devices devices.json --rules alert_rules.json
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from bleak import BleakClient
+
+import activity
+import alert_index
+import battery
+import gatt_cache
+import hr_decoder
+import history
+import hrv
+import rules
+import storage
+from adapters import AdapterPool, discover_adapters
+from handshake import Handshake
+from keepalive import KeepAlive, new_stats
+from outbox import Outbox
+from pipeline import DROP_NEWEST, DROP_OLDEST, Pipeline, Stage
+from reconnect import CONNECT_TIMEOUT, Reconnector
+
+# ==================================================
+# CONFIGURAÇÃO
+# ==================================================
+
+DEVICES_PATH = Path("devices.json")
+DB_PATH = Path("health.db")
+
+NTFY_SERVER = "https://ntfy.sh"
+NTFY_TOPIC = "vo-saude-bruno"
+
+RULES_PATH = Path("alert_rules.json")
+WATCHDOG_TIMEOUT = timedelta(minutes=2)
+
+BAND_RING_SIZE = 600          # amostras de BPM por pulseira (~10 min a 1 Hz)
+BAND_RR_RING_SIZE = 2048
+
+QUEUE_PER_BAND = 32           # vagas por pulseira nas filas do pipeline
+NOTIFY_QUEUE_SIZE = 16
+
+# ==================================================
+# UUIDs BLE (Mi Band 4)
+# ==================================================
+
+UUID_AUTH = "00000009-0000-3512-2118-0009af100700"
+UUID_BATTERY = "00000006-0000-3512-2118-0009af100700"
+UUID_STEPS = "00000007-0000-3512-2118-0009af100700"
+UUID_FETCH = "00000004-0000-3512-2118-0009af100700"
+UUID_ACTIVITY_DATA = "00000005-0000-3512-2118-0009af100700"
+UUID_HR_CTRL = "00002a39-0000-1000-8000-00805f9b34fb"
+UUID_HR_MEAS = "00002a37-0000-1000-8000-00805f9b34fb"
+
+# ==================================================
+# LISTA DE PULSEIRAS
+# ==================================================
+
+def load_devices(path=DEVICES_PATH):
+    """Lê e valida o arquivo de pulseiras: [{name, mac, auth_key, primary?}]."""
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+
+    devices = []
+    seen = set()
+    for i, entry in enumerate(entries):
+        mac = entry["mac"].upper()
+        if mac in seen:
+            raise ValueError(f"MAC repetido em {path}: {mac}")
+        seen.add(mac)
+
+        key = bytes.fromhex(entry["auth_key"])
+        if len(key) != 16:
+            raise ValueError(f"auth_key de {mac} precisa ter 16 bytes")
+
+        devices.append({
+            "name": entry.get("name") or f"Pulseira {i + 1}",
+            "mac": mac,
+            "auth_key": key,
+            "primary": bool(entry.get("primary", False)),
+        })
+
+    primaries = sum(d["primary"] for d in devices)
+    if primaries > 1:
+        raise ValueError(f"Só uma pulseira pode ser primary em {path}")
+    if primaries == 0:
+        # Sem device_id 0 os agregados e o HRV ficariam vazios
+        raise ValueError(f"Marque uma pulseira com \"primary\": true em {path}")
+
+    return devices
+
+# ==================================================
+# NTFY (compartilhado)
+# ==================================================
+
+# Gravado na alert_outbox e entregue em background, com retry (outbox.py)
+ntfy = Outbox(NTFY_SERVER, NTFY_TOPIC)
+
+# Cooldown / escalonamento / resolvida por (pulseira, regra, severidade)
+alerts = alert_index.AlertIndex()
+
+def send_ntfy_alert(message, priority="urgent", title=alert_index.ALERT_TITLE):
+    # Grava na alert_outbox (transação curta, fora do loop); a entrega roda na thread da outbox
+    ntfy.send(message, title=title, priority=priority)
+
+    if title == alert_index.RESOLVED_TITLE:
+        print(f"✅ RESOLVIDO: {message}")
+    else:
+        print(f"🚨 ALERTA: {message}")
+
+def notify_stage(items):
+    for message, priority, title in items:
+        send_ntfy_alert(message, priority, title)
+
+# ==================================================
+# PULSEIRA (estado isolado por instância)
+# ==================================================
+
+class Band:
+    def __init__(self, name, mac, auth_key, device_id, primary=False, db_path=DB_PATH, alert_rules=None):
+        self.name = name
+        self.mac = mac
+        self.auth_key = auth_key
+        self.device_id = device_id
+        self.primary = primary
+
+        # A principal usa o ring padrão, lido por hrv.record()
+        if primary:
+            self.ring = hr_decoder.default_ring()
+        else:
+            self.ring = hr_decoder.HRRing(BAND_RING_SIZE, BAND_RR_RING_SIZE)
+
+        self.reconnector = Reconnector(mac)
+        self.keepalive_stats = new_stats()
+        self.steps = activity.StepsAggregator(device_id)
+        self.backfill = history.HistorySync(device_id, db_path, label=name)
+        # Estado das regras fora do reset(): a ausência de dados atravessa reconexões
+        if alert_rules is None:
+            alert_rules = rules.compile_rules(rules.DEFAULT_RULES, "DEFAULT_RULES")
+        self.evaluator = rules.Evaluator(alert_rules)
+        self.reset()
+
+    def reset(self):
+        """Estado da conexão (zerado a cada reconexão)."""
+        self.session = None
+        self.keeper = None
+        self.last_hr_time = None
+        self.wearable_state = "IN_USE"
+
+    def to_notify(self, fired, ts):
+        """[(regra, mensagem)] do evaluator → avisos que passam pelo índice."""
+        items = []
+        for rule, message in fired:
+            alert = alerts.fire(self, rule, f"{self.name}: {message}", ts)
+            if alert is not None:
+                items.append(alert)
+        return items or None
+
+    def set_state(self, new_state, message):
+        if self.wearable_state != new_state:
+            self.wearable_state = new_state
+            print(message)
+            storage.save_event(datetime.now(), message, self.device_id)
+
+    def hr_notification(self, _, data):
+        # Callback do bleak: só enfileira, o resto roda nos estágios
+        if self.keeper is not None:
+            self.keeper.on_sample()
+        ingest.submit((self, time.time(), bytes(data)))
+
+    # ------------------------------
+    # BATERIA
+    # ------------------------------
+
+    def on_battery(self, info):
+        # Notificação da 0x0006: só quando nível ou carregamento mudam
+        now = datetime.now()
+        print(f"[{now}] [{self.name}] 🔋 Bateria: {battery.describe(info)}")
+        storage.save_battery(now, info["level"], self.device_id)
+
+        if info["charging"]:
+            self.set_state("CHARGING", f"[{now}] [{self.name}] 🔌 Pulseira no carregador ({info['level']}%)")
+        elif info["charging"] is False and self.wearable_state == "CHARGING":
+            self.set_state("IN_USE", f"[{now}] [{self.name}] ⌚ Pulseira retirada do carregador")
+
+    # ------------------------------
+    # CONEXÃO
+    # ------------------------------
+
+    async def setup(self, client, chars, hs):
+        """Autenticação + início do HR (roda dentro do slot de conexão)."""
+        self.session = hs
+        await hs.authenticate(
+            client,
+            gatt_cache.char(chars, UUID_AUTH),
+            self.auth_key,
+            gatt_cache.char(chars, UUID_HR_MEAS),
+            self.hr_notification
+        )
+        hr_ctrl = gatt_cache.char(chars, UUID_HR_CTRL)
+        await client.write_gatt_char(hr_ctrl, b"\x15\x01\x01", response=True)
+
+        self.keeper = KeepAlive(client, hr_ctrl, totals=self.keepalive_stats, label=self.name)
+        self.keeper.start()
+
+    async def monitor(self, client, chars):
+        watcher = battery.BatteryWatcher(client, gatt_cache.char(chars, UUID_BATTERY), self.on_battery)
+        steps_char = gatt_cache.char(chars, UUID_STEPS)
+
+        # Dentro do try: se um start falhar, o finally desfaz os anteriores (e o keep-alive)
+        try:
+            await watcher.start()
+            await activity.start(client, steps_char, self.steps)
+            self.backfill.start(
+                client,
+                gatt_cache.char(chars, UUID_FETCH),
+                gatt_cache.char(chars, UUID_ACTIVITY_DATA)
+            )
+            print(f"❤️ [{self.name}] Monitoramento ativo")
+
+            while True:
+                if self.last_hr_time and datetime.now() - self.last_hr_time > WATCHDOG_TIMEOUT:
+                    raise Exception("Watchdog: conexão inativa")
+                await asyncio.sleep(10)
+        finally:
+            await self.backfill.stop()
+            await activity.stop(client, steps_char, self.steps)
+            await watcher.stop()
+            await self.keeper.stop()
+
+    async def run(self, pool):
+        """Loop de reconexão da pulseira (uma task por pulseira)."""
+        while True:
+            client = None
+            ready = False
+            adapter = pool.assign(self.mac)
+            try:
+                self.reset()
+                target = await self.reconnector.wait(adapter.name)
+
+                async with adapter.slot:
+                    print(f"🔄 [{self.name}] Conectando via {adapter.label}...")
+                    pool.attempt(self.mac)
+                    hs = Handshake(self.mac)
+                    client = BleakClient(
+                        target,
+                        services=gatt_cache.service_filter(self.mac),
+                        timeout=CONNECT_TIMEOUT,
+                        **adapter.kwargs()
+                    )
+                    await client.connect()
+                    hs.mark("connect")
+                    print(f"✅ [{self.name}] Conectado")
+                    self.reconnector.connected()
+
+                    chars = await gatt_cache.resolve(client, self.mac)
+                    hs.mark("discovery")
+                    await self.setup(client, chars, hs)
+
+                ready = True
+                pool.connected(self.mac)
+                await self.monitor(client, chars)
+
+            except Exception as e:
+                print(f"⚠️ [{self.name}] {e}")
+                if not ready and client is not None:
+                    pool.failed(self.mac)
+
+            finally:
+                pool.released(self.mac)
+                if client is not None:
+                    try:
+                        await client.disconnect()
+                    except Exception:
+                        pass
+
+            self.reconnector.disconnected()
+
+# ==================================================
+# PIPELINE (compartilhado: decode → persist → evaluate → notify)
+# ==================================================
+
+def decode_stage(item):
+    band, ts, data = item
+    bpm = hr_decoder.decode_into(band.ring, data, ts)
+    if bpm is None:
+        return None
+
+    # Tempo até o primeiro BPM decodificado (log + connection_setup.jsonl, uma vez por conexão)
+    if band.session is not None:
+        band.session.on_sample()
+
+    now = datetime.fromtimestamp(ts)
+    band.last_hr_time = now
+
+    if bpm == 0:
+        band.set_state("CHARGING", f"[{now}] [{band.name}] 🔌 Pulseira provavelmente no carregador (BPM=0)")
+        return None
+
+    return band, now, bpm
+
+def persist_stage(sample):
+    band, now, bpm = sample
+    print(f"[{now}] [{band.name}] ❤️ BPM: {bpm}")
+    storage.save_bpm(now, bpm, band.device_id)
+    if band.primary:
+        hrv.record()
+    return sample
+
+def evaluate_stage(sample):
+    band, now, bpm = sample
+    ts = now.timestamp()
+    return band.to_notify(band.evaluator.sample(ts, bpm, band.wearable_state), ts)
+
+def build_pipeline(n_bands):
+    """Filas proporcionais ao número de pulseiras (memória limitada por pulseira)."""
+    size = QUEUE_PER_BAND * max(1, n_bands)
+    return Pipeline([
+        Stage("decode", decode_stage, maxsize=size, policy=DROP_OLDEST),
+        Stage("persist", persist_stage, maxsize=size),
+        Stage("evaluate", evaluate_stage, maxsize=size),
+        Stage("notify", notify_stage, maxsize=NOTIFY_QUEUE_SIZE, policy=DROP_NEWEST, blocking=True),
+    ])
+
+ingest = None
+
+# ==================================================
+# REGRAS (compartilhadas: recarga + ausência de dados + resolvidas)
+# ==================================================
+
+async def watch_rules(bands, rule_file=None):
+    while True:
+        await asyncio.sleep(rules.RELOAD_INTERVAL)
+        if rule_file is not None and rule_file.reload():
+            for band in bands:
+                band.evaluator.load(rule_file.rules)
+
+        now = time.time()
+        items = []
+        for band in bands:
+            items += band.to_notify(band.evaluator.tick(now, band.wearable_state), now) or []
+        for band, (message, priority, title) in alerts.sweep(now):
+            items.append((f"{band.name}: {message}", priority, title))
+        if items:
+            await asyncio.to_thread(notify_stage, items)
+
+# ==================================================
+# SUPERVISOR
+# ==================================================
+
+def build_bands(devices, db_path=DB_PATH, rule_file=None):
+    alert_rules = rule_file.rules if rule_file is not None else None
+    bands = []
+    for d in devices:
+        device_id = 0 if d["primary"] else storage.register_device(d["mac"], d["name"], db_path)
+        bands.append(Band(d["name"], d["mac"], d["auth_key"], device_id, d["primary"], db_path, alert_rules))
+    return bands
+
+async def supervisor(bands, adapter_names=None, rule_file=None):
+    global ingest
+
+    ingest = build_pipeline(len(bands))
+    ingest.start()
+    rules_task = asyncio.create_task(watch_rules(bands, rule_file))
+
+    pool = AdapterPool(adapter_names or discover_adapters())
+    pool.start()
+
+    if len(bands) > pool.capacity():
+        print(
+            f"⚠️ {len(bands)} pulseiras para {len(pool.adapters)} adaptador(es) "
+            f"(limite prático ~{pool.capacity()} conexões simultâneas)"
+        )
+
+    print(f"📡 Monitorando {len(bands)} pulseiras: " + ", ".join(b.name for b in bands))
+    print("📶 Adaptadores: " + ", ".join(a.label for a in pool.adapters))
+
+    try:
+        await asyncio.gather(*(band.run(pool) for band in bands))
+    finally:
+        rules_task.cancel()
+        await ingest.stop()
+        await pool.stop()
+
+# ==================================================
+# MAIN
+# ==================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Monitor de várias Mi Bands")
+    parser.add_argument("--devices", default=str(DEVICES_PATH))
+    parser.add_argument("--db", default=str(DB_PATH))
+    parser.add_argument("--adapters", help="ex.: hci0,hci1 (padrão: todos os encontrados)")
+    parser.add_argument("--rules", default=str(RULES_PATH), help="regras de alerta (JSON)")
+    args = parser.parse_args()
+
+    adapter_names = args.adapters.split(",") if args.adapters else None
+
+    devices = load_devices(args.devices)
+    if not devices:
+        print(f"⚠️ Nenhuma pulseira em {args.devices}")
+        return
+
+    storage.init_db(args.db)
+    rule_file = rules.RuleFile(args.rules)
+    bands = build_bands(devices, args.db, rule_file)
+    storage.start_writer(args.db)
+    ntfy.start(args.db)
+
+    try:
+        asyncio.run(supervisor(bands, adapter_names, rule_file))
+    finally:
+        storage.stop_writer()
+        print(f"🔔 Alertas: {alerts.describe()}")
+        ntfy.stop()
+
+if __name__ == "__main__":
+    main()